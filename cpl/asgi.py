@@ -13,4 +13,11 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cpl.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.conf import settings
+from django.urls import reverse
+
+from cpl_backend.writes import PrioritizeWrites
+
+application = PrioritizeWrites(django_application, settings.READ_CONCURRENCY, unlimited=[reverse('live')])
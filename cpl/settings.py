@@ -13,6 +13,9 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 from pathlib import Path
 import os
 
+import django
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -43,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'cpl_backend.metrics.MetricsMiddleware',
+    'cpl_backend.seasons.SeasonMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,7 +61,8 @@ ROOT_URLCONF = 'cpl.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django's backend, timing renders for the request metrics
+        'BACKEND': 'cpl_backend.metrics.DjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -76,12 +82,84 @@ WSGI_APPLICATION = 'cpl.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# CPL_DB=postgres switches to PostgreSQL (CPL_DB_NAME, CPL_DB_USER, CPL_DB_PASSWORD,
+# CPL_DB_HOST, CPL_DB_PORT). SQLite is tuned for concurrent bidding in cpl_backend/database.py.
+CPL_DB = os.environ.get('CPL_DB', 'sqlite')
+# Seconds a connection is kept for the next requests of the same worker thread
+CONN_MAX_AGE = int(os.environ.get('CPL_CONN_MAX_AGE', 60))
+
+if CPL_DB == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('CPL_DB_NAME', 'cpl'),
+            'USER': os.environ.get('CPL_DB_USER', 'cpl'),
+            'PASSWORD': os.environ.get('CPL_DB_PASSWORD', ''),
+            'HOST': os.environ.get('CPL_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('CPL_DB_PORT', '5432'),
+            'CONN_MAX_AGE': CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            # Needed behind pgbouncer in transaction pooling mode
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('CPL_DB_PGBOUNCER', '') == '1',
+        }
     }
+    if os.environ.get('CPL_DB_POOL_SIZE'):
+        # Django >= 5.1 with psycopg[pool]: a pool per process instead of a connection per thread
+        if django.VERSION < (5, 1):
+            raise ImproperlyConfigured(
+                f"CPL_DB_POOL_SIZE needs Django 5.1 or later, this is {django.get_version()}; "
+                "unset it or use CPL_DB_PGBOUNCER=1")
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {'min_size': 2, 'max_size': int(os.environ['CPL_DB_POOL_SIZE']), 'timeout': 10},
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': CONN_MAX_AGE,
+            'OPTIONS': {
+                # Seconds a writer waits for the lock before "database is locked"
+                'timeout': 20,
+            },
+            # On disk so concurrent tests lock like the real database does
+            'TEST': {
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
+        }
+    }
+
+# Applied to every new SQLite connection, CPL_SQLITE_TUNED=0 keeps the SQLite defaults
+SQLITE_PRAGMAS = {
+    # Readers no longer block the writer, nor the writer the readers
+    'journal_mode': 'WAL',
+    # Safe with WAL, only the last commits can be lost on power failure, not the database
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'cache_size': -64000,  # KiB, so 64 MB
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+} if os.environ.get('CPL_SQLITE_TUNED', '1') != '0' else {}
+
+
+# Cache for the public list pages, invalidated by the auction version.
+# Set CPL_CACHE_DIR when running more than one worker process so they share it.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'auction': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ['CPL_CACHE_DIR'],
+    } if os.environ.get('CPL_CACHE_DIR') else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'auction',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
 }
+AUCTION_CACHE = 'auction'
+AUCTION_CACHE_TIMEOUT = 60 * 60
 
 
 # Password validation
@@ -120,6 +198,21 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# With CPL_STATIC_MANIFEST=1 collectstatic minifies styles.css and scripts.js, hashes every
+# file name and writes .gz/.br variants (Brotli needs the brotli package), see
+# cpl_backend/storage.py. Pages then link the hashed names from the manifest, so set it
+# for both collectstatic and the server; without it static files keep their names.
+STATIC_MANIFEST = os.environ.get('CPL_STATIC_MANIFEST', '') == '1'
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'cpl_backend.storage.CompressedManifestStaticFilesStorage' if STATIC_MANIFEST
+                   else 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -129,6 +222,45 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'cpl_backend', 'templates'),
 ]
 
+# Per view latency, SQL and render time, scraped from /metrics/.
+# CPL_SLOW_REQUEST_MS logs the SQL of requests slower than that many milliseconds.
+METRICS_ENABLED = os.environ.get('CPL_METRICS', '1') != '0'
+METRICS_SLOW_REQUEST_MS = int(os.environ['CPL_SLOW_REQUEST_MS']) if os.environ.get('CPL_SLOW_REQUEST_MS') else None
+# Who may read /metrics/ besides staff users, comma separated addresses
+METRICS_ALLOWED_IPS = set(filter(None, os.environ.get('CPL_METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')))
+
+# Static copies of the display pages (/teams/, /teams/<id>, /bids/) and their JSON,
+# rewritten in CPL_SNAPSHOT_DIR a moment after each bid for a static file server
+SNAPSHOT_DIR = os.environ.get('CPL_SNAPSHOT_DIR') or None
+SNAPSHOT_DELAY = float(os.environ.get('CPL_SNAPSHOT_DELAY', 0.5))
+
+# Under ASGI bids are saved on their own threads and connections, ahead of the page
+# reads (cpl_backend/writes.py); 0 runs them on the thread sync code shares
+WRITE_THREADS = int(os.environ.get('CPL_WRITE_THREADS', 2))
+# Page reads let into the ASGI app at once, the others wait while bids go first; 0 is no limit
+READ_CONCURRENCY = int(os.environ.get('CPL_READ_CONCURRENCY', 4))
+
+# Season shown when a request picks none (?season=<slug>, then remembered in a cookie),
+# empty for the newest. Seasons and their rules are cached for SEASON_CACHE_SECONDS,
+# the process saving one drops its copy straight away.
+DEFAULT_SEASON = os.environ.get('CPL_SEASON', '')
+SEASON_CACHE_SECONDS = int(os.environ.get('CPL_SEASON_CACHE_SECONDS', 30))
+
+# Cursor based paging for the list pages, no page count but constant cost per page
+KEYSET_PAGINATION = os.environ.get('CPL_KEYSET_PAGINATION', '') == '1'
+
+# Player lists and search are served from a copy of the players kept in the process
+# (cpl_backend/catalog.py), read again when the auction version in the page cache moves
+# (with CPL_CACHE_DIR, on writes of any worker) or after PLAYER_CATALOG_SECONDS;
+# 0 reads the database every time
+PLAYER_CATALOG = os.environ.get('CPL_PLAYER_CATALOG', '1') == '1'
+PLAYER_CATALOG_SECONDS = int(os.environ.get('CPL_PLAYER_CATALOG_SECONDS', 60))
+
 MEDIA_URL = '/media/'
-STATIC_ROOT = os.path.join(BASE_DIR, 'cpl_backend', 'static')
+# Let the front server send media files: 'X-Sendfile' (Apache, lighttpd) or
+# 'X-Accel-Redirect' (nginx, with an internal location at MEDIA_SENDFILE_PREFIX)
+MEDIA_SENDFILE_HEADER = os.environ.get('CPL_MEDIA_SENDFILE') or None
+MEDIA_SENDFILE_PREFIX = '/protected-media/'
+# collectstatic output, outside the app so it is not collected again
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_ROOT = os.path.join(BASE_DIR, 'cpl_backend', 'media')
\ No newline at end of file
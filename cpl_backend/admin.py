@@ -1,19 +1,45 @@
+from django import forms
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import Http404
+from django.shortcuts import render
+from django.urls import path
 from import_export import resources
 from import_export.admin import ImportExportModelAdmin
 
-from .models import TeamMember, Team, Player, Bid
+from .catalog import drop_on_commit
+from .models import TeamMember, Team, Player, Bid, AuctionEvent, Season, default_season, season_rules
+from .exports import FORMATS, export_response
+from .page_cache import bump_on_commit
+from .revert import revert_bids
+from .search import rebuild_index
+from .simulator import SIMULATIONS, AuctionState, Rules, SimulatorUnavailable, bid_matrix, rules_for, simulate
 
 admin.site.site_header = 'CPL Dashboard'
 
 class PlayerResouce(resources.ModelResource):
     class Meta:
         model = Player
+        use_bulk = True
+        batch_size = 1000
+
+    def before_save_instance(self, instance, row, **kwargs):
+        # bulk_create skips Player.save()
+        if instance.season_id is None:
+            instance.season = default_season()
+        instance.basic_amount = season_rules(instance.season_id).basic_amount_for(instance.is_external)
+
+    def after_import(self, dataset, result, **kwargs):
+        # nor does it fire the signals that keep the search index, page cache and catalog in sync
+        rebuild_index()
+        bump_on_commit()
+        drop_on_commit()
 
 # Register your models here.
 class PlayerAdmin(ImportExportModelAdmin):
     resource_classes = [PlayerResouce]
     list_display = ("cpl_id", "name", "type", "basic_amount", "photo", "card", "is_external", "is_sold")
+    list_filter = ("season",)
     search_fields = ("cpl_id", "name")
 
     # @admin.display(description='Team')
@@ -24,17 +50,133 @@ class PlayerAdmin(ImportExportModelAdmin):
 class TeamResource(resources.ModelResource):
     class Meta:
         model = Team
+        use_bulk = True
+        batch_size = 1000
+
+    def before_save_instance(self, instance, row, **kwargs):
+        if instance.season_id is None:
+            instance.season = default_season()
+        if instance.total_amount is None:
+            instance.total_amount = season_rules(instance.season_id).team_basic_amount
+        instance.balance_amount = instance.total_amount - instance.expended_amount
+
+    def after_import(self, dataset, result, **kwargs):
+        bump_on_commit()
+
+class SimulationForm(forms.Form):
+    simulations = forms.IntegerField(min_value=1, max_value=20000, initial=SIMULATIONS)
+    markup = forms.FloatField(min_value=1, initial=1.5, help_text="Typical price over the basic amount")
+    spread = forms.FloatField(min_value=0, initial=0.5)
+    internal_basic = forms.FloatField(min_value=0, initial=Rules().internal_basic)
+    external_basic = forms.FloatField(min_value=0, initial=Rules().external_basic)
+    internal_players = forms.IntegerField(min_value=0, initial=Rules().internal_players)
+    external_players = forms.IntegerField(min_value=0, initial=Rules().external_players)
 
 class TeamAdmin(ImportExportModelAdmin):
     resource_classes = [TeamResource]
+    import_export_change_list_template = "admin/cpl_backend/team/change_list.html"
     list_display = ("cpl_id", "name", "description", "total_amount", "expended_amount", "balance_amount")
+    list_filter = ("season",)
     search_fields = ("cpl_id", "name")
+    readonly_fields = ("internal_players_count", "external_players_count",
+                       "internal_sold_amount", "external_sold_amount")
+
+    def get_urls(self):
+        return [
+            path("simulate/", self.admin_site.admin_view(self.simulate_view), name="cpl_backend_team_simulate"),
+            path("rosters.<str:format>", self.admin_site.admin_view(self.rosters_view),
+                 name="cpl_backend_team_rosters"),
+            *super().get_urls(),
+        ]
+
+    def rosters_view(self, request, format):
+        # Streamed, unlike the import_export export which builds the whole file first
+        if format not in FORMATS:
+            raise Http404(f"No {format} export")
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        return export_response(request, "rosters", format)
+
+    def simulate_view(self, request):
+        # Starts from the rules of the season the admin is looking at
+        form = SimulationForm(request.GET or None, initial=rules_for(request.season)._asdict())
+        context = {**self.admin_site.each_context(request), "opts": self.model._meta,
+                   "title": "Auction simulator", "form": form}
+        if form.is_valid():
+            data = form.cleaned_data
+            try:
+                state = AuctionState(Rules(**{field: data[field] for field in Rules._fields}), request.season)
+            except SimulatorUnavailable as e:
+                self.message_user(request, str(e), level="error")
+            else:
+                _, feasible = bid_matrix(state)
+                result = simulate(state, simulations=data["simulations"], markup=data["markup"],
+                                  spread=data["spread"])
+                for team, buyable in zip(result.teams, feasible.sum(axis=1)):
+                    team["buyable"] = int(buyable)
+                context.update(result=result, players=len(state.player_ids))
+        return render(request, "admin/cpl_backend/team/simulate.html", context)
 
 
 class BidAdmin(admin.ModelAdmin):
     list_display = ("team", "player", "bid_amount", "is_sold")
+    list_filter = ("season",)
+    list_select_related = ("team", "player")
+    actions = ["revert_selected"]
+
+    def get_urls(self):
+        return [
+            path("log.<str:format>", self.admin_site.admin_view(self.log_view), name="cpl_backend_bid_log"),
+            *super().get_urls(),
+        ]
+
+    def log_view(self, request, format):
+        if format not in FORMATS:
+            raise Http404(f"No {format} export")
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        return export_response(request, "bids", format)
+
+    @admin.action(description="Revert selected bids", permissions=["delete"])
+    def revert_selected(self, request, queryset):
+        # First pass shows the dry run, the confirmation form posts back with "apply"
+        if request.POST.get("apply"):
+            plan = revert_bids(queryset)
+            self.message_user(request, f"{sum(change['bids'] for change in plan.values())} bids reverted")
+            return None
+        plan = revert_bids(queryset, dry_run=True)
+        teams = Team.objects.in_bulk(plan)
+        context = {**self.admin_site.each_context(request), "opts": self.model._meta,
+                   "title": "Revert bids", "queryset": queryset,
+                   "plan": [(teams[team_id], change) for team_id, change in plan.items()],
+                   "action_checkbox_name": admin.helpers.ACTION_CHECKBOX_NAME}
+        return render(request, "admin/cpl_backend/bid/revert_confirmation.html", context)
+
+class TeamMemberAdmin(admin.ModelAdmin):
+    list_filter = ("season",)
+    list_select_related = ("team", "players")
+
+class SeasonAdmin(admin.ModelAdmin):
+    list_display = ("slug", "league", "name", "team_basic_amount", "internal_player_basic_amount",
+                    "external_player_basic_amount", "internal_players_count", "external_players_count")
+    prepopulated_fields = {"slug": ("league", "name")}
+
+class AuctionEventAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "team_id", "player_id", "bid_id", "amount", "created_at")
+    list_filter = ("kind",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
+admin.site.register(Season, SeasonAdmin)
 admin.site.register(Player, PlayerAdmin)
 admin.site.register(Team, TeamAdmin)
 admin.site.register(Bid, BidAdmin)
-admin.site.register(TeamMember)
\ No newline at end of file
+admin.site.register(TeamMember, TeamMemberAdmin)
+admin.site.register(AuctionEvent, AuctionEventAdmin)
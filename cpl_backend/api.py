@@ -0,0 +1,185 @@
+import hashlib
+from functools import wraps
+
+from django.http import Http404, HttpResponseNotAllowed, JsonResponse
+from django.utils.cache import get_conditional_response
+
+from .eligibility import bid_eligibility
+from .images import derivative_url
+from .models import Bid, Player, Team
+from .page_cache import auction_version
+from .pagination import InvalidCursor, keyset_page
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def plain(name):
+    return (name,), lambda obj: getattr(obj, name)
+
+
+def image(name, size):
+    return (name, f"{name}_digest"), lambda obj: derivative_url(obj, name, size) or None
+
+
+def related(name, *fields):
+    # Selected with the row, {"id": ..., "name": ...} of the team or player
+    return tuple(f"{name}__{field}" for field in fields), \
+        lambda obj: {field: getattr(getattr(obj, name), field) for field in fields}
+
+
+# Public name -> (model fields to load, value getter)
+PLAYER_FIELDS = {
+    **{name: plain(name) for name in ("id", "cpl_id", "name", "type", "basic_amount", "is_external", "is_sold")},
+    "photo": image("photo", "thumb"),
+    "card": image("card", "medium"),
+}
+TEAM_FIELDS = {
+    **{name: plain(name) for name in ("id", "cpl_id", "name", "description", "total_amount", "expended_amount",
+                                      "balance_amount", "internal_players_count", "external_players_count",
+                                      "internal_sold_amount", "external_sold_amount")},
+    "logo": image("logo", "thumb"),
+}
+BID_FIELDS = {
+    **{name: plain(name) for name in ("id", "bid_amount", "is_sold", "created_at")},
+    "team": related("team", "id", "name"),
+    "player": related("player", "id", "cpl_id", "name"),
+}
+
+
+class BadRequest(Exception):
+    pass
+
+
+def api_view(view):
+    """GET only JSON view with an ETag from the version of the request's season and its URL.
+
+    A client polling with If-None-Match gets a 304 after one cache lookup,
+    without touching the database, until a bid or an edit changes the
+    auction.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return HttpResponseNotAllowed(["GET", "HEAD"])
+        # The query string picks the fields, page and filters, a tag is only good for the same one
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()[:16]
+        etag = f'"{request.season.id}-{auction_version(request.season.id)}-{path}"'
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is None:
+            try:
+                response = view(request, *args, **kwargs)
+            except BadRequest as e:
+                return JsonResponse({"error": str(e)}, status=400)
+            except Http404 as e:
+                return JsonResponse({"error": str(e)}, status=404)
+        else:
+            response = not_modified
+        response["ETag"] = etag
+        # Stored by clients and proxies but checked with us every time
+        response["Cache-Control"] = "no-cache"
+        return response
+    return wrapper
+
+
+def selected_fields(request, fields):
+    names = [name for name in request.GET.get("fields", "").split(",") if name]
+    if not names:
+        return list(fields)
+    unknown = [name for name in names if name not in fields]
+    if unknown:
+        raise BadRequest(f"Unknown fields: {', '.join(unknown)}. Choose from: {', '.join(fields)}")
+    return names
+
+
+def page_size(request):
+    try:
+        return max(1, min(int(request.GET.get("limit", PAGE_SIZE)), MAX_PAGE_SIZE))
+    except ValueError:
+        raise BadRequest("limit must be a number")
+
+
+def flag(request, name):
+    value = request.GET.get(name)
+    if value in (None, ""):
+        return None
+    if value not in ("0", "1"):
+        raise BadRequest(f"{name} must be 0 or 1")
+    return value == "1"
+
+
+def listing(request, queryset, fields):
+    """One keyset page of the queryset with only the asked fields loaded, in one query."""
+    names = selected_fields(request, fields)
+    columns = {"id"}
+    for name in names:
+        columns.update(fields[name][0])
+    relations = {column.split("__")[0] for column in columns if "__" in column}
+    queryset = queryset.select_related(*relations).only(*columns, *relations)
+
+    try:
+        page = keyset_page(queryset, cursor=request.GET.get("cursor"), per_page=page_size(request),
+                           params=request.GET)
+    except InvalidCursor:
+        raise BadRequest("Invalid cursor")
+
+    getters = [(name, fields[name][1]) for name in names]
+    return JsonResponse({
+        "results": [{name: get(obj) for name, get in getters} for obj in page],
+        "next": request.path + page.next_url if page.next_url else None,
+        "previous": request.path + page.previous_url if page.previous_url else None,
+    })
+
+
+@api_view
+def players(request):
+    queryset = Player.objects.filter(season=request.season)
+    for name in ("is_sold", "is_external"):
+        value = flag(request, name)
+        if value is not None:
+            queryset = queryset.filter(**{name: value})
+    return listing(request, queryset, PLAYER_FIELDS)
+
+
+@api_view
+def unsold_players(request):
+    return listing(request, Player.objects.filter(season=request.season, is_sold=False), PLAYER_FIELDS)
+
+
+@api_view
+def teams(request):
+    return listing(request, Team.objects.filter(season=request.season), TEAM_FIELDS)
+
+
+@api_view
+def team_players(request, id):
+    if not Team.objects.filter(season=request.season, pk=id).exists():
+        raise Http404("No such team")
+    return listing(request, Player.objects.filter(teammember__team_id=id), PLAYER_FIELDS)
+
+
+@api_view
+def player_eligibility(request, id):
+    player = Player.objects.only("id", "season", "name", "is_external", "is_sold", "basic_amount") \
+        .filter(season=request.season, pk=id).first()
+    if player is None:
+        raise Http404("No such player")
+    return JsonResponse({
+        "player": {"id": player.id, "name": player.name, "basic_amount": player.basic_amount,
+                   "is_sold": player.is_sold},
+        "teams": bid_eligibility(player),
+    })
+
+
+@api_view
+def bids(request):
+    queryset = Bid.objects.filter(season=request.season)
+    for name in ("team", "player"):
+        if request.GET.get(name):
+            try:
+                queryset = queryset.filter(**{f"{name}_id": int(request.GET[name])})
+            except ValueError:
+                raise BadRequest(f"{name} must be an id")
+    if flag(request, "is_sold") is not None:
+        queryset = queryset.filter(is_sold=flag(request, "is_sold"))
+    return listing(request, queryset, BID_FIELDS)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CplBackendConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cpl_backend'
+
+    def ready(self):
+        # Connect the signal receivers
+        from . import catalog, database, images, live, metrics, page_cache, publisher, search
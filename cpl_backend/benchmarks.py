@@ -0,0 +1,187 @@
+import random
+import statistics
+import time
+import tracemalloc
+from collections import namedtuple
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from .catalog import read_players
+from .importer import import_players
+from .models import Bid, Player, Team, default_season
+from .page_cache import page_cache
+
+# queries is the budget for a cold page (empty page cache), it must not grow with the league
+Endpoint = namedtuple("Endpoint", ["name", "url", "queries", "method", "data", "admin"],
+                      defaults=["get", None, False])
+
+ENDPOINTS = [
+    Endpoint("home", lambda league: reverse("home"), 0),
+    Endpoint("players", lambda league: reverse("players"), 2),
+    Endpoint("players_deep_page", lambda league: reverse("players") + "?page=20", 2),
+    Endpoint("players_cursor", lambda league: reverse("players") + "?cursor=", 1),
+    Endpoint("teams", lambda league: reverse("teams"), 2),
+    Endpoint("standings", lambda league: reverse("standings"), 1),
+    Endpoint("standings_json", lambda league: reverse("standings") + "?format=json", 1),
+    Endpoint("team", lambda league: reverse("team", args=[league.team_id]), 2),
+    Endpoint("to_bid", lambda league: reverse("to_bid"), 2),
+    Endpoint("bid_form", lambda league: reverse("bids", args=[league.player_id()]), 2),
+    Endpoint("search", lambda league: reverse("player_search") + "?search=player 1", 2),
+    Endpoint("suggest", lambda league: reverse("player_suggest") + "?q=pla&unsold=1", 1),
+    Endpoint("save_bid", lambda league: reverse("save_bid"), 10, method="post",
+             data=lambda league: {"team": league.team_id, "player": league.player_id(), "amount": 601,
+                                  "next": reverse("to_bid")}),
+    Endpoint("api_players", lambda league: reverse("api_players") + "?fields=id,name,photo", 1),
+    Endpoint("api_unsold_players", lambda league: reverse("api_unsold_players"), 1),
+    Endpoint("api_player_eligibility",
+             lambda league: reverse("api_player_eligibility", args=[league.player_id()]), 2),
+    Endpoint("api_teams", lambda league: reverse("api_teams"), 1),
+    Endpoint("api_team_players", lambda league: reverse("api_team_players", args=[league.team_id]), 2),
+    Endpoint("api_bids", lambda league: reverse("api_bids"), 1),
+    # One more for the seasons of the season filter
+    Endpoint("admin_players", lambda league: reverse("admin:cpl_backend_player_changelist"), 6, admin=True),
+    Endpoint("admin_teams", lambda league: reverse("admin:cpl_backend_team_changelist"), 6, admin=True),
+    Endpoint("admin_bids", lambda league: reverse("admin:cpl_backend_bid_changelist"), 6, admin=True),
+    Endpoint("admin_team_members", lambda league: reverse("admin:cpl_backend_teammember_changelist"), 6,
+             admin=True),
+    Endpoint("admin_events", lambda league: reverse("admin:cpl_backend_auctionevent_changelist"), 5,
+             admin=True),
+]
+# /live/ streams until the client goes away and /media/ reads files, neither is driven here
+
+# The pages served from the player catalog, or from the database without it
+CATALOG_ENDPOINTS = [endpoint for endpoint in ENDPOINTS
+                     if endpoint.name in ("players", "players_deep_page", "players_cursor", "to_bid", "search")]
+
+
+class League:
+    """A synthetic league: teams, players and sold bids spread over the teams."""
+
+    def __init__(self, teams=20, players=5000, bids=100, seed=0):
+        self.random = random.Random(seed)
+        season = default_season()
+        Team.objects.bulk_create([
+            Team(season=season, cpl_id=f"BT{i}", name=f"Team {i}", description="", logo="",
+                 total_amount=40_000, balance_amount=40_000) for i in range(teams)
+        ])
+        import_players({"cpl_id": f"BP{i}", "name": f"Player {i}", "type": "BATSMAN",
+                        "is_external": "1" if i % 5 == 0 else ""} for i in range(players))
+        self.team_ids = list(Team.objects.filter(cpl_id__startswith="BT").values_list("id", flat=True))
+        self.team_id = self.team_ids[0]
+
+        internal = Player.objects.filter(cpl_id__startswith="BP", is_external=False)
+        for player_id, team_id in zip(internal.values_list("id", flat=True)[:bids], self.team_ids * bids):
+            Bid.objects.create(team_id=team_id, player_id=player_id, bid_amount=650, is_sold=True)
+        self.unsold = list(internal.filter(is_sold=False).values_list("id", flat=True))
+
+    def player_id(self):
+        return self.random.choice(self.unsold)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+def admin_client():
+    User = get_user_model()
+    user = User.objects.filter(username="benchmark").first() or \
+        User.objects.create_superuser("benchmark", "benchmark@example.com", None)
+    client = Client()
+    client.force_login(user)
+    return client
+
+
+def run_benchmarks(league, repeat=20, endpoints=ENDPOINTS):
+    """Time every endpoint cold (page cache cleared) and warm.
+
+    Returns {name: {...}} with latency percentiles in milliseconds, the
+    query count of the slowest cold request and the response size.
+    """
+    clients = {False: Client(), True: admin_client()}
+    cache = page_cache()
+    results = {}
+    for endpoint in endpoints:
+        client = clients[endpoint.admin]
+        cold, warm, queries = [], [], 0
+        for _ in range(repeat):
+            url = endpoint.url(league)
+            data = endpoint.data(league) if endpoint.data else None
+            send = getattr(client, endpoint.method)
+
+            cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = send(url, data) if data else send(url)
+                cold.append((time.perf_counter() - started) * 1000)
+            queries = max(queries, len(captured.captured_queries))
+
+            if endpoint.method == "get":
+                started = time.perf_counter()
+                send(url)
+                warm.append((time.perf_counter() - started) * 1000)
+
+        results[endpoint.name] = {
+            "url": url,
+            "status": response.status_code,
+            "queries": queries,
+            "query_budget": endpoint.queries,
+            "bytes": len(response.content),
+            "p50_ms": percentile(cold, 50),
+            "p95_ms": percentile(cold, 95),
+            "p99_ms": percentile(cold, 99),
+            "mean_ms": statistics.fmean(cold),
+            "warm_p50_ms": percentile(warm, 50) if warm else None,
+        }
+    return results
+
+
+def check_results(results, baseline=None, tolerance=0.5):
+    """Failures as text: endpoints over their query budget, or slower than
+    the baseline p95 by more than the tolerance."""
+    failures = []
+    for name, result in results.items():
+        if result["status"] >= 400:
+            failures.append(f"{name}: HTTP {result['status']}")
+        if result["queries"] > result["query_budget"]:
+            failures.append(f"{name}: {result['queries']} queries, budget {result['query_budget']}")
+        previous = (baseline or {}).get(name)
+        if previous and result["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            failures.append(f"{name}: p95 {result['p95_ms']:.1f}ms, baseline {previous['p95_ms']:.1f}ms")
+    return failures
+
+
+def compare_catalog(league, repeat=20):
+    """run_benchmarks of the player lists from the catalog and from the database, {"catalog": ..., "orm": ...}."""
+    results = {}
+    for name, enabled in (("catalog", True), ("orm", False)):
+        with override_settings(PLAYER_CATALOG=enabled):
+            results[name] = run_benchmarks(league, repeat=repeat, endpoints=CATALOG_ENDPOINTS)
+    return results
+
+
+def memory_footprint(season):
+    """Bytes the season's players take in the catalog, and as the model instances a page of the ORM builds."""
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        catalog = read_players(season.id)
+        catalog_bytes = tracemalloc.get_traced_memory()[0] - start
+
+        start = tracemalloc.get_traced_memory()[0]
+        instances = list(Player.objects.filter(season=season).order_by("id"))
+        orm_bytes = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+    players = len(catalog.players)
+    return {
+        "players": players,
+        "catalog_bytes": catalog_bytes,
+        "orm_bytes": orm_bytes,
+        "catalog_bytes_per_player": catalog_bytes / players if players else None,
+        "orm_bytes_per_player": orm_bytes / len(instances) if instances else None,
+    }
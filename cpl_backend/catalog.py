@@ -0,0 +1,232 @@
+import bisect
+import sys
+import threading
+import time
+from operator import attrgetter
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from .constants import PLAYER_CHOICES
+from .models import Player
+from .page_cache import auction_version, bump_auction_version
+from .search import FTS_WEIGHTS, WORD_RE
+from .signals import auction_updated
+
+PLAYER_TYPES = dict(PLAYER_CHOICES)
+# Everything the player lists show, in the order PlayerRecord takes them
+COLUMNS = ("id", "cpl_id", "name", "type", "card", "photo", "card_digest", "photo_digest", "is_external", "is_sold")
+
+by_id = attrgetter("id")
+
+
+class StoredFile(str):
+    """Name of an uploaded file with the url of a FieldFile, for media_url."""
+    __slots__ = ()
+
+    @property
+    def url(self):
+        return default_storage.url(self)
+
+
+class PlayerRecord:
+    """The columns of a player the lists show, a few hundred bytes instead of a model instance.
+
+    Never changed once built, a patch replaces the record.
+    """
+    __slots__ = COLUMNS + ("text",)
+
+    def __init__(self, id, cpl_id, name, type, card, photo, card_digest, photo_digest, is_external, is_sold):
+        self.id = id
+        self.cpl_id = cpl_id
+        self.name = name
+        # A handful of values shared by every player
+        self.type = sys.intern(type)
+        self.card = StoredFile(card) if card else ""
+        self.photo = StoredFile(photo) if photo else ""
+        self.card_digest = card_digest
+        self.photo_digest = photo_digest
+        self.is_external = is_external
+        self.is_sold = is_sold
+        # What search looks in, lowercased once
+        self.text = f"{name}\n{cpl_id}\n{type}".lower()
+
+    @classmethod
+    def from_player(cls, player):
+        return cls(*(getattr(player, column) for column in COLUMNS))
+
+    def sold(self, is_sold):
+        return PlayerRecord(*(getattr(self, column) for column in COLUMNS[:-1]), is_sold)
+
+    def get_type_display(self):
+        return PLAYER_TYPES.get(self.type, self.type)
+
+    def rank(self, words):
+        # Same weights as the full-text index: name, then cpl_id, then type
+        fields = self.text.split("\n")
+        return sum(weight for word in words for weight, field in zip(FTS_WEIGHTS, fields) if word in field)
+
+
+class SeasonPlayers:
+    """The players of a season in id order, and the unsold ones among them.
+
+    Read only, so a request can page through it while a bid is applied:
+    every change builds a new one, in microseconds for a league. version is
+    the auction version of the season when the players were read.
+    """
+    __slots__ = ("players", "unsold", "loaded_at", "version")
+
+    def __init__(self, players, loaded_at, version=None):
+        self.players = players
+        self.unsold = [player for player in players if not player.is_sold]
+        self.loaded_at = loaded_at
+        self.version = version
+
+    def put(self, record):
+        players = self.players.copy()
+        i = bisect.bisect_left(players, record.id, key=by_id)
+        if i < len(players) and players[i].id == record.id:
+            players[i] = record
+        else:
+            players.insert(i, record)
+        return SeasonPlayers(players, self.loaded_at, self.version)
+
+    def remove(self, player_id):
+        return SeasonPlayers([player for player in self.players if player.id != player_id], self.loaded_at,
+                             self.version)
+
+    def mark_sold(self, player_id, is_sold):
+        i = bisect.bisect_left(self.players, player_id, key=by_id)
+        if i == len(self.players) or self.players[i].id != player_id or self.players[i].is_sold == is_sold:
+            return self
+        return self.put(self.players[i].sold(is_sold))
+
+    def search(self, keyword, unsold=False):
+        """Players with every word of keyword in their name, cpl_id or type, best match first."""
+        words = [word.lower() for word in WORD_RE.findall(keyword or "")]
+        if not words:
+            return []
+        matches = [player for player in (self.unsold if unsold else self.players)
+                   if all(word in player.text for word in words)]
+        return sorted(matches, key=lambda player: (-player.rank(words), player.id))
+
+
+def read_players(season_id):
+    """The season's players from the database, one query."""
+    loaded_at = time.monotonic()
+    # Before the query, a change committed during it moves the version past this one
+    version = auction_version(season_id)
+    rows = Player.objects.filter(season_id=season_id).order_by("id").values_list(*COLUMNS)
+    return SeasonPlayers([PlayerRecord(*row) for row in rows], loaded_at, version)
+
+
+class PlayerCatalog:
+    """Players of every season read so far, kept in the process.
+
+    A season is read on first use, then patched as this process commits
+    player saves, deletes and bids. It is read again once the season's
+    auction version moves, which every committed change of any process
+    sharing the page cache does, or after PLAYER_CATALOG_SECONDS.
+    Otherwise a worker would render its old copy and cache the page under
+    the version another worker just moved to. Safe from any thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seasons = {}
+        # Patches per season and drops of them all, a read overlapping one is not kept
+        self._changes = {}
+        self._drops = 0
+
+    def get(self, season_id, stale_only=False):
+        """The SeasonPlayers of the season, with stale_only None instead of reading it."""
+        with self._lock:
+            players = self._seasons.get(season_id)
+        if players is not None and time.monotonic() - players.loaded_at < settings.PLAYER_CATALOG_SECONDS \
+                and players.version == auction_version(season_id):
+            return players
+        if stale_only:
+            return None
+        with self._lock:
+            changes = self._drops, self._changes.get(season_id, 0)
+        players = read_players(season_id)
+        with self._lock:
+            if (self._drops, self._changes.get(season_id, 0)) == changes:
+                self._seasons[season_id] = players
+        return players
+
+    def patch(self, season_id, change):
+        with self._lock:
+            self._changes[season_id] = self._changes.get(season_id, 0) + 1
+            players = self._seasons.get(season_id)
+            # A season not read yet gets the change with its first read
+            if players is not None:
+                self._seasons[season_id] = change(players)
+
+    def drop(self, season_id=None):
+        """Read the season, or every season, again on next use."""
+        with self._lock:
+            if season_id is None:
+                self._drops += 1
+                self._seasons.clear()
+            else:
+                self._changes[season_id] = self._changes.get(season_id, 0) + 1
+                self._seasons.pop(season_id, None)
+
+
+player_catalog = PlayerCatalog()
+
+
+# The commit's own version bump may have run before these: a page rendered in
+# between from the old players would stay cached under the new version, so
+# every change moves the version on once more after it is applied
+
+def drop_and_bump(season_id=None):
+    player_catalog.drop(season_id)
+    bump_auction_version(season_id)
+
+
+def patch_and_bump(season_id, change):
+    player_catalog.patch(season_id, change)
+    bump_auction_version(season_id)
+
+
+def drop_on_commit(season_id=None):
+    # For bulk writes, which send no model signals
+    transaction.on_commit(lambda: drop_and_bump(season_id))
+
+
+@receiver(post_migrate)
+def drop_player_catalog(**kwargs):
+    # After migrate and flush, the players read may be gone from the database
+    player_catalog.drop()
+
+
+@receiver(post_save, sender=Player)
+def patch_saved_player(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # At the commit, the instance then holds what the database does
+    transaction.on_commit(lambda: patch_and_bump(
+        instance.season_id, lambda players: players.put(PlayerRecord.from_player(instance))))
+
+
+@receiver(post_delete, sender=Player)
+def patch_deleted_player(sender, instance, **kwargs):
+    player_id = instance.id
+    transaction.on_commit(lambda: patch_and_bump(
+        instance.season_id, lambda players: players.remove(player_id)))
+
+
+@receiver(auction_updated)
+def patch_sold_flag(sender, event, payload, **kwargs):
+    # Bids flip is_sold with an UPDATE, no Player signal is sent for it
+    if "player" not in payload:
+        # A bulk revert, of any season
+        drop_and_bump()
+        return
+    player = payload["player"]
+    patch_and_bump(payload["season"], lambda players: players.mark_sold(player["id"], player["is_sold"]))
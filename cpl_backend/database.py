@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+
+
+def sqlite_pragmas(connection, names=("journal_mode", "synchronous", "busy_timeout", "cache_size",
+                                      "mmap_size", "temp_store")):
+    """Current values, to check what a connection really runs with."""
+    with connection.cursor() as cursor:
+        return {name: cursor.execute(f"PRAGMA {name}").fetchone()[0] for name in names}
+
+
+def analyze(connection, tables=("players",)):
+    """Refresh the query planner statistics of SQLite after bulk writes.
+
+    Without them a search is counted through the season index, running the
+    full-text match once per player instead of once.
+    """
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for table in tables:
+            cursor.execute(f"ANALYZE {table}")
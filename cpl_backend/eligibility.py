@@ -0,0 +1,36 @@
+from .models import Team, max_bid_amount, season_rules
+
+ELIGIBILITY_FIELDS = ("id", "season", "name", "balance_amount", "internal_players_count", "external_players_count")
+
+
+def bid_eligibility(player, teams=None):
+    """Per team, the most it may bid for the player and whether it can bid at all.
+
+    The same rules as Bid.clean(), worked out in Python from one query on
+    the teams of the player's season, so the bid form costs the same for
+    any number of teams and the auctioneer sees a refusal before submitting it.
+    """
+    if teams is None:
+        teams = Team.objects.only(*ELIGIBILITY_FIELDS).filter(season_id=player.season_id).order_by("id")
+
+    rules = season_rules(player.season_id)
+    rows = []
+    for team in teams:
+        max_bid = max_bid_amount(team, player, rules)
+        if player.is_sold:
+            reason = "Player already sold"
+        elif team.balance_amount <= player.basic_amount:
+            reason = "Balance too low"
+        elif max_bid <= player.basic_amount:
+            reason = "Would not leave enough for the remaining players"
+        else:
+            reason = None
+        rows.append({
+            "id": team.id,
+            "name": team.name,
+            "balance_amount": team.balance_amount,
+            "max_bid": max(max_bid, 0),
+            "eligible": reason is None,
+            "reason": reason,
+        })
+    return rows
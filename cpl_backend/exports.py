@@ -0,0 +1,212 @@
+import csv
+import os
+import re
+import tempfile
+import zipfile
+from xml.sax.saxutils import escape
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import OuterRef, Subquery
+from django.http import StreamingHttpResponse
+
+from .models import Bid, TeamMember
+
+# Rows fetched from the database at once, and written out per chunk of the response
+CHUNK_SIZE = 2000
+
+ROSTER_COLUMNS = ("Team ID", "Team", "Player ID", "Player", "Type", "External", "Price paid")
+BID_COLUMNS = ("Bid", "Date", "Team ID", "Team", "Player ID", "Player", "Amount", "Sold")
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+# Control characters are not allowed in XML, not even escaped
+XML_ILLEGAL_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def roster_rows(season):
+    """Every team member of the season with the price paid, grouped by team."""
+    price = Bid.objects.filter(team=OuterRef("team"), player=OuterRef("players"), is_sold=True) \
+        .order_by("-id").values("bid_amount")[:1]
+    # In the order of the (team, players) constraint, no sort of the whole table
+    return TeamMember.objects.filter(season=season, team__isnull=False, players__isnull=False) \
+        .annotate(price=Subquery(price)).order_by("team_id", "players_id") \
+        .values_list("team__cpl_id", "team__name", "players__cpl_id", "players__name", "players__type",
+                     "players__is_external", "price") \
+        .iterator(chunk_size=CHUNK_SIZE)
+
+
+def bid_rows(season):
+    """Every bid of the season in the order it was placed."""
+    return Bid.objects.filter(season=season).order_by("id") \
+        .values_list("id", "created_at", "team__cpl_id", "team__name", "player__cpl_id", "player__name",
+                     "bid_amount", "is_sold") \
+        .iterator(chunk_size=CHUNK_SIZE)
+
+
+EXPORTS = {
+    "rosters": (ROSTER_COLUMNS, roster_rows),
+    "bids": (BID_COLUMNS, bid_rows),
+}
+
+
+def batches(rows, size=CHUNK_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Echo:
+    """File-like object handing back what is written, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def csv_chunks(columns, rows):
+    writer = csv.writer(Echo())
+    # The header goes out before the first query returns
+    yield writer.writerow(columns).encode()
+    for batch in batches(rows):
+        yield "".join(writer.writerow(row) for row in batch).encode()
+
+
+class Pipe:
+    """Write-only stream zipfile writes into, emptied after every batch of rows."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="{sheet}" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'),
+}
+
+
+def xlsx_cell(value):
+    if value is None:
+        return "<c/>"
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f"<c><v>{value}</v></c>"
+    text = escape(XML_ILLEGAL_RE.sub("", str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def xlsx_row(row):
+    return "<row>" + "".join(xlsx_cell(value) for value in row) + "</row>"
+
+
+def xlsx_chunks(columns, rows, sheet="Sheet1"):
+    """A one sheet workbook, zipped as it is written.
+
+    Strings are inline rather than shared, the worksheet goes out in the
+    order of the rows without a table of them kept in memory; zipfile puts
+    the sizes after each file when the stream can't seek back.
+    """
+    pipe = Pipe()
+    with zipfile.ZipFile(pipe, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content.format(sheet=escape(sheet)))
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as worksheet:
+            worksheet.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                            b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                            b'<sheetData>')
+            worksheet.write(xlsx_row(columns).encode())
+            yield pipe.drain()
+            for batch in batches(rows):
+                worksheet.write("".join(xlsx_row(row) for row in batch).encode())
+                yield pipe.drain()
+            worksheet.write(b"</sheetData></worksheet>")
+    yield pipe.drain()
+
+
+FORMATS = {
+    "csv": "text/csv",
+    "xlsx": XLSX_CONTENT_TYPE,
+}
+
+
+def export_chunks(name, format, season):
+    columns, rows = EXPORTS[name]
+    if format == "xlsx":
+        return xlsx_chunks(columns, rows(season), sheet=name.title())
+    return csv_chunks(columns, rows(season))
+
+
+async def aiterate(chunks):
+    # Under ASGI Django would read a sync iterator to the end before sending
+    # anything, pull it one chunk at a time instead
+    done = object()
+    while (chunk := await sync_to_async(next)(chunks, done)) is not done:
+        yield chunk
+
+
+def export_response(request, name, format):
+    """Streams the export of the request's season as it is read from the database, in constant memory."""
+    chunks = export_chunks(name, format, request.season)
+    if isinstance(request, ASGIRequest):
+        chunks = aiterate(chunks)
+    return StreamingHttpResponse(chunks, content_type=FORMATS[format], headers={
+        "Content-Disposition": f'attachment; filename="{name}.{format}"',
+    })
+
+
+def write_export(name, format, season, path):
+    """Write the export to path, swapped in once complete. Returns its size."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in export_chunks(name, format, season):
+                f.write(chunk)
+            size = f.tell()
+        os.chmod(temp, 0o644)
+        os.replace(temp, path)
+    except BaseException:
+        os.unlink(temp)
+        raise
+    return size
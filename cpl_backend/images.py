@@ -0,0 +1,169 @@
+import hashlib
+import io
+import logging
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .catalog import drop_and_bump
+from .models import Player, Team
+from .page_cache import bump_auction_version
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+# Longest edge in pixels
+SIZES = {
+    "thumb": 160,
+    "medium": 640,
+}
+FORMATS = {
+    "jpg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+}
+IMAGE_FIELDS = {
+    Player: ("photo", "card"),
+    Team: ("logo",),
+}
+DERIVATIVES_DIR = "derivatives"
+# What Pillow raises for a file it can't or won't decode
+UNREADABLE = (OSError, ValueError) + ((Image.DecompressionBombError,) if Image else ())
+
+
+def file_digest(fieldfile):
+    digest = hashlib.sha1()
+    with fieldfile.open("rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:20]
+
+
+def derivative_name(digest, size, ext):
+    # Named by content, so the same upload is converted once and the URL never changes
+    return f"{DERIVATIVES_DIR}/{digest[:2]}/{digest}-{size}.{ext}"
+
+
+def render_derivatives(fieldfile, digest, force=False):
+    if Image is None:
+        logger.warning("Pillow is not installed, image derivatives are disabled")
+        return False
+
+    wanted = [(size, ext) for size in SIZES for ext in FORMATS
+              if force or not default_storage.exists(derivative_name(digest, size, ext))]
+    if not wanted:
+        return True
+
+    with fieldfile.open("rb") as f:
+        image = Image.open(f)
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "L"):
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.convert("RGBA").getchannel("A"))
+            image = background
+
+        for size, ext in wanted:
+            resized = image.copy()
+            resized.thumbnail((SIZES[size], SIZES[size]))
+            format, options = FORMATS[ext]
+            buffer = io.BytesIO()
+            resized.save(buffer, format, **options)
+            name = derivative_name(digest, size, ext)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            default_storage.save(name, ContentFile(buffer.getvalue()))
+    return True
+
+
+def build_derivatives(instance, force=False):
+    """Generate derivatives for the image fields of a player or team.
+
+    Returns the digest fields that changed, they still have to be saved.
+    """
+    changed = []
+    for field in IMAGE_FIELDS[type(instance)]:
+        fieldfile = getattr(instance, field)
+        digest_field = f"{field}_digest"
+        digest = ""
+        if fieldfile and default_storage.exists(fieldfile.name):
+            try:
+                digest = file_digest(fieldfile)
+                if not render_derivatives(fieldfile, digest, force=force):
+                    digest = ""
+            except UNREADABLE as e:
+                # Not an image Pillow can read, the original is served as is
+                logger.warning("No derivatives for %s: %s", fieldfile.name, e)
+                digest = ""
+        if getattr(instance, digest_field) != digest:
+            setattr(instance, digest_field, digest)
+            changed.append(digest_field)
+    return changed
+
+
+def update_derivatives(queryset, force=False):
+    """Build the derivatives of the players or teams and save their digests.
+
+    Hashing and resizing take a while for a large upload, so this runs after
+    the commit that saved the images, not while it holds the write lock.
+    Returns the number of instances processed.
+    """
+    model = queryset.model
+    fields = IMAGE_FIELDS[model]
+    seasons = set()
+    done = 0
+    for instance in queryset.only("pk", "season", *fields, *[f"{field}_digest" for field in fields]).iterator():
+        done += 1
+        changed = build_derivatives(instance, force=force)
+        if changed:
+            model.objects.filter(pk=instance.pk).update(**{field: getattr(instance, field) for field in changed})
+            seasons.add(instance.season_id)
+    # .update() sends no model signals
+    for season_id in seasons:
+        if model is Player:
+            drop_and_bump(season_id)
+        else:
+            bump_auction_version(season_id)
+    return done
+
+
+def derivatives_on_commit(queryset):
+    transaction.on_commit(lambda: update_derivatives(queryset))
+
+
+def derivative_url(instance, field, size="medium", ext="jpg"):
+    if instance is None:
+        return ""
+    digest = getattr(instance, f"{field}_digest", "")
+    if digest:
+        return default_storage.url(derivative_name(digest, size, ext))
+    fieldfile = getattr(instance, field)
+    return fieldfile.url if fieldfile else ""
+
+
+def srcset(instance, field, ext="jpg"):
+    if instance is None:
+        return ""
+    digest = getattr(instance, f"{field}_digest", "")
+    if not digest:
+        return ""
+    return ", ".join(f"{default_storage.url(derivative_name(digest, size, ext))} {width}w"
+                     for size, width in SIZES.items())
+
+
+@receiver(post_save, sender=Player)
+@receiver(post_save, sender=Team)
+def build_saved_derivatives(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    fields = IMAGE_FIELDS[sender]
+    if update_fields is not None and not set(update_fields) & set(fields):
+        return
+    # Nothing to build or clear, no query
+    if any(getattr(instance, field) or getattr(instance, f"{field}_digest") for field in fields):
+        derivatives_on_commit(sender.objects.filter(pk=instance.pk))
@@ -0,0 +1,229 @@
+import csv
+import os
+import time
+import tracemalloc
+from decimal import Decimal
+from itertools import islice
+
+from django.db import connection, transaction
+from django.db.models.fields.files import FieldFile
+
+from .catalog import drop_on_commit
+from .constants import PLAYER_CHOICES
+from .database import analyze
+from .models import Player, Team, default_season
+from .images import derivatives_on_commit
+from .page_cache import bump_on_commit
+from .search import index_players
+
+CHUNK_SIZE = 1000
+
+TRUE_VALUES = {"1", "true", "yes", "y", "t"}
+PLAYER_TYPES = {key: key for key, label in PLAYER_CHOICES}
+PLAYER_TYPES.update({label.upper(): key for key, label in PLAYER_CHOICES})
+
+
+class ImportFailed(Exception):
+    pass
+
+
+def read_rows(path, format=None):
+    """Yield the rows of a CSV or XLSX file as dicts, one at a time."""
+    format = (format or os.path.splitext(str(path))[1].lstrip(".")).lower()
+
+    if format == "csv":
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            yield from csv.DictReader(f)
+    elif format == "xlsx":
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ImportFailed("XLSX import needs openpyxl, install it or convert the file to CSV")
+        # read_only streams the sheet instead of loading every cell
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(cell).strip() if cell is not None else "" for cell in next(rows, ())]
+            for values in rows:
+                yield {name: ("" if value is None else str(value)) for name, value in zip(header, values)}
+        finally:
+            workbook.close()
+    else:
+        raise ImportFailed(f"Unsupported format: {format}")
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def as_bool(value):
+    return str(value or "").strip().lower() in TRUE_VALUES
+
+
+def differs(instance, data):
+    for field, value in data.items():
+        current = getattr(instance, field)
+        if isinstance(current, FieldFile):
+            current = current.name or None
+        if current != value:
+            return True
+    return False
+
+
+class ImportStats:
+
+    def __init__(self, trace_memory=False):
+        self.rows = self.created = self.updated = 0
+        self.errors = []
+        self.trace_memory = trace_memory
+        self.peak_memory = None
+        self._started = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        if self.trace_memory:
+            tracemalloc.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self._started
+        if self.trace_memory:
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0
+
+    def __str__(self):
+        report = (f"{self.rows} rows in {self.seconds:.2f}s ({self.rows_per_second:.0f} rows/s): "
+                  f"{self.created} created, {self.updated} updated, {len(self.errors)} rejected")
+        if self.peak_memory is not None:
+            report += f", peak memory {self.peak_memory / 1024 / 1024:.1f} MiB"
+        return report
+
+
+def clean_player_rows(rows, first_line, stats):
+    players = {}
+    for line, row in enumerate(rows, start=first_line):
+        cpl_id = (row.get("cpl_id") or "").strip()
+        name = (row.get("name") or "").strip()
+        type = PLAYER_TYPES.get((row.get("type") or "").strip().upper())
+        if not cpl_id or not name or type is None:
+            stats.errors.append((line, "cpl_id, name and a valid type are required"))
+            continue
+        players[cpl_id] = {
+            "name": name,
+            "type": type,
+            "is_external": as_bool(row.get("is_external")),
+            "is_sold": as_bool(row.get("is_sold")),
+            "card": (row.get("card") or "").strip() or None,
+            "photo": (row.get("photo") or "").strip() or None,
+        }
+    return players
+
+
+def import_players(rows, season=None, chunk_size=CHUNK_SIZE, trace_memory=False):
+    """Insert or update players of the season from dict rows, chunk by chunk in one transaction.
+
+    Player.save() is bypassed, so the basic amount rule is applied here
+    while cleaning each chunk. Image derivatives are built after the commit.
+    """
+    season = season or default_season()
+    with ImportStats(trace_memory) as stats, transaction.atomic():
+        line = 2  # after the header
+        for chunk in chunked(rows, chunk_size):
+            stats.rows += len(chunk)
+            cleaned = clean_player_rows(chunk, line, stats)
+            line += len(chunk)
+
+            for data in cleaned.values():
+                data["basic_amount"] = season.basic_amount_for(data["is_external"])
+
+            existing = {player.cpl_id: player
+                        for player in Player.objects.filter(season=season, cpl_id__in=list(cleaned))}
+            new, changed = [], []
+            for cpl_id, data in cleaned.items():
+                player = existing.get(cpl_id)
+                # Only a new player takes is_sold from the file, bids own it afterwards
+                is_sold = data.pop("is_sold")
+                if player is None:
+                    new.append(Player(season=season, cpl_id=cpl_id, is_sold=is_sold, **data))
+                elif differs(player, data):
+                    # Unchanged rows are skipped, re-importing a file costs only the lookups
+                    for field, value in data.items():
+                        setattr(player, field, value)
+                    changed.append(player)
+
+            Player.objects.bulk_create(new, batch_size=chunk_size)
+            if changed:
+                Player.objects.bulk_update(changed, ["name", "type", "is_external", "card", "photo",
+                                                     "basic_amount"], batch_size=chunk_size)
+            index_players(new + changed)
+            with_images = [player.cpl_id for player in new + changed
+                           if player.card or player.photo or player.card_digest or player.photo_digest]
+            if with_images:
+                derivatives_on_commit(Player.objects.filter(season=season, cpl_id__in=with_images))
+            stats.created += len(new)
+            stats.updated += len(changed)
+        analyze(connection)
+        # Bulk writes send no model signals
+        bump_on_commit(season_id=season.id)
+        drop_on_commit(season.id)
+    return stats
+
+
+def import_teams(rows, season=None, chunk_size=CHUNK_SIZE, trace_memory=False):
+    season = season or default_season()
+    with ImportStats(trace_memory) as stats, transaction.atomic():
+        line = 2
+        for chunk in chunked(rows, chunk_size):
+            stats.rows += len(chunk)
+            teams = {}
+            for row_line, row in enumerate(chunk, start=line):
+                cpl_id = (row.get("cpl_id") or "").strip()
+                name = (row.get("name") or "").strip()
+                if not cpl_id or not name:
+                    stats.errors.append((row_line, "cpl_id and name are required"))
+                    continue
+                try:
+                    total_amount = Decimal(row.get("total_amount") or season.team_basic_amount)
+                except ArithmeticError:
+                    stats.errors.append((row_line, "total_amount is not a number"))
+                    continue
+                teams[cpl_id] = {
+                    "name": name,
+                    "description": row.get("description") or "",
+                    "logo": (row.get("logo") or "").strip(),
+                    "total_amount": total_amount,
+                }
+            line += len(chunk)
+
+            existing = {team.cpl_id: team for team in Team.objects.filter(season=season, cpl_id__in=list(teams))}
+            new, changed = [], []
+            for cpl_id, data in teams.items():
+                team = existing.get(cpl_id)
+                if team is None:
+                    team = Team(season=season, cpl_id=cpl_id, **data)
+                    new.append(team)
+                else:
+                    for field, value in data.items():
+                        setattr(team, field, value)
+                    changed.append(team)
+                # Team.save() is bypassed as well
+                team.balance_amount = team.total_amount - team.expended_amount
+
+            Team.objects.bulk_create(new, batch_size=chunk_size)
+            if changed:
+                Team.objects.bulk_update(changed, ["name", "description", "logo", "total_amount",
+                                                   "balance_amount"], batch_size=chunk_size)
+            with_logos = [team.cpl_id for team in new + changed if team.logo or team.logo_digest]
+            if with_logos:
+                derivatives_on_commit(Team.objects.filter(season=season, cpl_id__in=with_logos))
+            stats.created += len(new)
+            stats.updated += len(changed)
+        # Bulk writes send no model signals
+        bump_on_commit(season_id=season.id)
+    return stats
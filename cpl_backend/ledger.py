@@ -0,0 +1,141 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max
+
+from .models import AuctionEvent, TeamSnapshot, Team, TeamMember
+from .page_cache import bump_on_commit
+
+# Fields replayed from the ledger and kept on Team
+TEAM_STATE_FIELDS = ("expended_amount", "internal_players_count", "external_players_count",
+                     "internal_sold_amount", "external_sold_amount")
+
+
+class TeamState:
+    """A team's money and roster as rebuilt from the ledger."""
+
+    __slots__ = ("team_id", "event_id", "expended_amount", "internal_players_count",
+                 "external_players_count", "internal_sold_amount", "external_sold_amount", "members")
+
+    def __init__(self, team_id, snapshot=None):
+        self.team_id = team_id
+        if snapshot is None:
+            self.event_id = 0
+            self.expended_amount = self.internal_sold_amount = self.external_sold_amount = Decimal(0)
+            self.internal_players_count = self.external_players_count = 0
+            self.members = set()
+        else:
+            self.event_id = snapshot.event_id
+            for field in TEAM_STATE_FIELDS:
+                setattr(self, field, getattr(snapshot, field))
+            self.members = set(snapshot.members)
+
+    def apply(self, event):
+        sign = -1 if event.kind == AuctionEvent.REVERTED else 1
+        self.expended_amount += sign * event.amount
+        if event.is_sold:
+            prefix = "external" if event.is_external else "internal"
+            setattr(self, f"{prefix}_players_count", getattr(self, f"{prefix}_players_count") + sign)
+            setattr(self, f"{prefix}_sold_amount", getattr(self, f"{prefix}_sold_amount") + sign * event.amount)
+            if sign > 0:
+                self.members.add(event.player_id)
+            else:
+                self.members.discard(event.player_id)
+        self.event_id = event.id
+
+    def snapshot(self):
+        return TeamSnapshot(team_id=self.team_id, event_id=self.event_id, members=sorted(self.members),
+                            **{field: getattr(self, field) for field in TEAM_STATE_FIELDS})
+
+
+def latest_snapshots(team_ids=None):
+    latest = TeamSnapshot.objects.values("team_id").annotate(last=Max("event_id"))
+    if team_ids is not None:
+        latest = latest.filter(team_id__in=team_ids)
+    pairs = {row["team_id"]: row["last"] for row in latest}
+    snapshots = TeamSnapshot.objects.filter(team_id__in=pairs.keys(), event_id__in=set(pairs.values()))
+    return {s.team_id: s for s in snapshots if pairs[s.team_id] == s.event_id}
+
+
+def replay(team_ids=None, until=None):
+    """Team states from the latest snapshots plus the events after them, up to the event until.
+
+    Costs three queries whatever the number of teams or events before
+    the snapshots.
+    """
+    if team_ids is None:
+        team_ids = list(Team.objects.values_list("id", flat=True))
+    snapshots = latest_snapshots(team_ids)
+    states = {team_id: TeamState(team_id, snapshots.get(team_id)) for team_id in team_ids}
+
+    oldest = min((state.event_id for state in states.values()), default=0)
+    tail = AuctionEvent.objects.filter(team_id__in=team_ids, id__gt=oldest).order_by("id")
+    if until is not None:
+        tail = tail.filter(id__lte=until)
+    for event in tail.iterator(chunk_size=2000):
+        state = states[event.team_id]
+        if event.id > state.event_id:
+            state.apply(event)
+    return states
+
+
+def take_snapshots():
+    # Read first, an event committed during the replay is left to the next snapshot
+    last_event = AuctionEvent.objects.aggregate(last=Max("id"))["last"] or 0
+    states = replay(until=last_event)
+    for state in states.values():
+        # Teams without new events are moved up to the current event too
+        state.event_id = last_event
+    TeamSnapshot.objects.bulk_create([state.snapshot() for state in states.values()], ignore_conflicts=True)
+    return len(states)
+
+
+def check_consistency():
+    """Differences between the ledger and the live tables, as (team_id, field, ledger, live)."""
+    states = replay()
+    problems = []
+    for team in Team.objects.filter(id__in=states.keys()):
+        state = states[team.id]
+        for field in TEAM_STATE_FIELDS:
+            if getattr(team, field) != getattr(state, field):
+                problems.append((team.id, field, getattr(state, field), getattr(team, field)))
+        if team.balance_amount != team.total_amount - state.expended_amount:
+            problems.append((team.id, "balance_amount", team.total_amount - state.expended_amount,
+                             team.balance_amount))
+
+    members = {}
+    for team_id, player_id in TeamMember.objects.values_list("team_id", "players_id"):
+        members.setdefault(team_id, set()).add(player_id)
+    for team_id, state in states.items():
+        if members.get(team_id, set()) != state.members:
+            problems.append((team_id, "members", sorted(state.members), sorted(members.get(team_id, ()))))
+    return problems
+
+
+def rebuild(team_ids=None):
+    """Overwrite team totals and rosters with what the ledger says."""
+    with transaction.atomic():
+        states = replay(team_ids)
+        teams = list(Team.objects.select_for_update().filter(id__in=states.keys()))
+        for team in teams:
+            state = states[team.id]
+            for field in TEAM_STATE_FIELDS:
+                setattr(team, field, getattr(state, field))
+            team.balance_amount = team.total_amount - team.expended_amount
+        Team.objects.bulk_update(teams, [*TEAM_STATE_FIELDS, "balance_amount"])
+        seasons = {team.id: team.season_id for team in teams}
+
+        existing = {}
+        for member_id, team_id, player_id in TeamMember.objects.filter(
+                team_id__in=states.keys()).values_list("id", "team_id", "players_id"):
+            existing.setdefault(team_id, {})[player_id] = member_id
+        stale, missing = [], []
+        for team_id, state in states.items():
+            current = existing.get(team_id, {})
+            stale += [member_id for player_id, member_id in current.items() if player_id not in state.members]
+            missing += [TeamMember(season_id=seasons[team_id], team_id=team_id, players_id=player_id)
+                        for player_id in state.members if player_id not in current]
+        TeamMember.objects.filter(id__in=stale).delete()
+        TeamMember.objects.bulk_create(missing)
+        bump_on_commit()
+    return states
@@ -0,0 +1,99 @@
+import asyncio
+import itertools
+import json
+import threading
+from collections import deque
+
+from django.dispatch import receiver
+
+from .signals import auction_updated
+
+HEARTBEAT_SECONDS = 15
+QUEUE_SIZE = 100
+REPLAY_SIZE = 200
+
+
+class Broadcaster:
+    """In-process pub/sub feeding the server-sent events stream.
+
+    Every committed change is encoded once and handed to the queue of each
+    listener following its season, so one write fans out to any number of
+    connected screens.
+    """
+
+    def __init__(self, queue_size=QUEUE_SIZE, replay_size=REPLAY_SIZE):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._listeners = set()
+        # Kept so reconnecting clients catch up from Last-Event-ID
+        self._recent = deque(maxlen=replay_size)
+
+    def publish(self, event, data, season_id=None):
+        """Send to the listeners of season_id, or to every listener without one."""
+        with self._lock:
+            event_id = next(self._ids)
+            message = f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n".encode()
+            self._recent.append((event_id, season_id, message))
+            listeners = [listener for listener in self._listeners
+                         if season_id is None or listener[2] in (None, season_id)]
+
+        for listener in listeners:
+            loop, queue, _ = listener
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, message)
+            except RuntimeError:
+                # The listener's event loop is gone
+                self._discard(listener)
+        return event_id
+
+    @staticmethod
+    def _offer(queue, message):
+        if queue.full():
+            # A client that can't keep up is dropped, it reconnects and replays
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+        else:
+            queue.put_nowait(message)
+
+    def _discard(self, listener):
+        with self._lock:
+            self._listeners.discard(listener)
+
+    @property
+    def listener_count(self):
+        return len(self._listeners)
+
+    async def listen(self, last_event_id=None, heartbeat=HEARTBEAT_SECONDS, season_id=None):
+        listener = (asyncio.get_running_loop(), asyncio.Queue(self.queue_size), season_id)
+        with self._lock:
+            backlog = [message for event_id, event_season_id, message in self._recent
+                       if last_event_id is not None and event_id > last_event_id
+                       and (season_id is None or event_season_id in (None, season_id))]
+            self._listeners.add(listener)
+
+        try:
+            yield b"retry: 3000\n\n"
+            for message in backlog:
+                yield message
+            queue = listener[1]
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                if message is None:
+                    return
+                yield message
+        finally:
+            self._discard(listener)
+
+
+broadcaster = Broadcaster()
+
+
+@receiver(auction_updated)
+def broadcast_auction_update(sender, event, payload, **kwargs):
+    broadcaster.publish(event, payload, season_id=payload.get("season"))
@@ -0,0 +1,157 @@
+import asyncio
+import random
+import time
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.urls import reverse
+
+from .benchmarks import percentile
+from .writes import PrioritizeWrites
+
+HOST = "localhost"
+
+
+async def asgi_request(application, method, url, headers=(), body=b""):
+    """(status, headers, body) of one request sent straight to the ASGI application."""
+    parts = urlsplit(url)
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": parts.path,
+        "raw_path": parts.path.encode(),
+        "query_string": parts.query.encode(),
+        "headers": [(b"host", HOST.encode()), *((name.encode(), value.encode()) for name, value in headers)],
+        "client": ("127.0.0.1", 0),
+        "server": (HOST, 80),
+    }
+    received = False
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # The client stays connected, Django stops listening once it has answered
+        await asyncio.Event().wait()
+
+    response = {"body": []}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = [(name.decode().lower(), value.decode()) for name, value in message["headers"]]
+        elif message["type"] == "http.response.body":
+            response["body"].append(message.get("body", b""))
+
+    await application(scope, receive, send)
+    return response["status"], response["headers"], b"".join(response["body"])
+
+
+class Auctioneer:
+    """Places open bids one after the other and times each, from POST to answer."""
+
+    def __init__(self, application, league, interval):
+        self.application = application
+        self.league = league
+        self.interval = interval
+        self.cookie = None
+        self.latencies = []
+        self.errors = 0
+
+    async def login(self):
+        # The bid form sets the CSRF cookie, its value is accepted as the form token
+        status, headers, body = await asgi_request(self.application, "GET",
+                                                   reverse("bids", args=[self.league.player_id()]))
+        for name, value in headers:
+            if name == "set-cookie" and value.startswith("csrftoken="):
+                self.cookie = value.split(";")[0].split("=", 1)[1]
+
+    async def run(self, stop):
+        while not stop.is_set():
+            body = urlencode({
+                "csrfmiddlewaretoken": self.cookie,
+                "player": self.league.player_id(),
+                "team": self.league.random.choice(self.league.team_ids),
+                "amount": 700,
+                "next": reverse("to_bid"),
+            }).encode()
+            started = time.perf_counter()
+            status, headers, _ = await asgi_request(
+                self.application, "POST", reverse("save_bid"), body=body,
+                headers=[("content-type", "application/x-www-form-urlencoded"),
+                         ("cookie", f"csrftoken={self.cookie}")])
+            self.latencies.append((time.perf_counter() - started) * 1000)
+            if status != 302:
+                self.errors += 1
+            await asyncio.sleep(self.interval)
+
+
+class Spectator:
+    """Polls the list, roster and bidding pages like a phone in the crowd."""
+
+    def __init__(self, application, league, interval, seed):
+        self.application = application
+        self.league = league
+        self.interval = interval
+        self.random = random.Random(seed)
+        self.latencies = []
+        self.errors = 0
+
+    def url(self):
+        return self.random.choice([
+            lambda: reverse("players") + f"?page={self.random.randint(1, 5)}",
+            lambda: reverse("teams"),
+            lambda: reverse("team", args=[self.random.choice(self.league.team_ids)]),
+            lambda: reverse("to_bid"),
+            lambda: reverse("player_search") + "?search=player 1",
+        ])()
+
+    async def run(self, stop):
+        # Spread over the first interval, not all at once
+        await asyncio.sleep(self.random.uniform(0, self.interval))
+        while not stop.is_set():
+            started = time.perf_counter()
+            status, _, _ = await asgi_request(self.application, "GET", self.url())
+            self.latencies.append((time.perf_counter() - started) * 1000)
+            if status != 200:
+                self.errors += 1
+            await asyncio.sleep(self.interval * self.random.uniform(0.5, 1.5))
+
+
+async def run_phase(application, league, spectators, seconds, poll_interval, bid_interval):
+    """Bid latency while spectators poll, for seconds."""
+    auctioneer = Auctioneer(application, league, bid_interval)
+    await auctioneer.login()
+    crowd = [Spectator(application, league, poll_interval, seed=i) for i in range(spectators)]
+
+    stop = asyncio.Event()
+    tasks = [asyncio.create_task(auctioneer.run(stop))]
+    tasks += [asyncio.create_task(spectator.run(stop)) for spectator in crowd]
+    await asyncio.sleep(seconds)
+    stop.set()
+    await asyncio.gather(*tasks)
+
+    bids = auctioneer.latencies
+    pages = [latency for spectator in crowd for latency in spectator.latencies]
+    return {
+        "spectators": spectators,
+        "bids": len(bids),
+        "bid_p50_ms": percentile(bids, 50) if bids else None,
+        "bid_p95_ms": percentile(bids, 95) if bids else None,
+        "bid_max_ms": max(bids) if bids else None,
+        "pages_per_second": len(pages) / seconds,
+        "page_p95_ms": percentile(pages, 95) if pages else None,
+        "errors": auctioneer.errors + sum(spectator.errors for spectator in crowd),
+    }
+
+
+async def run_load_test(league, crowds, seconds=5, poll_interval=1.0, bid_interval=0.5):
+    """One phase per crowd size, through the same ASGI stack as cpl/asgi.py."""
+    application = PrioritizeWrites(ASGIHandler(), settings.READ_CONCURRENCY, unlimited=[reverse("live")])
+    return [await run_phase(application, league, spectators, seconds, poll_interval, bid_interval)
+            for spectators in crowds]
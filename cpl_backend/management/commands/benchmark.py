@@ -0,0 +1,64 @@
+import json
+import platform
+import time
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from cpl_backend.benchmarks import League, check_results, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = ("Seed a synthetic league in a throwaway test database, drive every endpoint and "
+            "fail on query budget or latency regressions")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--teams", type=int, default=20)
+        parser.add_argument("--players", type=int, default=5000)
+        parser.add_argument("--bids", type=int, default=100, help="Sold bids spread over the teams")
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--output", help="Write the results as JSON to this file")
+        parser.add_argument("--baseline", help="JSON results of an earlier run to compare the p95 latencies with")
+        parser.add_argument("--tolerance", type=float, default=0.5,
+                            help="Allowed p95 slowdown over the baseline, 0.5 is 50%%")
+
+    def handle(self, teams, players, bids, repeat, output=None, baseline=None, tolerance=0.5, **options):
+        previous = None
+        if baseline:
+            with open(baseline) as f:
+                previous = json.load(f)["endpoints"]
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            started = time.perf_counter()
+            league = League(teams=teams, players=players, bids=bids)
+            seed_seconds = time.perf_counter() - started
+            results = run_benchmarks(league, repeat=repeat)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(f"{teams} teams, {players} players, {bids} bids seeded in {seed_seconds:.1f}s")
+        self.stdout.write(f"{'endpoint':<22}{'queries':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'warm ms':>9}")
+        for name, result in results.items():
+            warm = f"{result['warm_p50_ms']:.1f}" if result["warm_p50_ms"] is not None else "-"
+            self.stdout.write(f"{name:<22}{result['queries']:>4}/{result['query_budget']:<4}"
+                              f"{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}{warm:>9}")
+
+        if output:
+            with open(output, "w") as f:
+                json.dump({
+                    "league": {"teams": teams, "players": players, "bids": bids, "repeat": repeat},
+                    "environment": {"python": platform.python_version(), "django": django.get_version(),
+                                    "database": connection.vendor},
+                    "endpoints": results,
+                }, f, indent=2)
+            self.stdout.write(f"Results written to {output}")
+
+        failures = check_results(results, previous, tolerance)
+        if failures:
+            raise CommandError("\n".join(failures))
+        self.stdout.write(self.style.SUCCESS("All endpoints within budget"))
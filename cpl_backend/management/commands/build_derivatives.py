@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from cpl_backend.images import IMAGE_FIELDS, update_derivatives
+from cpl_backend.publisher import publish
+
+
+class Command(BaseCommand):
+    help = "Generate thumbnail, medium and WebP copies of existing player and team images"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Render again even if the copies exist")
+
+    def handle(self, force=False, **options):
+        for model in IMAGE_FIELDS:
+            # Saves the digests, then moves the pages and the player catalog on
+            done = update_derivatives(model.objects.all(), force=force)
+            self.stdout.write(f"{model._meta.verbose_name_plural}: {done} processed")
+        if settings.SNAPSHOT_DIR:
+            # The display snapshots link the image copies too
+            changed = publish(settings.SNAPSHOT_DIR)
+            self.stdout.write(f"{len(changed)} snapshot files updated")
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cpl_backend.importer import CHUNK_SIZE, ImportFailed, read_rows, import_players, import_teams
+from cpl_backend.models import Season
+
+IMPORTERS = {
+    "players": import_players,
+    "teams": import_teams,
+}
+
+
+class Command(BaseCommand):
+    help = "Stream players or teams from a CSV/XLSX file into the database in bulk"
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(IMPORTERS))
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "xlsx"], help="Defaults to the file extension")
+        parser.add_argument("--season", help="Slug of the season (default: CPL_SEASON, else the newest)")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+        parser.add_argument("--trace-memory", action="store_true",
+                            help="Report peak Python memory (slows the import down)")
+
+    def handle(self, kind, path, format=None, season=None, chunk_size=CHUNK_SIZE, trace_memory=False, **options):
+        try:
+            season = Season.objects.get(slug=season) if season else None
+        except Season.DoesNotExist:
+            raise CommandError(f"No season {season}")
+        try:
+            stats = IMPORTERS[kind](read_rows(path, format), season=season, chunk_size=chunk_size,
+                                    trace_memory=trace_memory)
+        except (ImportFailed, OSError) as e:
+            raise CommandError(str(e))
+
+        for line, error in stats.errors[:20]:
+            self.stderr.write(f"line {line}: {error}")
+        if len(stats.errors) > 20:
+            self.stderr.write(f"... and {len(stats.errors) - 20} more rejected rows")
+        self.stdout.write(self.style.SUCCESS(str(stats)))
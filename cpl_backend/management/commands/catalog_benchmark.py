@@ -0,0 +1,44 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from cpl_backend.benchmarks import League, compare_catalog, memory_footprint
+from cpl_backend.models import default_season
+
+
+class Command(BaseCommand):
+    help = ("Memory taken by the player catalog and latency of the player lists served from it "
+            "against the database, in a throwaway test database")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--teams", type=int, default=20)
+        parser.add_argument("--players", type=int, default=5000)
+        parser.add_argument("--bids", type=int, default=100, help="Sold bids spread over the teams")
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--json", action="store_true", dest="as_json")
+
+    def handle(self, teams, players, bids, repeat, as_json=False, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            league = League(teams=teams, players=players, bids=bids)
+            memory = memory_footprint(default_season())
+            results = compare_catalog(league, repeat=repeat)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if as_json:
+            self.stdout.write(json.dumps({"memory": memory, "endpoints": results}))
+            return
+        self.stdout.write(f"{memory['players']} players: catalog {memory['catalog_bytes'] / 1024:.0f} KiB "
+                          f"({memory['catalog_bytes_per_player']:.0f} B each), model instances "
+                          f"{memory['orm_bytes'] / 1024:.0f} KiB ({memory['orm_bytes_per_player']:.0f} B each)")
+        self.stdout.write(f"{'endpoint':<20}{'catalog p50':>12}{'p95':>8}{'queries':>9}"
+                          f"{'orm p50':>10}{'p95':>8}{'queries':>9}")
+        for name, catalog in results["catalog"].items():
+            orm = results["orm"][name]
+            self.stdout.write(f"{name:<20}{catalog['p50_ms']:>12.2f}{catalog['p95_ms']:>8.2f}{catalog['queries']:>9}"
+                              f"{orm['p50_ms']:>10.2f}{orm['p95_ms']:>8.2f}{orm['queries']:>9}")
@@ -0,0 +1,153 @@
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections, connection, connections
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from cpl_backend.benchmarks import percentile
+from cpl_backend.importer import import_players
+from cpl_backend.models import Bid, Player, Team, default_season
+from cpl_backend.pagination import PAGE_SIZE
+from cpl_backend.standings import team_standings
+
+# Environment of each profile compared by --compare, see DATABASES in settings.py
+PROFILES = {
+    "sqlite-stock": {"CPL_DB": "sqlite", "CPL_SQLITE_TUNED": "0", "CPL_CONN_MAX_AGE": "0"},
+    "sqlite-tuned": {"CPL_DB": "sqlite", "CPL_SQLITE_TUNED": "1"},
+    "postgres": {"CPL_DB": "postgres"},
+}
+
+
+class Command(BaseCommand):
+    help = ("Concurrent read and write throughput of the configured database in a throwaway test "
+            "database, or of every profile with --compare")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=8)
+        parser.add_argument("--writers", type=int, default=2)
+        parser.add_argument("--seconds", type=float, default=5)
+        parser.add_argument("--teams", type=int, default=20)
+        parser.add_argument("--players", type=int, default=2000)
+        parser.add_argument("--compare", action="store_true", help="Run every profile in its own process")
+        parser.add_argument("--json", action="store_true", dest="as_json")
+
+    def handle(self, compare=False, as_json=False, **options):
+        if compare:
+            results = {name: self.run_profile(env, options) for name, env in PROFILES.items()}
+        else:
+            results = {settings.CPL_DB: self.run(**options)}
+
+        if as_json:
+            self.stdout.write(json.dumps(results))
+            return
+        self.stdout.write(f"{options['readers']} readers, {options['writers']} writers, {options['seconds']}s")
+        self.stdout.write(f"{'profile':<14}{'reads/s':>9}{'p95 ms':>8}{'writes/s':>10}{'p95 ms':>8}{'errors':>8}")
+        for name, result in results.items():
+            if "error" in result:
+                self.stdout.write(f"{name:<14}skipped: {result['error']}")
+                continue
+            self.stdout.write(f"{name:<14}{result['reads_per_second']:>9.0f}{result['read_p95_ms']:>8.1f}"
+                              f"{result['writes_per_second']:>10.0f}{result['write_p95_ms']:>8.1f}"
+                              f"{result['errors']:>8}")
+
+    def run_profile(self, env, options):
+        args = [f"--{name}={options[name]}" for name in ("readers", "writers", "seconds", "teams", "players")]
+        process = subprocess.run([sys.executable, "-m", "django", "db_benchmark", "--json", *args],
+                                 env={**os.environ, **env}, cwd=settings.BASE_DIR, capture_output=True, text=True)
+        if process.returncode:
+            lines = process.stderr.strip().splitlines()
+            return {"error": lines[-1] if lines else f"exit code {process.returncode}"}
+        return next(iter(json.loads(process.stdout.strip().splitlines()[-1]).values()))
+
+    def run(self, readers, writers, seconds, teams, players, **options):
+        setup_test_environment()
+        try:
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        except DatabaseError as e:
+            teardown_test_environment()
+            raise CommandError(f"Cannot create the test database: {e}")
+        try:
+            team_ids, player_ids = seed(teams, players)
+            connection.close()
+            return measure(readers, writers, seconds, team_ids, player_ids)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+
+def seed(teams, players):
+    # Budgets large enough that the writers never run out of money
+    season = default_season()
+    Team.objects.bulk_create([
+        Team(season=season, cpl_id=f"DB{i}", name=f"Team {i}", description="", logo="",
+             total_amount=90_000_000, balance_amount=90_000_000) for i in range(teams)
+    ])
+    import_players({"cpl_id": f"DB{i}", "name": f"Player {i}", "type": "BATSMAN", "is_external": ""}
+                   for i in range(players))
+    return list(Team.objects.values_list("id", flat=True)), list(Player.objects.values_list("id", flat=True))
+
+
+def measure(readers, writers, seconds, team_ids, player_ids):
+    stop = threading.Event()
+    barrier = threading.Barrier(readers + writers + 1)
+    timings = {"read": [], "write": []}
+    errors = []
+
+    season = default_season()
+
+    def read(rng):
+        team_standings(season)
+        offset = rng.randrange(0, max(len(player_ids) - PAGE_SIZE, 1))
+        list(Player.objects.filter(season=season, is_sold=False).order_by("id")[offset:offset + PAGE_SIZE])
+
+    def write(rng):
+        # An open bid goes through the same locking and ledger as a sale
+        Bid.objects.create(team_id=rng.choice(team_ids), player_id=rng.choice(player_ids),
+                           bid_amount=700, is_sold=False)
+
+    def worker(kind, operation, seed):
+        rng = random.Random(seed)
+        samples = []
+        barrier.wait()
+        try:
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    operation(rng)
+                    samples.append((time.perf_counter() - started) * 1000)
+                except DatabaseError as e:
+                    errors.append(str(e))
+                # What the end of a request does, closes the connection unless it is persistent
+                close_old_connections()
+        finally:
+            timings[kind] += samples
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker, args=("read", read, i)) for i in range(readers)]
+    threads += [threading.Thread(target=worker, args=("write", write, -i)) for i in range(1, writers + 1)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    reads, writes = timings["read"], timings["write"]
+    return {
+        "reads_per_second": len(reads) / seconds,
+        "read_p50_ms": percentile(reads, 50) if reads else None,
+        "read_p95_ms": percentile(reads, 95) if reads else None,
+        "writes_per_second": len(writes) / seconds,
+        "write_p50_ms": percentile(writes, 50) if writes else None,
+        "write_p95_ms": percentile(writes, 95) if writes else None,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+    }
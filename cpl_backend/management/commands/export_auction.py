@@ -0,0 +1,32 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cpl_backend.exports import EXPORTS, FORMATS, write_export
+from cpl_backend.models import Season, default_season
+
+
+class Command(BaseCommand):
+    help = "Write the team rosters with the price paid and the full bid log, as the admin exports them"
+
+    def add_arguments(self, parser):
+        parser.add_argument("exports", nargs="*", help="What to export: %s (default: all)" % ", ".join(EXPORTS))
+        parser.add_argument("--format", choices=FORMATS, default="csv")
+        parser.add_argument("--output", default=".", help="Output directory")
+        parser.add_argument("--season", help="Slug of the season (default: CPL_SEASON, else the newest)")
+
+    def handle(self, exports=None, format="csv", output=".", season=None, **options):
+        unknown = set(exports) - set(EXPORTS)
+        if unknown:
+            raise CommandError(f"Unknown export {', '.join(sorted(unknown))}, choose from {', '.join(EXPORTS)}")
+        try:
+            season = Season.objects.get(slug=season) if season else default_season()
+        except Season.DoesNotExist:
+            raise CommandError(f"No season {season}")
+        os.makedirs(output, exist_ok=True)
+        for name in exports or EXPORTS:
+            started = time.perf_counter()
+            path = os.path.join(output, f"{name}.{format}")
+            size = write_export(name, format, season, path)
+            self.stdout.write(f"{path}: {size} bytes in {time.perf_counter() - started:.3f}s")
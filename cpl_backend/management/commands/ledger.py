@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cpl_backend.ledger import check_consistency, rebuild, take_snapshots
+
+
+class Command(BaseCommand):
+    help = "Check the team tables against the bid ledger, snapshot it, or rebuild the teams from it"
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["check", "snapshot", "rebuild"])
+        parser.add_argument("--team", type=int, action="append", dest="teams",
+                            help="Team id to rebuild, can be repeated (default: all teams)")
+
+    def handle(self, action, teams=None, **options):
+        started = time.perf_counter()
+        if action == "snapshot":
+            count = take_snapshots()
+            self.stdout.write(f"{count} team snapshots written in {time.perf_counter() - started:.3f}s")
+        elif action == "rebuild":
+            states = rebuild(teams)
+            self.stdout.write(f"{len(states)} teams rebuilt in {time.perf_counter() - started:.3f}s")
+        else:
+            problems = check_consistency()
+            elapsed = time.perf_counter() - started
+            for team_id, field, ledger, live in problems:
+                self.stdout.write(f"team {team_id}: {field} is {live}, the ledger says {ledger}")
+            if problems:
+                raise CommandError(f"{len(problems)} differences found in {elapsed:.3f}s")
+            self.stdout.write(f"Teams match the ledger ({elapsed:.3f}s)")
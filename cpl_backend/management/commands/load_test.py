@@ -0,0 +1,60 @@
+import asyncio
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, connections
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from cpl_backend.benchmarks import League
+from cpl_backend.loadtest import run_load_test
+from cpl_backend.models import Team
+
+
+class Command(BaseCommand):
+    help = ("Bid latency while crowds of spectators poll the pages, through the ASGI application "
+            "in a throwaway test database")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--spectators", default="0,250,1000,2000",
+                            help="Crowd sizes, one phase each, comma separated")
+        parser.add_argument("--seconds", type=float, default=5, help="Length of each phase")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between a spectator's polls")
+        parser.add_argument("--bid-interval", type=float, default=0.5, help="Seconds between two bids")
+        parser.add_argument("--teams", type=int, default=10)
+        parser.add_argument("--players", type=int, default=2000)
+        parser.add_argument("--json", action="store_true", dest="as_json")
+
+    def handle(self, spectators, seconds, poll_interval, bid_interval, teams, players, as_json=False, **options):
+        try:
+            crowds = [int(size) for size in spectators.split(",")]
+        except ValueError:
+            raise CommandError("--spectators takes numbers, e.g. 0,500,2000")
+
+        setup_test_environment()
+        try:
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        except DatabaseError as e:
+            teardown_test_environment()
+            raise CommandError(f"Cannot create the test database: {e}")
+        try:
+            league = League(teams=teams, players=players, bids=0)
+            # Open bids spend the budget too, the auctioneer must not run out
+            Team.objects.update(total_amount=90_000_000, balance_amount=90_000_000)
+            connection.close()
+            results = asyncio.run(run_load_test(league, crowds, seconds, poll_interval, bid_interval))
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if as_json:
+            self.stdout.write(json.dumps(results))
+            return
+        self.stdout.write(f"{seconds}s per phase, a bid every {bid_interval}s, spectators poll every {poll_interval}s")
+        self.stdout.write(f"{'spectators':>10}{'bids':>7}{'bid p50':>9}{'bid p95':>9}{'bid max':>9}"
+                          f"{'pages/s':>9}{'page p95':>10}{'errors':>8}")
+        for result in results:
+            self.stdout.write(f"{result['spectators']:>10}{result['bids']:>7}{result['bid_p50_ms']:>9.1f}"
+                              f"{result['bid_p95_ms']:>9.1f}{result['bid_max_ms']:>9.1f}"
+                              f"{result['pages_per_second']:>9.0f}{result['page_p95_ms'] or 0:>10.1f}"
+                              f"{result['errors']:>8}")
@@ -0,0 +1,22 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from cpl_backend.publisher import publish
+
+
+class Command(BaseCommand):
+    help = ("Write the display pages and their JSON as static files, run it at startup so the "
+            "files exist before the first bid")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default=settings.SNAPSHOT_DIR,
+                            help="Output directory (default: CPL_SNAPSHOT_DIR)")
+
+    def handle(self, output=None, **options):
+        if not output:
+            raise CommandError("Set CPL_SNAPSHOT_DIR or pass --output")
+        started = time.perf_counter()
+        changed = publish(output)
+        self.stdout.write(f"{len(changed)} files updated in {output} in {time.perf_counter() - started:.3f}s")
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cpl_backend.models import Bid
+from cpl_backend.revert import revert_bids
+
+
+class Command(BaseCommand):
+    help = "Revert a set of bids, or reset the whole auction, with a few set-based statements"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Reset the auction, every bid is reverted")
+        parser.add_argument("--team", type=int, action="append", dest="teams", help="Team id, can be repeated")
+        parser.add_argument("--player", type=int, action="append", dest="players",
+                            help="Player id, can be repeated")
+        parser.add_argument("--from-id", type=int, help="First bid id of the round")
+        parser.add_argument("--to-id", type=int, help="Last bid id of the round")
+        parser.add_argument("--since", help="Bids of this day (YYYY-MM-DD) and later")
+        parser.add_argument("--dry-run", action="store_true", help="Show what would be reverted")
+
+    def handle(self, all=False, teams=None, players=None, from_id=None, to_id=None, since=None,
+               dry_run=False, **options):
+        bids = Bid.objects.all()
+        if teams:
+            bids = bids.filter(team_id__in=teams)
+        if players:
+            bids = bids.filter(player_id__in=players)
+        if from_id is not None:
+            bids = bids.filter(id__gte=from_id)
+        if to_id is not None:
+            bids = bids.filter(id__lte=to_id)
+        if since:
+            bids = bids.filter(created_at__gte=since)
+        if not all and not (teams or players or from_id is not None or to_id is not None or since):
+            raise CommandError("Choose the bids to revert, or --all to reset the auction")
+
+        started = time.perf_counter()
+        plan = revert_bids(bids, dry_run=dry_run)
+        elapsed = time.perf_counter() - started
+
+        for team_id, change in sorted(plan.items()):
+            self.stdout.write(f"team {team_id}: {change['bids']} bids, {change['amount']} back, "
+                              f"{change['internal_players']} internal and {change['external_players']} "
+                              f"external players released")
+        total = sum(change["bids"] for change in plan.values())
+        if dry_run:
+            self.stdout.write(f"Dry run, {total} bids would be reverted")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{total} bids reverted in {elapsed:.3f}s"))
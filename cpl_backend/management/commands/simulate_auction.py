@@ -0,0 +1,55 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cpl_backend.models import Season, default_season
+from cpl_backend.simulator import (SIMULATIONS, AuctionState, Rules, SimulatorUnavailable, bid_matrix, rules_for,
+                                   simulate)
+
+
+class Command(BaseCommand):
+    help = "Simulate the rest of the auction and report the budget risk of every team"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--simulations", type=int, default=SIMULATIONS)
+        parser.add_argument("--markup", type=float, default=1.5, help="Typical price over the basic amount")
+        parser.add_argument("--spread", type=float, default=0.5, help="Lognormal spread of the markup")
+        parser.add_argument("--seed", type=int)
+        parser.add_argument("--season", help="Slug of the season (default: CPL_SEASON, else the newest)")
+        # What-if overrides of the season's rules
+        for field, default in Rules._field_defaults.items():
+            parser.add_argument(f"--{field.replace('_', '-')}", type=type(default))
+        parser.add_argument("--json", action="store_true", dest="as_json")
+
+    def handle(self, simulations, markup, spread, seed, season=None, as_json=False, **options):
+        try:
+            season = Season.objects.get(slug=season) if season else default_season()
+        except Season.DoesNotExist:
+            raise CommandError(f"No season {season}")
+        rules = rules_for(season)._replace(**{field: options[field] for field in Rules._fields
+                                              if options[field] is not None})
+        try:
+            started = time.perf_counter()
+            state = AuctionState(rules, season)
+            _, feasible = bid_matrix(state)
+            matrix_seconds = time.perf_counter() - started
+        except SimulatorUnavailable as e:
+            raise CommandError(str(e))
+        result = simulate(state, simulations=simulations, markup=markup, spread=spread, seed=seed)
+
+        if as_json:
+            self.stdout.write(json.dumps({"rules": rules._asdict(), "simulations": result.simulations,
+                                          "seconds": result.seconds, "teams": result.teams}, indent=2))
+            return
+
+        self.stdout.write(f"{len(state.team_ids)} teams x {len(state.player_ids)} unsold players, "
+                          f"bid matrix in {matrix_seconds:.3f}s, {result.simulations} auctions "
+                          f"in {result.seconds:.3f}s")
+        self.stdout.write(f"{'team':<24}{'balance':>10}{'buyable':>9}{'shortfall':>11}{'capped':>8}"
+                          f"{'mean left':>11}{'p5 left':>10}")
+        for t, team in enumerate(result.teams):
+            self.stdout.write(f"{team['name'][:23]:<24}{team['balance']:>10.0f}{int(feasible[t].sum()):>9}"
+                              f"{team['shortfall_risk']:>11.1%}{team['capped_risk']:>8.1%}"
+                              f"{team['mean_final_balance']:>11.0f}{team['p5_final_balance']:>10.0f}")
+
@@ -0,0 +1,261 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import Http404, HttpResponse
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+slow_logger = logging.getLogger("cpl_backend.slow_requests")
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576)
+# Latest requests per view kept for the quantiles
+WINDOW = 1024
+QUANTILES = (0.5, 0.95, 0.99)
+
+_current = ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    """What one request spent, filled in by the database and template hooks."""
+
+    __slots__ = ("queries", "db_time", "render_time", "rendering", "sql")
+
+    def __init__(self, collect_sql=False):
+        self.queries = 0
+        self.db_time = self.render_time = 0.0
+        self.rendering = False
+        self.sql = [] if collect_sql else None
+
+
+class Histogram:
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class ViewMetrics:
+
+    def __init__(self):
+        self.latency = Histogram(SECONDS_BUCKETS)
+        self.db_time = Histogram(SECONDS_BUCKETS)
+        self.render_time = Histogram(SECONDS_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.size = Histogram(SIZE_BUCKETS)
+        self.recent = deque(maxlen=WINDOW)
+        self.statuses = {}
+
+
+class Registry:
+    """Per view histograms of this process, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def observe(self, view, status, latency, request_metrics, size):
+        with self.lock:
+            metrics = self.views.get(view)
+            if metrics is None:
+                metrics = self.views[view] = ViewMetrics()
+            metrics.latency.observe(latency)
+            metrics.db_time.observe(request_metrics.db_time)
+            metrics.render_time.observe(request_metrics.render_time)
+            metrics.queries.observe(request_metrics.queries)
+            if size is not None:
+                metrics.size.observe(size)
+            metrics.recent.append(latency)
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+
+    def clear(self):
+        with self.lock:
+            self.views.clear()
+
+    def render(self):
+        with self.lock:
+            views = {view: (metrics, sorted(metrics.recent)) for view, metrics in self.views.items()}
+            lines = []
+            for name, attribute, help in (
+                    ("cpl_request_duration_seconds", "latency", "Request latency by view"),
+                    ("cpl_request_db_seconds", "db_time", "Time spent in SQL queries per request"),
+                    ("cpl_request_render_seconds", "render_time", "Template render time per request"),
+                    ("cpl_request_queries", "queries", "SQL queries per request"),
+                    ("cpl_response_size_bytes", "size", "Response body size, streaming responses excluded")):
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+                for view, (metrics, _) in views.items():
+                    lines += histogram_lines(name, label(view), getattr(metrics, attribute))
+
+            lines += ["# HELP cpl_request_recent_duration_seconds Latency quantiles of the latest requests",
+                      "# TYPE cpl_request_recent_duration_seconds summary"]
+            for view, (metrics, recent) in views.items():
+                for quantile in QUANTILES:
+                    value = recent[min(int(len(recent) * quantile), len(recent) - 1)]
+                    lines.append(f'cpl_request_recent_duration_seconds{{view="{label(view)}",'
+                                 f'quantile="{quantile}"}} {value}')
+
+            lines += ["# HELP cpl_requests_total Requests by view and status", "# TYPE cpl_requests_total counter"]
+            for view, (metrics, _) in views.items():
+                for status, count in sorted(metrics.statuses.items()):
+                    lines.append(f'cpl_requests_total{{view="{label(view)}",status="{status}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+def label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def histogram_lines(name, view, histogram):
+    lines, cumulative = [], 0
+    for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_sum{{view="{view}"}} {histogram.sum}')
+    lines.append(f'{name}_count{{view="{view}"}} {histogram.count}')
+    return lines
+
+
+registry = Registry()
+
+
+def count_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.queries += 1
+        metrics.db_time += elapsed
+        if metrics.sql is not None:
+            metrics.sql.append((elapsed, sql))
+
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    # The wrapper object outlives its connections, add the hook only once
+    if settings.METRICS_ENABLED and count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+class TimedTemplate(django_backend.Template):
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None or metrics.rendering:
+            # Templates rendered inside a template (form widgets) are already timed
+            return super().render(context, request)
+        metrics.rendering = True
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.render_time += time.perf_counter() - started
+            metrics.rendering = False
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """The Django template backend, with render time counted per request.
+
+    Set as the BACKEND in TEMPLATES, outside a request it renders as usual.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
+
+
+class MetricsMiddleware:
+    """Latency, SQL and render time of every request, per view.
+
+    Goes first in MIDDLEWARE so the time of the other middleware counts.
+    Requests slower than METRICS_SLOW_REQUEST_MS are logged with their SQL.
+    Sync and async: a sync only middleware first in the chain would run
+    every ASGI request, async views included, on the thread sync code shares.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_request = settings.METRICS_SLOW_REQUEST_MS
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request_metrics = RequestMetrics(collect_sql=self.slow_request is not None)
+        token = _current.set(request_metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.observe(request, response, request_metrics, started)
+
+    async def __acall__(self, request):
+        # Queries made through sync_to_async see the context var, it is copied to their thread
+        request_metrics = RequestMetrics(collect_sql=self.slow_request is not None)
+        token = _current.set(request_metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.observe(request, response, request_metrics, started)
+
+    def observe(self, request, response, request_metrics, started):
+        latency = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match else "unmatched"
+        size = None if response.streaming else len(response.content)
+        registry.observe(view, response.status_code, latency, request_metrics, size)
+
+        if self.slow_request is not None and latency * 1000 >= self.slow_request:
+            slow_logger.warning(
+                "%s %s took %.0fms: %d queries in %.0fms, templates %.0fms\n%s",
+                request.method, request.get_full_path(), latency * 1000, request_metrics.queries,
+                request_metrics.db_time * 1000, request_metrics.render_time * 1000,
+                "\n".join(f"  {elapsed * 1000:.1f}ms {sql}" for elapsed, sql in request_metrics.sql),
+            )
+        return response
+
+
+def metrics(request):
+    # View names and SQL timings are not for everyone: staff or the allowed addresses only
+    if not settings.METRICS_ENABLED:
+        raise Http404("Metrics are turned off")
+    if request.META.get("REMOTE_ADDR") not in settings.METRICS_ALLOWED_IPS \
+            and not (hasattr(request, "user") and request.user.is_staff):
+        raise PermissionDenied
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,54 @@
+# Generated by Django 5.0.2 on 2026-10-18 06:42
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def backfill_counters(apps, schema_editor):
+    Team = apps.get_model('cpl_backend', 'Team')
+    TeamMember = apps.get_model('cpl_backend', 'TeamMember')
+    Bid = apps.get_model('cpl_backend', 'Bid')
+
+    for team in Team.objects.all():
+        members = TeamMember.objects.filter(team=team)
+        team.internal_players_count = members.filter(players__is_external=False).count()
+        team.external_players_count = members.filter(players__is_external=True).count()
+        sold = Bid.objects.filter(team=team, is_sold=True)
+        team.internal_sold_amount = sum(
+            (Decimal(str(b.bid_amount)) for b in sold.filter(player__is_external=False)), Decimal(0))
+        team.external_sold_amount = sum(
+            (Decimal(str(b.bid_amount)) for b in sold.filter(player__is_external=True)), Decimal(0))
+        team.save(update_fields=['internal_players_count', 'external_players_count',
+                                 'internal_sold_amount', 'external_sold_amount'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cpl_backend', '0006_alter_bid_bid_amount_alter_player_card_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='team',
+            name='external_players_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='external_sold_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='internal_players_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='internal_sold_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 06:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cpl_backend', '0007_team_roster_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='team',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.0.2 on 2026-10-18 09:12
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS players_fts USING fts5("
+            "name, cpl_id, type, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        schema_editor.execute(
+            "INSERT INTO players_fts (rowid, name, cpl_id, type) SELECT id, name, cpl_id, type FROM players"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS players_name_trgm ON players USING gin (name gin_trgm_ops)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS players_cpl_id_trgm ON players USING gin (cpl_id gin_trgm_ops)"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS players_fts")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS players_name_trgm")
+        schema_editor.execute("DROP INDEX IF EXISTS players_cpl_id_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cpl_backend', '0008_team_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.2 on 2026-10-18 07:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cpl_backend', '0009_player_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='card_digest',
+            field=models.CharField(blank=True, default='', editable=False, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='player',
+            name='photo_digest',
+            field=models.CharField(blank=True, default='', editable=False, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='logo_digest',
+            field=models.CharField(blank=True, default='', editable=False, max_length=40),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.0.2 on 2026-10-18 07:07
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def backfill_events(apps, schema_editor):
+    # Existing bids become the start of the ledger, in the order they were placed
+    Bid = apps.get_model('cpl_backend', 'Bid')
+    AuctionEvent = apps.get_model('cpl_backend', 'AuctionEvent')
+    bids = Bid.objects.filter(team__isnull=False, player__isnull=False).select_related('player').order_by('id')
+    AuctionEvent.objects.bulk_create([
+        AuctionEvent(kind='SOLD' if bid.is_sold else 'BID', team_id=bid.team_id, player_id=bid.player_id,
+                     bid_id=bid.id, amount=Decimal(str(bid.bid_amount)), is_sold=bid.is_sold,
+                     is_external=bid.player.is_external)
+        for bid in bids.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cpl_backend', '0010_image_digests'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuctionEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('BID', 'Bid placed'), ('SOLD', 'Sold'), ('REVERTED', 'Reverted')], max_length=10)),
+                ('team_id', models.BigIntegerField(db_index=True)),
+                ('player_id', models.BigIntegerField()),
+                ('bid_id', models.BigIntegerField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('is_sold', models.BooleanField()),
+                ('is_external', models.BooleanField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'auction_events',
+            },
+        ),
+        migrations.CreateModel(
+            name='TeamSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('team_id', models.BigIntegerField()),
+                ('event_id', models.BigIntegerField()),
+                ('expended_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('internal_players_count', models.PositiveIntegerField()),
+                ('external_players_count', models.PositiveIntegerField()),
+                ('internal_sold_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('external_sold_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('members', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'team_snapshots',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='teamsnapshot',
+            constraint=models.UniqueConstraint(fields=('team_id', 'event_id'), name='team_snapshot_event'),
+        ),
+        migrations.RunPython(backfill_events, migrations.RunPython.noop),
+    ]
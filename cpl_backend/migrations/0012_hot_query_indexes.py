@@ -0,0 +1,34 @@
+# Generated by Django 5.0.2 on 2026-10-18 07:21
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicate_members(apps, schema_editor):
+    # The unique constraint below fails on rosters that list a player twice
+    TeamMember = apps.get_model('cpl_backend', 'TeamMember')
+    keep = TeamMember.objects.values('team', 'players').annotate(first=Min('id')).values('first')
+    TeamMember.objects.exclude(id__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cpl_backend', '0011_auction_ledger'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(condition=models.Q(('is_sold', True)), fields=['team', 'bid_amount'], name='bid_team_sold_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(condition=models.Q(('is_sold', False)), fields=['id'], name='player_unsold_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_members, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='teammember',
+            constraint=models.UniqueConstraint(fields=('team', 'players'), name='team_member_unique'),
+        ),
+    ]
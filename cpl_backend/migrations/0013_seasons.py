@@ -0,0 +1,91 @@
+# Generated by Django 5.0.2 on 2026-10-18 11:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import cpl_backend.constants
+
+
+def assign_first_season(apps, schema_editor):
+    # Everything played so far is one season, with the rules in constants.py
+    Season = apps.get_model('cpl_backend', 'Season')
+    season = Season.objects.create(slug='cpl-2024', league='Cherunniyoor Premier League', name='2024')
+    for model in ('Team', 'Player', 'Bid', 'TeamMember'):
+        apps.get_model('cpl_backend', model).objects.update(season=season)
+
+
+def season_field(null):
+    return models.ForeignKey(null=null, on_delete=django.db.models.deletion.CASCADE, to='cpl_backend.season')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cpl_backend', '0012_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Season',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slug', models.SlugField(unique=True)),
+                ('league', models.CharField(max_length=100)),
+                ('name', models.CharField(max_length=100)),
+                ('team_basic_amount', models.DecimalField(decimal_places=2, default=cpl_backend.constants.TEAM_BASIC_AMOUNT, max_digits=10)),
+                ('internal_player_basic_amount', models.DecimalField(decimal_places=2, default=cpl_backend.constants.INTERNAL_PLAYER_BASIC_AMOUNT, max_digits=10)),
+                ('external_player_basic_amount', models.DecimalField(decimal_places=2, default=cpl_backend.constants.EXTERNAL_PLAYER_BASIC_AMOUNT, max_digits=10)),
+                ('internal_players_count', models.PositiveIntegerField(default=cpl_backend.constants.INTERNAL_PLAYERS_COUNT)),
+                ('external_players_count', models.PositiveIntegerField(default=cpl_backend.constants.EXTERNAL_PLAYERS_COUNT)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'seasons',
+            },
+        ),
+        migrations.AddField(model_name='team', name='season', field=season_field(null=True)),
+        migrations.AddField(model_name='player', name='season', field=season_field(null=True)),
+        migrations.AddField(model_name='bid', name='season', field=season_field(null=True)),
+        migrations.AddField(model_name='teammember', name='season', field=season_field(null=True)),
+        migrations.RunPython(assign_first_season, migrations.RunPython.noop),
+        migrations.AlterField(model_name='team', name='season', field=season_field(null=False)),
+        migrations.AlterField(model_name='player', name='season', field=season_field(null=False)),
+        migrations.AlterField(
+            model_name='bid',
+            name='season',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, to='cpl_backend.season'),
+        ),
+        migrations.AlterField(model_name='teammember', name='season', field=season_field(null=False)),
+        migrations.AlterField(
+            model_name='team',
+            name='total_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10),
+        ),
+        # cpl_id is unique within a season
+        migrations.AlterField(
+            model_name='team',
+            name='cpl_id',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='player',
+            name='cpl_id',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AddConstraint(
+            model_name='team',
+            constraint=models.UniqueConstraint(fields=('season', 'cpl_id'), name='team_season_cpl_id'),
+        ),
+        migrations.AddConstraint(
+            model_name='player',
+            constraint=models.UniqueConstraint(fields=('season', 'cpl_id'), name='player_season_cpl_id'),
+        ),
+        migrations.RemoveIndex(
+            model_name='player',
+            name='player_unsold_idx',
+        ),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(condition=models.Q(('is_sold', False)), fields=['season', 'id'], name='player_unsold_idx'),
+        ),
+    ]
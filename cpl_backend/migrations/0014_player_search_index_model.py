@@ -0,0 +1,33 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:40
+
+import cpl_backend.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def analyze_players(apps, schema_editor):
+    # Searches join the index, the planner needs statistics to start from it
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("ANALYZE players")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cpl_backend', '0013_seasons'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerSearchIndex',
+            fields=[
+                ('player', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='cpl_backend.player')),
+                ('document', cpl_backend.models.SearchDocument(db_column='players_fts')),
+            ],
+            options={
+                'db_table': 'players_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(analyze_players, migrations.RunPython.noop),
+    ]
@@ -1,33 +1,177 @@
+import threading
+import time
+from decimal import ROUND_CEILING, ROUND_FLOOR, Decimal
+
+from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 
-from django.db.models.signals import pre_delete
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete
 from django.dispatch import receiver
 
+from .signals import send_on_commit
 from .constants import PLAYER_CHOICES, INTERNAL_PLAYER_BASIC_AMOUNT, \
                 EXTERNAL_PLAYER_BASIC_AMOUNT, TEAM_BASIC_AMOUNT,\
                 EXTERNAL_PLAYERS_COUNT, INTERNAL_PLAYERS_COUNT
 
+# Team fields a bid changes
+TEAM_TOTALS = ("expended_amount", "balance_amount", "internal_players_count", "external_players_count",
+               "internal_sold_amount", "external_sold_amount", "version")
+
 # Create your models here.
+class Season(models.Model):
+    """One auction of a league, with its own teams, players and bids and the rules they follow.
+
+    Read through cached_seasons(), the rules are needed on every bid.
+    """
+
+    class Meta:
+        db_table = "seasons"
+
+    slug = models.SlugField(unique=True)
+    league = models.CharField(max_length=100)
+    name = models.CharField(max_length=100)
+    #Rules, new seasons start from the ones in constants.py
+    team_basic_amount = models.DecimalField(default=TEAM_BASIC_AMOUNT, decimal_places=2, max_digits=10)
+    internal_player_basic_amount = models.DecimalField(default=INTERNAL_PLAYER_BASIC_AMOUNT, decimal_places=2,
+                                                       max_digits=10)
+    external_player_basic_amount = models.DecimalField(default=EXTERNAL_PLAYER_BASIC_AMOUNT, decimal_places=2,
+                                                       max_digits=10)
+    internal_players_count = models.PositiveIntegerField(default=INTERNAL_PLAYERS_COUNT)
+    external_players_count = models.PositiveIntegerField(default=EXTERNAL_PLAYERS_COUNT)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.league} {self.name}"
+
+    def basic_amount_for(self, is_external):
+        return self.external_player_basic_amount if is_external else self.internal_player_basic_amount
+
+
+_seasons_lock = threading.Lock()
+_seasons = None
+_seasons_loaded = 0
+
+
+def cached_seasons(stale_only=False):
+    """Every season by id, read once and kept in the process.
+
+    Dropped when a season is saved or deleted here, and after
+    SEASON_CACHE_SECONDS so edits made in other processes show up too.
+    With stale_only, None instead of reading them again.
+    """
+    global _seasons, _seasons_loaded
+    with _seasons_lock:
+        if _seasons is not None and time.monotonic() - _seasons_loaded < settings.SEASON_CACHE_SECONDS:
+            return _seasons
+    if stale_only:
+        return None
+    seasons = {season.id: season for season in Season.objects.all()}
+    with _seasons_lock:
+        _seasons, _seasons_loaded = seasons, time.monotonic()
+    return seasons
+
+
+def clear_season_cache(**kwargs):
+    global _seasons
+    with _seasons_lock:
+        _seasons = None
+
+
+def season_rules(season_id):
+    """The season, rules included, without a query once the seasons are cached."""
+    season = cached_seasons().get(season_id)
+    if season is None:
+        # Created since, possibly by another process
+        clear_season_cache()
+        season = cached_seasons().get(season_id)
+        if season is None:
+            raise Season.DoesNotExist(f"No season {season_id}")
+    return season
+
+
+def default_season(seasons=None):
+    """Season of requests and new rows that name none: CPL_SEASON, else the newest."""
+    seasons = cached_seasons() if seasons is None else seasons
+    if settings.DEFAULT_SEASON:
+        for season in seasons.values():
+            if season.slug == settings.DEFAULT_SEASON:
+                return season
+        raise Season.DoesNotExist(f"No season {settings.DEFAULT_SEASON}, check CPL_SEASON")
+    if seasons:
+        return seasons[max(seasons)]
+    # An empty database, start the first season with the default rules
+    season, _ = Season.objects.get_or_create(slug="default", defaults={"league": "CPL", "name": "Default"})
+    clear_season_cache()
+    return season
+
+
+@receiver(post_save, sender=Season)
+@receiver(post_delete, sender=Season)
+def season_changed(sender, **kwargs):
+    # Now for this thread, and again after the commit in case a reader
+    # cached the old rules in between
+    clear_season_cache()
+    transaction.on_commit(clear_season_cache)
+
+
+# After migrate and flush, the cached seasons may be gone from the database
+post_migrate.connect(clear_season_cache, dispatch_uid="clear_season_cache")
+
+
 class Team(models.Model):
 
     class Meta:
         db_table = "teams"
+        constraints = [
+            models.UniqueConstraint(fields=["season", "cpl_id"], name="team_season_cpl_id"),
+        ]
     
     #field
-    cpl_id = models.CharField(unique=True, max_length=100)
+    season = models.ForeignKey(Season, on_delete=models.CASCADE)
+    cpl_id = models.CharField(max_length=100)
     name = models.CharField(max_length=100)
     description = models.TextField()
     logo = models.FileField(upload_to="teams/logo")
-    total_amount = models.DecimalField(default=TEAM_BASIC_AMOUNT, decimal_places=2, max_digits=10)
+    #The season's team_basic_amount when left empty
+    total_amount = models.DecimalField(decimal_places=2, max_digits=10, blank=True)
     expended_amount = models.DecimalField(default=0, decimal_places=2, max_digits=10)
     balance_amount = models.DecimalField(decimal_places=2, max_digits=10, null=True, blank=True)
+    #Roster counters, kept in sync by Bid.save() and pre_delete_bid
+    internal_players_count = models.PositiveIntegerField(default=0)
+    external_players_count = models.PositiveIntegerField(default=0)
+    internal_sold_amount = models.DecimalField(default=0, decimal_places=2, max_digits=10)
+    external_sold_amount = models.DecimalField(default=0, decimal_places=2, max_digits=10)
+    #Bumped on every bid change, the bump also takes the row lock
+    version = models.PositiveIntegerField(default=0, editable=False)
+    logo_digest = models.CharField(max_length=40, blank=True, default="", editable=False)
     created_at = models.DateField(auto_now=True)
 
     def save(self, *args, **kwargs):
+        if self.season_id is None:
+            self.season = default_season()
+        if self.total_amount is None:
+            self.total_amount = season_rules(self.season_id).team_basic_amount
         self.balance_amount = self.total_amount - self.expended_amount
         super().save(*args, **kwargs)
 
+    def add_member(self, player, amount):
+        if player.is_external:
+            self.external_players_count += 1
+            self.external_sold_amount += amount
+        else:
+            self.internal_players_count += 1
+            self.internal_sold_amount += amount
+
+    def remove_member(self, player, amount):
+        if player.is_external:
+            self.external_players_count -= 1
+            self.external_sold_amount -= amount
+        else:
+            self.internal_players_count -= 1
+            self.internal_sold_amount -= amount
+
     def __str__(self):
         return self.name
 
@@ -35,13 +179,26 @@ class Player(models.Model):
 
     class Meta:
         db_table = "players"
+        indexes = [
+            # Unsold players in id order: bidding page, keyset pages, API, simulator.
+            # Partial, as boolean filters are compiled to NOT "is_sold" which no
+            # index on the column itself can serve.
+            models.Index(fields=["season", "id"], condition=models.Q(is_sold=False), name="player_unsold_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["season", "cpl_id"], name="player_season_cpl_id"),
+        ]
 
     #Fields
-    cpl_id = models.CharField(unique=True, max_length=100)
+    season = models.ForeignKey(Season, on_delete=models.CASCADE)
+    cpl_id = models.CharField(max_length=100)
     name = models.CharField(max_length=100)
     type = models.CharField(choices=PLAYER_CHOICES, max_length=100)
     card = models.FileField(upload_to="players/card",  null=True, blank=True)
     photo = models.FileField(upload_to="players/photo", null=True, blank=True)
+    # Content hashes naming the resized copies, see images.py
+    card_digest = models.CharField(max_length=40, blank=True, default="", editable=False)
+    photo_digest = models.CharField(max_length=40, blank=True, default="", editable=False)
     basic_amount = models.DecimalField(default=0, decimal_places=2, max_digits=10)
     is_external = models.BooleanField()
     is_sold = models.BooleanField()
@@ -51,21 +208,49 @@ class Player(models.Model):
         return self.name
     
     def save(self, *args, **kwargs):
+        if self.season_id is None:
+            self.season = default_season()
+        self.basic_amount = season_rules(self.season_id).basic_amount_for(self.is_external)
+        super().save(*args, **kwargs)
 
-        if self.is_external:
-            self.basic_amount = EXTERNAL_PLAYER_BASIC_AMOUNT
-        else:
-            self.basic_amount = INTERNAL_PLAYER_BASIC_AMOUNT
 
-        super().save(*args, **kwargs)
+class SearchDocument(models.TextField):
+    """The hidden column an FTS5 table has under its own name, what MATCH and bm25() take."""
+
+
+@SearchDocument.register_lookup
+class Match(models.Lookup):
+    lookup_name = "match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", [*lhs_params, *rhs_params]
+
+
+class PlayerSearchIndex(models.Model):
+    """Row of the SQLite full-text index of the players (migration 0009), written by search.py."""
+
+    class Meta:
+        managed = False
+        db_table = "players_fts"
 
+    player = models.OneToOneField(Player, primary_key=True, db_column="rowid", db_constraint=False,
+                                  on_delete=models.DO_NOTHING, related_name="search_index")
+    document = SearchDocument(db_column="players_fts")
 
 
 class TeamMember(models.Model):
 
     class Meta:
          db_table = "team_players"
+         constraints = [
+             # Also serves the roster lookups by team
+             models.UniqueConstraint(fields=["team", "players"], name="team_member_unique"),
+         ]
 
+    #The team's, kept here so a season is read without a join
+    season = models.ForeignKey(Season, on_delete=models.CASCADE)
     team = models.ForeignKey(Team, on_delete=models.CASCADE, blank=True, null=True)
     players = models.ForeignKey(Player, on_delete=models.CASCADE, blank=True, null=True)
     created_at = models.DateField(auto_now=True)
@@ -78,7 +263,14 @@ class Bid(models.Model):
 
     class Meta:
          db_table = "bids"
-
+         indexes = [
+             # Sold bids of a team, most expensive first: standings, reverts
+             models.Index(fields=["team", "bid_amount"], condition=models.Q(is_sold=True),
+                          name="bid_team_sold_idx"),
+         ]
+
+    #The team's, set by save()
+    season = models.ForeignKey(Season, on_delete=models.CASCADE, editable=False)
     team = models.ForeignKey(Team, on_delete=models.CASCADE, blank=True, null=True)
     player = models.ForeignKey(Player, on_delete=models.CASCADE, blank=True, null=True)
     bid_amount = models.FloatField()
@@ -90,6 +282,8 @@ class Bid(models.Model):
     
     def clean(self):
         super().clean()
+        if self.player.season_id != self.team.season_id:
+            raise ValidationError("The player and the team are in different seasons")
         next_bid = next_bid_amount(team=self.team, player=self.player)
         if self.bid_amount <= self.player.basic_amount:
             raise ValidationError("Bid amount should be greater than players' basic amount")
@@ -105,38 +299,143 @@ class Bid(models.Model):
 
 
     def save(self, *args, **kwargs):
-        self.full_clean()
-        
-        if self.is_sold:
-            TeamMember.objects.create(team=self.team, players=self.player)
-            self.player.is_sold = True
-            self.player.save()
-        #Update the value of team
-        
-        self.team.expended_amount += self.bid_amount
-        self.team.save()
+        if self.team_id is None or self.player_id is None:
+            raise ValidationError("Choose a team and a player")
+
+        with transaction.atomic():
+            # Writing the team row first serialises bids of the team (and every
+            # writer on SQLite) before anything is read and validated
+            lock_team(self.team_id)
+            self.team = Team.objects.get(pk=self.team_id)
+            self.player = Player.objects.get(pk=self.player_id)
+            self.season_id = self.team.season_id
+            if self.player.is_sold:
+                raise BidConflict("The player already sold, Choose another players")
+            # The season was just copied from the team, no need to look it up again
+            self.full_clean(exclude=["season"])
+            # bid_amount is a float, team amounts are decimals
+            amount = Decimal(str(self.bid_amount))
+
+            if self.is_sold:
+                # Only one bid can flip the flag, whatever the other team saw
+                if not Player.objects.filter(pk=self.player_id, is_sold=False).update(is_sold=True):
+                    raise BidConflict("The player was just sold to another team")
+                self.player.is_sold = True
+                TeamMember.objects.create(season_id=self.season_id, team=self.team, players=self.player)
+                self.team.add_member(self.player, amount)
+            #Update the value of team
+            self.team.expended_amount += amount
+            self.team.save(update_fields=TEAM_TOTALS)
+            super().save(*args, **kwargs)
+            AuctionEvent.record(AuctionEvent.SOLD if self.is_sold else AuctionEvent.BID, self, amount)
+            send_on_commit(Bid, "sold" if self.is_sold else "bid", self.pk, self, self.team, self.player)
+
+
+class BidConflict(ValidationError):
+    pass
+
+
+class AuctionEvent(models.Model):
+    """Append-only log of every change a bid makes to a team.
+
+    Ids are plain integers, not foreign keys, so the history outlives
+    deleted bids, players and teams.
+    """
+
+    class Meta:
+        db_table = "auction_events"
+
+    BID = "BID"
+    SOLD = "SOLD"
+    REVERTED = "REVERTED"
+    KIND_CHOICES = [
+        (BID, "Bid placed"),
+        (SOLD, "Sold"),
+        (REVERTED, "Reverted"),
+    ]
+    # Take team snapshots every this many events
+    SNAPSHOT_INTERVAL = 100
+
+    kind = models.CharField(choices=KIND_CHOICES, max_length=10)
+    team_id = models.BigIntegerField(db_index=True)
+    player_id = models.BigIntegerField()
+    bid_id = models.BigIntegerField()
+    amount = models.DecimalField(decimal_places=2, max_digits=10)
+    is_sold = models.BooleanField()
+    is_external = models.BooleanField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: team {self.team_id}, player {self.player_id}, {self.amount}"
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("Auction events are append-only")
         super().save(*args, **kwargs)
 
+    def delete(self, *args, **kwargs):
+        raise ValueError("Auction events are append-only")
+
+    @classmethod
+    def record(cls, kind, bid, amount):
+        event = cls.objects.create(kind=kind, team_id=bid.team_id, player_id=bid.player_id, bid_id=bid.pk,
+                                   amount=amount, is_sold=bid.is_sold, is_external=bid.player.is_external)
+        if event.pk % cls.SNAPSHOT_INTERVAL == 0:
+            from .ledger import take_snapshots
+            transaction.on_commit(take_snapshots)
+        return event
+
+
+class TeamSnapshot(models.Model):
+    """Team state replayed from the ledger up to and including event_id."""
+
+    class Meta:
+        db_table = "team_snapshots"
+        constraints = [
+            models.UniqueConstraint(fields=["team_id", "event_id"], name="team_snapshot_event"),
+        ]
+
+    team_id = models.BigIntegerField()
+    event_id = models.BigIntegerField()
+    expended_amount = models.DecimalField(decimal_places=2, max_digits=10)
+    internal_players_count = models.PositiveIntegerField()
+    external_players_count = models.PositiveIntegerField()
+    internal_sold_amount = models.DecimalField(decimal_places=2, max_digits=10)
+    external_sold_amount = models.DecimalField(decimal_places=2, max_digits=10)
+    members = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Team {self.team_id} at event {self.event_id}"
+
+
+def lock_team(team_id):
+    Team.objects.filter(pk=team_id).update(version=F("version") + 1)
+
 
 @receiver(pre_delete, sender=Bid)
 def pre_delete_bid(sender, instance, **kwargs):
+    # Runs inside the transaction opened by delete(), the cached team may be stale
+    lock_team(instance.team_id)
+    instance.team.refresh_from_db()
+    amount = Decimal(str(instance.bid_amount))
     # If the bid is sold, remove the corresponding entry from TeamPlayer
     if instance.is_sold:
         TeamMember.objects.filter(team=instance.team, players=instance.player).delete()
+        Player.objects.filter(pk=instance.player_id).update(is_sold=False)
         instance.player.is_sold = False
-        instance.player.save()
+        instance.team.remove_member(instance.player, amount)
     #update the amounts
-    instance.team.expended_amount -= instance.bid_amount
-    instance.team.save()
+    instance.team.expended_amount -= amount
+    instance.team.save(update_fields=TEAM_TOTALS)
+    AuctionEvent.record(AuctionEvent.REVERTED, instance, amount)
+    send_on_commit(Bid, "undo", instance.pk, instance, instance.team, instance.player)
         
-def next_bid_amount(team, player):
-    try:
-        team_players = TeamMember.objects.filter(team=team)
-    except Exception as e:
-        raise ValidationError("Unexpected error occured")
-    
-    internal_player_count = team_players.filter(players__is_external=False).count() 
-    external_player_count = team_players.filter(players__is_external=True).count()
+def next_bid_amount(team, player, rules=None):
+    # The rules of the team's season unless given
+    rules = rules or season_rules(team.season_id)
+    internal_player_count = team.internal_players_count
+    external_player_count = team.external_players_count
 
     #updated internal and external player count based on the player selected
     if not player.is_external:
@@ -144,11 +443,23 @@ def next_bid_amount(team, player):
     else: 
         external_player_count += 1
 
-    internal_required = INTERNAL_PLAYERS_COUNT - internal_player_count
-    external_required = EXTERNAL_PLAYERS_COUNT - external_player_count
+    internal_required = rules.internal_players_count - internal_player_count
+    external_required = rules.external_players_count - external_player_count
 
     if internal_required < 0 and external_required < 0: # bidding for extra players
         return team.balance_amount
 
-    return team.balance_amount - ((internal_required * INTERNAL_PLAYER_BASIC_AMOUNT)+ 
-                                      (external_required * EXTERNAL_PLAYER_BASIC_AMOUNT))
\ No newline at end of file
+    return team.balance_amount - ((internal_required * rules.internal_player_basic_amount)+ 
+                                      (external_required * rules.external_player_basic_amount))
+
+
+def max_bid_amount(team, player, rules=None):
+    """Highest whole amount Bid.clean() accepts from the team for the player.
+
+    Bids have to stay under next_bid_amount() and within the balance.
+    """
+    limit = Decimal(next_bid_amount(team, player, rules))
+    balance = Decimal(team.balance_amount)
+    if balance < limit:
+        return balance.to_integral_value(ROUND_FLOOR)
+    return limit.to_integral_value(ROUND_CEILING) - 1
@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import threading
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.http import HttpResponse
+
+from .models import Player, Season, Team, TeamMember, Bid, cached_seasons
+
+VERSION_KEY = "auction:version:{}"
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "bypassed": 0, "shared": 0}
+# Pages being rendered by an async view, key -> future of the cached content
+_rendering = {}
+
+
+def page_cache():
+    return caches[settings.AUCTION_CACHE]
+
+
+def auction_version(season_id):
+    """Current version of the season's auction, it moves on with every committed change."""
+    cache = page_cache()
+    key = VERSION_KEY.format(season_id)
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so pages cached before a restart are not reused
+        cache.add(key, time.time_ns() // 1000, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_auction_version(season_id=None):
+    """Move the season on, or every season without one."""
+    cache = page_cache()
+    for season_id in [season_id] if season_id is not None else cached_seasons():
+        key = VERSION_KEY.format(season_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns() // 1000, timeout=None)
+
+
+def bump_on_commit(sender=None, instance=None, season_id=None, **kwargs):
+    # Only the season that changed, the pages of the other leagues stay cached
+    if season_id is None and instance is not None:
+        season_id = instance.pk if isinstance(instance, Season) else instance.season_id
+    # Bumping before the commit would let a reader cache old data under the new version
+    transaction.on_commit(lambda: bump_auction_version(season_id))
+
+
+def count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def cache_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def cache_by_version(view):
+    """Serve the view's page from the cache until the auction version changes.
+
+    Works on async views too, a hit is then served by the event loop alone.
+    The cache is called synchronously there: its async methods would queue
+    behind the ORM on the one thread sync code shares under ASGI, and the
+    local memory and file caches do not block for long. Every bid makes all
+    pages miss at once; requests for a page that is already being rendered
+    wait for it instead of rendering it again.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            key, response = cached_page(request)
+            if response is not None or key is None:
+                return response or await view(request, *args, **kwargs)
+
+            loop = asyncio.get_running_loop()
+            rendering = _rendering.get(key)
+            if rendering is not None and rendering.get_loop() is loop:
+                # Shielded, a waiter going away must not cancel it for the others
+                cached = await asyncio.shield(rendering)
+                if cached is not None:
+                    count("shared")
+                    return page_response(cached, "HIT")
+
+            rendering = _rendering[key] = loop.create_future()
+            cached = None
+            try:
+                response = await view(request, *args, **kwargs)
+                cached = store_page(key, response)
+            finally:
+                # None tells the waiters to render the page themselves
+                rendering.set_result(cached)
+                if _rendering.get(key) is rendering:
+                    del _rendering[key]
+            return response
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key, response = cached_page(request)
+        if response is None:
+            response = view(request, *args, **kwargs)
+            store_page(key, response)
+        return response
+    return wrapper
+
+
+def cached_page(request):
+    """(cache key, cached response or None), a None key when the page can't be cached."""
+    # Pages with pending messages are personal, render them fresh
+    if request.method not in ("GET", "HEAD") or len(messages.get_messages(request)):
+        count("bypassed")
+        return None, None
+
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    key = f"page:{request.season.id}:{auction_version(request.season.id)}:{path}"
+    cached = page_cache().get(key)
+    if cached is None:
+        count("misses")
+        return key, None
+
+    count("hits")
+    return key, page_response(cached, "HIT")
+
+
+def page_response(cached, status):
+    content, content_type = cached
+    response = HttpResponse(content, content_type=content_type)
+    response["X-Cache"] = status
+    return response
+
+
+def store_page(key, response):
+    """Cache the response if it can be, returns what was cached or None."""
+    if key is None:
+        return None
+    cached = None
+    if response.status_code == 200 and not response.streaming:
+        cached = (response.content, response["Content-Type"])
+        page_cache().set(key, cached, timeout=settings.AUCTION_CACHE_TIMEOUT)
+    response["X-Cache"] = "MISS"
+    return cached
+
+
+for model in (Season, Player, Team, TeamMember, Bid):
+    post_save.connect(bump_on_commit, sender=model, dispatch_uid=f"bump_version_{model.__name__}_save")
+    post_delete.connect(bump_on_commit, sender=model, dispatch_uid=f"bump_version_{model.__name__}_delete")
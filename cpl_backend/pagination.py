@@ -0,0 +1,182 @@
+import base64
+import bisect
+import json
+from operator import attrgetter
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.http import QueryDict
+
+PAGE_SIZE = 20
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values, backwards=False):
+    data = json.dumps({"k": values, "b": backwards}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        values, backwards = list(data["k"]), bool(data["b"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(token) from e
+    if not all(isinstance(value, (str, int, float)) for value in values):
+        raise InvalidCursor(token)
+    return values, backwards
+
+
+def to_python(model, ordering, values):
+    # A cursor comes from the client: values of the wrong type would fail in the query
+    converted = []
+    for field, value in zip(ordering, values):
+        try:
+            converted.append(model._meta.get_field(field).to_python(value))
+        except FieldDoesNotExist:
+            converted.append(value)
+        except ValidationError as e:
+            raise InvalidCursor(value) from e
+    return converted
+
+
+def after(ordering, values):
+    # (a, b) > (x, y)  ->  a > x OR (a = x AND b > y)
+    condition = Q()
+    for i, field in enumerate(ordering):
+        equal = {name: value for name, value in zip(ordering[:i], values[:i])}
+        condition |= Q(**equal, **{f"{field}__gt": values[i]})
+    return condition
+
+
+def before(ordering, values):
+    condition = Q()
+    for i, field in enumerate(ordering):
+        equal = {name: value for name, value in zip(ordering[:i], values[:i])}
+        condition |= Q(**equal, **{f"{field}__lt": values[i]})
+    return condition
+
+
+class CursorPage:
+    """One page of a keyset paginated queryset.
+
+    Pages are found with WHERE (key) > (last key) instead of OFFSET and
+    nothing is counted, so every page costs the same single query.
+    """
+    keyset = True
+
+    def __init__(self, object_list, ordering, has_next, has_previous, params=None):
+        self.object_list = object_list
+        self.ordering = ordering
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.params = params if params is not None else QueryDict(mutable=True)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def _key(self, item):
+        if isinstance(item, dict):
+            return [item[field] for field in self.ordering]
+        return [getattr(item, field) for field in self.ordering]
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return encode_cursor(self._key(self.object_list[-1]))
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return encode_cursor(self._key(self.object_list[0]), backwards=True)
+
+    def _url(self, cursor):
+        params = self.params.copy()
+        params.pop("page", None)
+        params["cursor"] = cursor
+        return f"?{params.urlencode()}"
+
+    @property
+    def next_url(self):
+        cursor = self.next_cursor
+        return self._url(cursor) if cursor else None
+
+    @property
+    def previous_url(self):
+        cursor = self.previous_cursor
+        return self._url(cursor) if cursor else None
+
+
+def keyset_query(queryset, cursor=None, ordering=("id",)):
+    """(queryset, values, backwards) of the page after or before the cursor, not evaluated."""
+    ordering = tuple(ordering)
+    values, backwards = decode_cursor(cursor) if cursor else (None, False)
+    if values is not None and len(values) != len(ordering):
+        raise InvalidCursor(cursor)
+    if values is not None:
+        values = to_python(queryset.model, ordering, values)
+
+    if backwards:
+        queryset = queryset.filter(before(ordering, values))
+        queryset = queryset.order_by(*[f"-{field}" for field in ordering])
+    else:
+        if values is not None:
+            queryset = queryset.filter(after(ordering, values))
+        queryset = queryset.order_by(*ordering)
+    return queryset, values, backwards
+
+
+def cursor_page(items, ordering, per_page, values, backwards, params=None):
+    # One extra row tells whether there is another page, no COUNT needed
+    more = len(items) > per_page
+    items = items[:per_page]
+
+    if backwards:
+        items.reverse()
+        return CursorPage(items, tuple(ordering), has_next=True, has_previous=more, params=params)
+    return CursorPage(items, tuple(ordering), has_next=more, has_previous=values is not None, params=params)
+
+
+def keyset_page(queryset, cursor=None, ordering=("id",), per_page=PAGE_SIZE, params=None):
+    queryset, values, backwards = keyset_query(queryset, cursor, ordering)
+    items = list(queryset[:per_page + 1])
+    return cursor_page(items, ordering, per_page, values, backwards, params)
+
+
+async def akeyset_page(queryset, cursor=None, ordering=("id",), per_page=PAGE_SIZE, params=None):
+    queryset, values, backwards = keyset_query(queryset, cursor, ordering)
+    items = [item async for item in queryset[:per_page + 1]]
+    return cursor_page(items, ordering, per_page, values, backwards, params)
+
+
+def list_keyset_page(items, cursor=None, field="id", per_page=PAGE_SIZE, params=None):
+    """keyset_page of a list already sorted by field, the cursor is found by bisection."""
+    values, backwards = decode_cursor(cursor) if cursor else (None, False)
+    if values is not None and len(values) != 1:
+        raise InvalidCursor(cursor)
+    key = attrgetter(field)
+    try:
+        if backwards:
+            end = bisect.bisect_left(items, values[0], key=key)
+            page = items[max(end - per_page - 1, 0):end][::-1]
+        else:
+            start = 0 if values is None else bisect.bisect_right(items, values[0], key=key)
+            page = items[start:start + per_page + 1]
+    except TypeError as e:
+        raise InvalidCursor(cursor) from e
+    return cursor_page(page, (field,), per_page, values, backwards, params)
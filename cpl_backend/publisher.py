@@ -0,0 +1,167 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.db import connections
+from django.dispatch import receiver
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from .api import MAX_PAGE_SIZE
+from .models import Team, cached_seasons, default_season, season_rules
+from .signals import auction_updated
+
+logger = logging.getLogger(__name__)
+
+# Longest a display waits for the snapshots while bids keep coming
+MAX_DELAY = 5
+
+
+def pages(season):
+    """(url, file) of every page the displays of the season read, files relative to its directory."""
+    yield reverse("teams"), "teams/index.html"
+    yield f"{reverse('standings')}?format=json", "teams/index.json"
+    for team_id in Team.objects.filter(season=season).order_by("id").values_list("id", flat=True):
+        yield reverse("team", args=[team_id]), f"teams/{team_id}.html"
+        yield f"{reverse('api_team_players', args=[team_id])}?limit={MAX_PAGE_SIZE}", f"teams/{team_id}.json"
+    yield reverse("to_bid"), "bids/index.html"
+    yield f"{reverse('api_unsold_players')}?limit={MAX_PAGE_SIZE}", "bids/index.json"
+
+
+def render(url, season):
+    # Straight to the view, the page cache is shared with the app but the
+    # middleware (sessions, metrics, seasons) is not involved
+    request = RequestFactory().get(url)
+    request._messages = CookieStorage(request)
+    request.season = season
+    match = resolve(request.path_info)
+    view = async_to_sync(match.func) if iscoroutinefunction(match.func) else match.func
+    response = view(request, *match.args, **match.kwargs)
+    if response.status_code != 200:
+        raise ValueError(f"{url} answered {response.status_code}")
+    return response.content
+
+
+def write_atomic(path, content):
+    """Replace the file with one rename, a static server never sends half a page.
+
+    Returns False when the file already holds the content, it is left alone
+    so its mtime and ETag do not change.
+    """
+    try:
+        with open(path, "rb") as f:
+            if f.read() == content:
+                return False
+    except FileNotFoundError:
+        pass
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # In the same directory, a rename across file systems is not atomic
+    fd, temp = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.chmod(temp, 0o644)
+        os.replace(temp, path)
+    except BaseException:
+        os.unlink(temp)
+        raise
+    return True
+
+
+def publish(directory, seasons=None):
+    """Render the display pages of the seasons, all by default, returns the files that changed.
+
+    Each season goes to directory/<slug>/, the default season to directory
+    itself as well.
+    """
+    default = default_season()
+    changed = []
+    for season in cached_seasons().values() if seasons is None else seasons:
+        for url, name in pages(season):
+            content = render(url, season)
+            for target in [f"{season.slug}/{name}", *([name] if season.id == default.id else [])]:
+                if write_atomic(os.path.join(directory, target), content):
+                    changed.append(target)
+    return changed
+
+
+_changed_lock = threading.Lock()
+# Seasons bid on since the last publish, None for all of them
+_changed = set()
+
+
+def publish_changed(directory):
+    """Publish the seasons that changed since the last call."""
+    global _changed
+    with _changed_lock:
+        changed, _changed = _changed, set()
+    seasons = None if None in changed else [season_rules(season_id) for season_id in changed]
+    return publish(directory, seasons)
+
+
+class Publisher:
+    """Debounced background publishing.
+
+    schedule() is cheap and safe from any thread: a burst of bids ends in a
+    single publish on the worker thread, run once nothing was scheduled for
+    delay seconds, or max_delay after the first of them at the latest.
+    """
+
+    def __init__(self, publish, delay, max_delay=MAX_DELAY):
+        self.publish = publish
+        self.delay = delay
+        self.max_delay = max_delay
+        self._condition = threading.Condition()
+        self._first = None
+        self._last = None
+        self._thread = None
+
+    def schedule(self):
+        with self._condition:
+            self._last = time.monotonic()
+            if self._first is None:
+                self._first = self._last
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="snapshot-publisher", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _wait(self):
+        with self._condition:
+            while self._first is None:
+                self._condition.wait()
+            while True:
+                remaining = min(self._last + self.delay, self._first + self.max_delay) - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            # Bids from now on need another publish
+            self._first = None
+
+    def _run(self):
+        while True:
+            self._wait()
+            try:
+                self.publish()
+            except Exception:
+                logger.exception("Publishing the display snapshots failed")
+            finally:
+                connections.close_all()
+
+
+publisher = Publisher(lambda: publish_changed(settings.SNAPSHOT_DIR), delay=settings.SNAPSHOT_DELAY)
+
+
+@receiver(auction_updated)
+def publish_on_commit(sender, payload, **kwargs):
+    # Sent after the commit, the worker reads the committed bid
+    if settings.SNAPSHOT_DIR:
+        with _changed_lock:
+            _changed.add(payload.get("season"))
+        publisher.schedule()
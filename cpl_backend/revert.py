@@ -0,0 +1,93 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, Exists, F, OuterRef, Q, Sum, Value, When
+
+from .models import AuctionEvent, Bid, Player, Team, TeamMember
+from .page_cache import bump_on_commit
+from .signals import send_teams_on_commit
+
+
+def money(value):
+    # bid_amount is a float column, its sums come back as floats
+    return Decimal(str(value or 0)).quantize(Decimal("0.01"))
+
+
+def revert_plan(bids):
+    """What reverting the bids would take off each team, {team_id: {...}}, in one query."""
+    sold_internal = Q(is_sold=True, player__is_external=False)
+    sold_external = Q(is_sold=True, player__is_external=True)
+    rows = (bids.order_by().values("team_id")
+            .annotate(bids=Count("id"), amount=Sum("bid_amount"),
+                      internal_players=Count("id", filter=sold_internal),
+                      external_players=Count("id", filter=sold_external),
+                      internal_amount=Sum("bid_amount", filter=sold_internal),
+                      external_amount=Sum("bid_amount", filter=sold_external)))
+    return {row["team_id"]: {
+        "bids": row["bids"],
+        "amount": money(row["amount"]),
+        "internal_players": row["internal_players"],
+        "external_players": row["external_players"],
+        "internal_amount": money(row["internal_amount"]),
+        "external_amount": money(row["external_amount"]),
+    } for row in rows if row["team_id"] is not None}
+
+
+def per_team(plan, key, field):
+    # One CASE over the teams instead of an UPDATE per team
+    return F(field) - Case(*[When(id=team_id, then=Value(change[key])) for team_id, change in plan.items()],
+                           default=Value(0), output_field=Team._meta.get_field(field))
+
+
+def revert_bids(bids, dry_run=False):
+    """Undo a set of bids with set-based statements in one transaction.
+
+    Does what deleting them one by one through pre_delete_bid does (team
+    totals, rosters, sold flags, ledger) in a fixed number of queries,
+    whatever the number of bids, but for the ledger rows the database
+    takes in one INSERT (124 on SQLite). Returns the plan per team;
+    with dry_run nothing is written.
+    """
+    with transaction.atomic():
+        # Evaluated once: the filter may involve rows the statements below change
+        rows = list(bids.order_by().values_list("id", "team_id"))
+        team_ids = {team_id for _, team_id in rows if team_id is not None}
+        if not dry_run and team_ids:
+            # Same lock as a single bid, concurrent bids of these teams wait for us
+            Team.objects.filter(pk__in=team_ids).update(version=F("version") + 1)
+        # A bid deleted before the lock is left out from here on
+        bids = Bid._base_manager.filter(pk__in=[bid_id for bid_id, _ in rows])
+        plan = revert_plan(bids)
+        if dry_run or not plan:
+            return plan
+
+        # Read the rows before they go, for the ledger
+        reverted = list(bids.filter(team__isnull=False, player__isnull=False)
+                        .values_list("id", "team_id", "player_id", "bid_amount", "is_sold", "player__is_external"))
+        sold_players = [player_id for _, _, player_id, _, is_sold, _ in reverted if is_sold]
+
+        # Plain DELETEs on the fixed set: the signals of a QuerySet.delete() would load
+        # every row, revert each bid a second time in pre_delete_bid and register a
+        # version bump per row. Nothing references either table.
+        members = TeamMember.objects.filter(Exists(bids.filter(is_sold=True, team_id=OuterRef("team_id"),
+                                                               player_id=OuterRef("players_id"))))
+        members._raw_delete(members.db)
+        bids._raw_delete(bids.db)
+        Player.objects.filter(pk__in=sold_players).update(is_sold=False)
+        Team.objects.filter(pk__in=plan).update(
+            expended_amount=per_team(plan, "amount", "expended_amount"),
+            balance_amount=F("total_amount") - per_team(plan, "amount", "expended_amount"),
+            internal_players_count=per_team(plan, "internal_players", "internal_players_count"),
+            external_players_count=per_team(plan, "external_players", "external_players_count"),
+            internal_sold_amount=per_team(plan, "internal_amount", "internal_sold_amount"),
+            external_sold_amount=per_team(plan, "external_amount", "external_sold_amount"),
+        )
+        AuctionEvent.objects.bulk_create([
+            AuctionEvent(kind=AuctionEvent.REVERTED, team_id=team_id, player_id=player_id, bid_id=bid_id,
+                         amount=money(amount), is_sold=is_sold, is_external=is_external)
+            for bid_id, team_id, player_id, amount, is_sold, is_external in reverted
+        ], batch_size=1000)
+
+        bump_on_commit()
+        send_teams_on_commit(Bid, "reset", Team.objects.filter(pk__in=plan))
+    return plan
@@ -0,0 +1,97 @@
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Func, Q, Value
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .database import analyze
+from .models import Player
+
+FTS_TABLE = "players_fts"
+# bm25 column weights for name, cpl_id and type
+FTS_WEIGHTS = (10.0, 5.0, 1.0)
+TRIGRAM_THRESHOLD = 0.3
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def match_expression(keyword):
+    # Every word has to match, each as a prefix: "vis kum" -> "vis"* "kum"*
+    words = WORD_RE.findall(keyword or "")
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search_players(keyword, queryset=None):
+    """Players matching keyword, best match first."""
+    queryset = Player.objects.all() if queryset is None else queryset
+    vendor = connection.vendor
+
+    if vendor == "sqlite":
+        expression = match_expression(keyword)
+        if not expression:
+            return queryset.none()
+        # Joined through PlayerSearchIndex, bm25() is lower for better matches
+        rank = Func("search_index__document", *(Value(weight) for weight in FTS_WEIGHTS),
+                    function="bm25", output_field=FloatField())
+        return queryset.filter(search_index__document__match=expression) \
+            .annotate(search_rank=rank).order_by("search_rank", "id")
+
+    keyword = (keyword or "").strip()
+    if not keyword:
+        return queryset.none()
+
+    if vendor == "postgresql":
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        return queryset.annotate(
+            search_rank=Greatest(TrigramSimilarity("name", keyword), TrigramSimilarity("cpl_id", keyword)),
+        ).filter(
+            Q(name__icontains=keyword) | Q(cpl_id__icontains=keyword) | Q(search_rank__gt=TRIGRAM_THRESHOLD)
+        ).order_by("-search_rank", "id")
+
+    return queryset.filter(Q(name__icontains=keyword) | Q(cpl_id__icontains=keyword)).order_by("id")
+
+
+def suggest_players(keyword, season, limit=10, unsold=False):
+    queryset = Player.objects.filter(season=season)
+    if unsold:
+        queryset = queryset.filter(is_sold=False)
+    players = search_players(keyword, queryset)
+    return list(players.values("id", "cpl_id", "name", "type", "is_external", "is_sold")[:limit])
+
+
+def index_players(players):
+    """Write players into the full-text index, replacing their old entries."""
+    if connection.vendor != "sqlite":
+        return
+    rows = [(player.id, player.name, player.cpl_id, player.type) for player in players]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+        cursor.executemany(f"INSERT INTO {FTS_TABLE} (rowid, name, cpl_id, type) VALUES (%s, %s, %s, %s)", rows)
+
+
+def rebuild_index():
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(f"INSERT INTO {FTS_TABLE} (rowid, name, cpl_id, type) "
+                       f"SELECT id, name, cpl_id, type FROM {Player._meta.db_table}")
+    analyze(connection)
+
+
+@receiver(post_save, sender=Player)
+def index_saved_player(sender, instance, raw=False, **kwargs):
+    index_players([instance])
+
+
+@receiver(post_delete, sender=Player)
+def unindex_deleted_player(sender, instance, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [instance.id])
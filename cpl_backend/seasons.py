@@ -0,0 +1,67 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.http import Http404
+
+from .models import cached_seasons, default_season
+
+SEASON_PARAM = "season"
+SEASON_COOKIE = "season"
+# A year, the cookie only says which league a screen follows
+SEASON_COOKIE_AGE = 365 * 24 * 60 * 60
+
+
+def find_season(seasons, slug):
+    for season in seasons.values():
+        if season.slug == slug:
+            return season
+    return None
+
+
+def request_season(request, seasons):
+    """The season asked for with ?season=<slug>, else the one in the cookie, else the default."""
+    slug = request.GET.get(SEASON_PARAM)
+    if slug:
+        season = find_season(seasons, slug)
+        if season is None:
+            raise Http404(f"No season {slug}")
+        return season
+    return find_season(seasons, request.COOKIES.get(SEASON_COOKIE)) or default_season(seasons)
+
+
+def remember_season(request, response):
+    if request.GET.get(SEASON_PARAM) and request.COOKIES.get(SEASON_COOKIE) != request.season.slug:
+        response.set_cookie(SEASON_COOKIE, request.season.slug, max_age=SEASON_COOKIE_AGE, samesite="Lax")
+    return response
+
+
+class SeasonMiddleware:
+    """Sets request.season, every page and API call shows that season only.
+
+    Several leagues run side by side this way: each screen picks its
+    league once with ?season=<slug> and the cookie keeps it there. Seasons
+    come from the in-process cache, a request reads them only when it is
+    stale. Sync and async, for the same reason as MetricsMiddleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.season = request_season(request, cached_seasons())
+        return remember_season(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        # Only a stale cache costs a trip to the thread the ORM runs on
+        seasons = cached_seasons(stale_only=True)
+        if seasons is None:
+            seasons = await sync_to_async(cached_seasons)()
+        if not seasons:
+            await sync_to_async(default_season)()
+            seasons = await sync_to_async(cached_seasons)()
+        request.season = request_season(request, seasons)
+        return remember_season(request, await self.get_response(request))
@@ -0,0 +1,180 @@
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from .images import DERIVATIVES_DIR
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+MAX_AGE = 60 * 60
+BLOCK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def stat_etag(stat):
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def is_immutable(path):
+    # Resized copies are named by content hash, they never change under a name
+    return path.startswith(f"{DERIVATIVES_DIR}/")
+
+
+def byte_range(header, size):
+    """(start, end) of a single "bytes=a-b" range, None to send it all, or False if unsatisfiable.
+
+    As RFC 9110 asks, an invalid header (last before first) is ignored, not refused.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first and last and int(last) < int(first):
+        return None
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # Suffix range, the last n bytes
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def read_range(path, start, end):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            block = f.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+
+@require_safe
+def serve_media(request, path):
+    path = posixpath.normpath(path).lstrip("/")
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("Invalid path")
+    if not os.path.isfile(fullpath):
+        raise Http404(f"{path} does not exist")
+
+    stat = os.stat(fullpath)
+    etag = stat_etag(stat)
+    last_modified = int(stat.st_mtime)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return cache_headers(not_modified, etag, last_modified, is_immutable(path))
+
+    content_type = mimetypes.guess_type(fullpath)[0] or "application/octet-stream"
+
+    sendfile = getattr(settings, "MEDIA_SENDFILE_HEADER", None)
+    if sendfile:
+        # The front server streams the file and handles ranges, the worker is free at once
+        response = HttpResponse(content_type=content_type)
+        if sendfile == "X-Accel-Redirect":
+            response[sendfile] = settings.MEDIA_SENDFILE_PREFIX.rstrip("/") + "/" + path
+        else:
+            response[sendfile] = fullpath
+        return cache_headers(response, etag, last_modified, is_immutable(path))
+
+    requested = byte_range(request.headers.get("Range"), stat.st_size)
+    if_range = request.headers.get("If-Range")
+    if requested is not None and if_range and if_range != etag \
+            and parse_http_date_safe(if_range) != last_modified:
+        # The client's copy is stale, it gets the whole new file
+        requested = None
+
+    if requested is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{stat.st_size}"
+    elif requested:
+        start, end = requested
+        response = StreamingHttpResponse(read_range(fullpath, start, end), status=206, content_type=content_type)
+        response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+        response["Content-Length"] = str(end - start + 1)
+    else:
+        response = FileResponse(open(fullpath, "rb"), content_type=content_type)
+        response["Content-Length"] = str(stat.st_size)
+    response["Accept-Ranges"] = "bytes"
+    return cache_headers(response, etag, last_modified, is_immutable(path))
+
+
+def accepted_encodings(request):
+    """Codings of the Accept-Encoding header, but those refused with q=0."""
+    accepted = set()
+    for part in request.headers.get("Accept-Encoding", "").split(","):
+        coding, _, params = part.partition(";")
+        params = params.replace(" ", "")
+        try:
+            quality = float(params[2:]) if params.startswith("q=") else 1
+        except ValueError:
+            quality = 1
+        if quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+@require_safe
+def serve_static(request, path):
+    """collectstatic output, with the precompressed variant the client accepts.
+
+    Content-hashed names are cached for a year, a repeat visit only asks for
+    the pages. Front servers can do the same with gzip_static/brotli_static.
+    """
+    path = posixpath.normpath(path).lstrip("/")
+    try:
+        fullpath = safe_join(settings.STATIC_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("Invalid path")
+    if not os.path.isfile(fullpath):
+        raise Http404(f"{path} does not exist")
+
+    content_type = mimetypes.guess_type(fullpath)[0] or "application/octet-stream"
+    accepted = accepted_encodings(request)
+    encoding = None
+    for candidate, ext in (("br", ".br"), ("gzip", ".gz")):
+        if candidate in accepted and os.path.isfile(fullpath + ext):
+            encoding, fullpath = candidate, fullpath + ext
+            break
+
+    stat = os.stat(fullpath)
+    etag = stat_etag(stat)
+    last_modified = int(stat.st_mtime)
+    immutable = path in getattr(staticfiles_storage, "immutable_names", ())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        # Named after what was asked for, not the .gz or .br variant sent
+        response = FileResponse(open(fullpath, "rb"), content_type=content_type,
+                                filename=posixpath.basename(path))
+        response["Content-Length"] = str(stat.st_size)
+        if encoding:
+            response["Content-Encoding"] = encoding
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return cache_headers(response, etag, last_modified, immutable)
+
+
+def cache_headers(response, etag, last_modified, immutable):
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    if immutable:
+        response["Cache-Control"] = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    else:
+        response["Cache-Control"] = f"public, max-age={MAX_AGE}"
+    return response
@@ -0,0 +1,60 @@
+import logging
+
+from django.db import transaction
+from django.dispatch import Signal
+
+logger = logging.getLogger(__name__)
+
+# Sent once a bid change is committed, with event ("bid", "sold" or "undo")
+# and payload, a plain snapshot of the season id, the bid, its player and the
+# team totals. Bulk reverts send "reset" with the totals of every team they
+# touched, of any season.
+auction_updated = Signal()
+
+
+def bid_payload(bid_id, bid, team, player):
+    return {
+        "season": team.season_id,
+        "bid": {
+            "id": bid_id,
+            "amount": bid.bid_amount,
+            "is_sold": bid.is_sold,
+        },
+        "player": {
+            "id": player.id,
+            "cpl_id": player.cpl_id,
+            "name": player.name,
+            "is_external": player.is_external,
+            "is_sold": player.is_sold,
+        },
+        "team": team_payload(team),
+    }
+
+
+def team_payload(team):
+    return {
+        "id": team.id,
+        "name": team.name,
+        "expended_amount": str(team.expended_amount),
+        "balance_amount": str(team.balance_amount),
+        "internal_players_count": team.internal_players_count,
+        "external_players_count": team.external_players_count,
+    }
+
+
+def send_on_commit(sender, event, bid_id, bid, team, player):
+    # Snapshot now, the instances may change before the transaction commits
+    payload = bid_payload(bid_id, bid, team, player)
+    transaction.on_commit(lambda: _send(sender, event, payload))
+
+
+def send_teams_on_commit(sender, event, teams):
+    # Read the teams after the commit, they hold the final totals then
+    transaction.on_commit(lambda: _send(sender, event, {"teams": [team_payload(team) for team in teams]}))
+
+
+def _send(sender, event, payload):
+    # The bid is already committed, a failing receiver must not undo that for the caller
+    for receiver, response in auction_updated.send_robust(sender=sender, event=event, payload=payload):
+        if isinstance(response, Exception):
+            logger.error("auction_updated receiver %r failed", receiver, exc_info=response)
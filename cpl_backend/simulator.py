@@ -0,0 +1,152 @@
+import time
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from . import constants
+from .models import Player, Team, default_season
+
+Rules = namedtuple("Rules", ["internal_basic", "external_basic", "internal_players", "external_players"],
+                   defaults=[constants.INTERNAL_PLAYER_BASIC_AMOUNT, constants.EXTERNAL_PLAYER_BASIC_AMOUNT,
+                             constants.INTERNAL_PLAYERS_COUNT, constants.EXTERNAL_PLAYERS_COUNT])
+
+SIMULATIONS = 2000
+
+
+def rules_for(season):
+    return Rules(float(season.internal_player_basic_amount), float(season.external_player_basic_amount),
+                 season.internal_players_count, season.external_players_count)
+
+
+class SimulatorUnavailable(Exception):
+    pass
+
+
+class AuctionState:
+    """Teams and unsold players of a season as arrays, one row per team and one column per player.
+
+    The season's own rules unless others are given for a what-if run.
+    """
+
+    def __init__(self, rules=None, season=None):
+        if np is None:
+            raise SimulatorUnavailable("The simulator needs numpy, install it with pip install numpy")
+        season = season or default_season()
+        self.rules = rules or rules_for(season)
+
+        teams = list(Team.objects.filter(season=season).order_by("id").values_list(
+            "id", "name", "balance_amount", "internal_players_count", "external_players_count"))
+        self.team_ids = np.array([row[0] for row in teams], dtype=np.int64)
+        self.team_names = [row[1] for row in teams]
+        self.balance = np.array([row[2] for row in teams], dtype=np.float64)
+        self.internal = np.array([row[3] for row in teams], dtype=np.int64)
+        self.external = np.array([row[4] for row in teams], dtype=np.int64)
+
+        players = Player.objects.filter(season=season, is_sold=False).order_by("id").values_list("id", "is_external")
+        self.player_ids = np.fromiter((row[0] for row in players), dtype=np.int64)
+        self.is_external = np.fromiter((row[1] for row in players), dtype=bool, count=len(self.player_ids))
+        # The rules may differ from the amounts stored on the players in a what-if run
+        self.basic = np.where(self.is_external, self.rules.external_basic, self.rules.internal_basic).astype(np.float64)
+
+
+def max_bids(balance, internal, external, is_external, rules):
+    """Highest bid Bid.clean() accepts for each team on each player.
+
+    Same rule as next_bid_amount(): after buying the player the team must
+    still afford the basic amount of every slot left, and no bid may go
+    over the balance. Works element-wise on any arrays that broadcast.
+    """
+    internal_required = rules.internal_players - (internal + ~is_external)
+    external_required = rules.external_players - (external + is_external)
+    reserve = internal_required * rules.internal_basic + external_required * rules.external_basic
+    reserve = np.where((internal_required < 0) & (external_required < 0), 0, reserve)
+    return np.minimum(balance - reserve, balance)
+
+
+def bid_matrix(state):
+    """(max bid, feasible) matrices of teams x unsold players."""
+    limits = max_bids(state.balance[:, None], state.internal[:, None], state.external[:, None],
+                      state.is_external[None, :], state.rules)
+    return limits, limits > state.basic
+
+
+class SimulationResult:
+
+    def __init__(self, state, balance, internal, external, capped, seconds):
+        rules = state.rules
+        short = (internal < rules.internal_players) | (external < rules.external_players)
+        self.simulations = len(balance)
+        self.seconds = seconds
+        self.teams = [{
+            "id": int(team_id),
+            "name": name,
+            "balance": float(state.balance[t]),
+            "shortfall_risk": float(short[:, t].mean()),
+            "capped_risk": float(capped[:, t].mean()),
+            "mean_final_balance": float(balance[:, t].mean()),
+            "p5_final_balance": float(np.percentile(balance[:, t], 5)),
+            "mean_players_bought": float((internal[:, t] + external[:, t]).mean()
+                                         - state.internal[t] - state.external[t]),
+        } for t, (team_id, name) in enumerate(zip(state.team_ids, state.team_names))]
+
+
+def simulate(state, simulations=SIMULATIONS, markup=1.5, spread=0.5, seed=None):
+    """Monte Carlo auctions over random player orderings.
+
+    Each player goes to a random team that still needs one of its kind and
+    can outbid the basic amount, at basic * a lognormal markup capped by the
+    team's max bid. An auction ends when every team is full or the players
+    run out. The shortfall risk is the share of runs where a team ends with
+    an incomplete roster, the capped risk the share where the budget rule
+    held at least one of its bids below the asking price.
+    """
+    started = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    rules = state.rules
+    teams, players = len(state.team_ids), len(state.player_ids)
+
+    balance = np.tile(state.balance, (simulations, 1))
+    internal = np.tile(state.internal, (simulations, 1))
+    external = np.tile(state.external, (simulations, 1))
+    capped = np.zeros((simulations, teams), dtype=bool)
+    runs = np.arange(simulations)
+    if not teams or not players:
+        return SimulationResult(state, balance, internal, external, capped, time.perf_counter() - started)
+
+    # Players differ only by kind, so drawing each next player's kind from what
+    # is left in the pool gives the same auctions as shuffling the players
+    internal_left = np.full(simulations, players - int(state.is_external.sum()))
+    external_left = np.full(simulations, int(state.is_external.sum()))
+    for step in range(players):
+        # Runs where no team needs a player it can still afford are over
+        needs_internal = (internal < rules.internal_players) & (
+            max_bids(balance, internal, external, np.False_, rules) > rules.internal_basic)
+        needs_external = (external < rules.external_players) & (
+            max_bids(balance, internal, external, np.True_, rules) > rules.external_basic)
+        if not (needs_internal | needs_external).any():
+            break
+
+        is_external = rng.random(simulations) * (internal_left + external_left) < external_left
+        internal_left -= ~is_external
+        external_left -= is_external
+        basic = np.where(is_external, rules.external_basic, rules.internal_basic)
+        limits = max_bids(balance, internal, external, is_external[:, None], rules)
+        eligible = np.where(is_external[:, None], needs_external, needs_internal)
+
+        # A random eligible team wins, runs without one leave the player unsold
+        scores = np.where(eligible, rng.random((simulations, teams)), -1.0)
+        winner = scores.argmax(axis=1)
+        sold = eligible[runs, winner]
+        asked = np.maximum(basic * rng.lognormal(np.log(markup), spread, simulations), basic + 1)
+        price = np.minimum(asked, limits[runs, winner] - 1)
+
+        won = runs[sold], winner[sold]
+        balance[won] -= price[sold]
+        capped[won] |= asked[sold] > price[sold]
+        internal[won] += ~is_external[sold]
+        external[won] += is_external[sold]
+
+    return SimulationResult(state, balance, internal, external, capped, time.perf_counter() - started)
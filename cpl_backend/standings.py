@@ -0,0 +1,40 @@
+from django.db.models import Count, OuterRef, Subquery
+
+from .models import Bid, Player, Team, next_bid_amount
+
+STANDINGS_FIELDS = ("id", "cpl_id", "name", "total_amount", "expended_amount", "balance_amount",
+                    "internal_players_count", "external_players_count",
+                    "internal_sold_amount", "external_sold_amount")
+
+
+def max_next_bid(team, season):
+    # The most the team can offer for one more player of either kind
+    return max(next_bid_amount(team, Player(is_external=False), season),
+               next_bid_amount(team, Player(is_external=True), season))
+
+
+def team_standings(season):
+    """One row per team of the season, richest balance first, in a single query.
+
+    Counts and sold amounts come from the counters kept on Team, the
+    most expensive buy from a correlated subquery on Bid, so the cost
+    does not grow with the number of teams.
+    """
+    top_buy = Bid.objects.filter(team=OuterRef("pk"), is_sold=True).order_by("-bid_amount", "id")
+    teams = (Team.objects.only(*STANDINGS_FIELDS).filter(season=season)
+             .annotate(bids_placed=Count("bid"),
+                       top_buy_amount=Subquery(top_buy.values("bid_amount")[:1]),
+                       top_buy_player=Subquery(top_buy.values("player__name")[:1]))
+             .order_by("-balance_amount", "name"))
+
+    standings = []
+    for team in teams:
+        standings.append({
+            **{field: getattr(team, field) for field in STANDINGS_FIELDS},
+            "players_count": team.internal_players_count + team.external_players_count,
+            "bids_placed": team.bids_placed,
+            "max_next_bid": max_next_bid(team, season),
+            "top_buy": {"player": team.top_buy_player, "amount": team.top_buy_amount}
+                       if team.top_buy_player is not None else None,
+        })
+    return standings
@@ -0,0 +1,110 @@
+import gzip
+import logging
+import re
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.utils.functional import cached_property
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Text formats worth compressing, images and fonts like woff2 are compressed already
+COMPRESSIBLE = {".css", ".js", ".map", ".svg", ".html", ".txt", ".json", ".xml", ".ico", ".ttf", ".otf", ".eot"}
+# A variant has to save this much to be kept
+MIN_SAVING = 0.05
+
+CSS_TOKEN_RE = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|/\*![\s\S]*?\*/)|(/\*[\s\S]*?\*/)|(\s+)""")
+CSS_TIGHT = set("{};,>")
+
+
+def minify_css(source):
+    """Drop comments and the whitespace around {};,>, strings and /*! licences are left alone."""
+    def replace(match):
+        kept, comment, space = match.groups()
+        if kept:
+            return kept
+        if comment:
+            return ""
+        text = match.string
+        before = text[match.start() - 1] if match.start() else "{"
+        after = text[match.end()] if match.end() < len(text) else "}"
+        return "" if before in CSS_TIGHT or after in CSS_TIGHT else " "
+    return CSS_TOKEN_RE.sub(replace, source).strip()
+
+
+def minify_js(source):
+    """Drop comment lines, indentation and blank lines.
+
+    Line based so semicolon insertion is never affected; a template literal
+    may span lines, so files with backticks are only stripped at the end.
+    """
+    if "`" in source:
+        return source.strip() + "\n"
+    lines = (line.strip() for line in source.splitlines())
+    return "\n".join(line for line in lines if line and not line.startswith("//")) + "\n"
+
+
+# Our own assets, the admin and import_export bundles ship minified
+MINIFY = {
+    "css/styles.css": minify_css,
+    "js/scripts.js": minify_js,
+}
+
+
+def compressible(name):
+    return any(name.endswith(ext) for ext in COMPRESSIBLE)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """collectstatic build: minify our assets, content-hash every name, precompress.
+
+    Files get a .gz and, with the brotli package, a .br variant next to them,
+    served by cpl_backend.serving.serve_static or nginx's gzip_static.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+        for name, minify in MINIFY.items():
+            if name in paths:
+                with self.open(name) as f:
+                    source = f.read().decode()
+                self.delete(name)
+                self._save(name, ContentFile(minify(source).encode()))
+                # Hashed and copied from our minified copy rather than the source
+                paths[name] = (self, name)
+
+        processed = set()
+        for name, hashed_name, result in super().post_process(paths, dry_run, **options):
+            if not isinstance(result, Exception):
+                processed.update((name, hashed_name))
+            yield name, hashed_name, result
+
+        if brotli is None:
+            logger.info("brotli is not installed, static files get gzip variants only")
+        for name in sorted(filter(None, processed)):
+            # Intermediate names of CSS files are gone by now
+            if compressible(name) and self.exists(name):
+                self.compress(name)
+
+    def compress(self, name):
+        with self.open(name) as f:
+            content = f.read()
+        variants = {"gz": gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants["br"] = brotli.compress(content)
+        for ext, compressed in variants.items():
+            if self.exists(f"{name}.{ext}"):
+                self.delete(f"{name}.{ext}")
+            if len(compressed) < len(content) * (1 - MIN_SAVING):
+                self._save(f"{name}.{ext}", ContentFile(compressed))
+
+    @cached_property
+    def immutable_names(self):
+        # A hashed name always holds the same content
+        return frozenset(self.hashed_files.values())
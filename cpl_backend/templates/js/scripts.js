@@ -74,3 +74,136 @@ $(this).prop('Counter',0).animate({
 
 
 
+// Live auction updates, pushed by the server when a bid is committed
+window.addEventListener('DOMContentLoaded', event => {
+
+    const liveUrl = document.body.dataset.liveUrl;
+    if (!liveUrl || !window.EventSource) {
+        return;
+    }
+
+    const updateTeam = function (team) {
+        document.querySelectorAll('[data-live-team="' + team.id + '"]').forEach(container => {
+            Object.keys(team).forEach(field => {
+                container.querySelectorAll('[data-field="' + field + '"]').forEach(element => {
+                    element.textContent = team[field];
+                });
+            });
+        });
+    };
+
+    const source = new EventSource(liveUrl);
+    ['bid', 'sold', 'undo', 'reset'].forEach(name => {
+        // For the other scripts of the page
+        source.addEventListener(name, message => {
+            document.dispatchEvent(new CustomEvent('auction:update', {detail: {event: name}}));
+        });
+    });
+    ['bid', 'sold', 'undo'].forEach(name => {
+        source.addEventListener(name, message => {
+            const data = JSON.parse(message.data);
+            updateTeam(data.team);
+            if (name === 'sold') {
+                document.querySelectorAll('tr[data-live-player="' + data.player.id + '"]').forEach(row => {
+                    row.remove();
+                });
+            }
+        });
+    });
+    // Bids reverted in bulk, players are back on sale so lists are stale
+    source.addEventListener('reset', message => {
+        JSON.parse(message.data).teams.forEach(updateTeam);
+        if (document.querySelector('[data-live-player]')) {
+            window.location.reload();
+        }
+    });
+
+});
+
+// Player typeahead on the bidding page
+window.addEventListener('DOMContentLoaded', event => {
+
+    document.querySelectorAll('[data-suggest-url]').forEach(input => {
+        const list = document.querySelector(input.dataset.suggestList);
+        let timer = null;
+
+        input.addEventListener('input', () => {
+            clearTimeout(timer);
+            timer = setTimeout(() => {
+                const keyword = input.value.trim();
+                if (keyword.length < 2) {
+                    list.replaceChildren();
+                    return;
+                }
+                fetch(input.dataset.suggestUrl + '&q=' + encodeURIComponent(keyword))
+                    .then(response => response.json())
+                    .then(data => {
+                        list.replaceChildren(...data.results.map(player => {
+                            const link = document.createElement('a');
+                            link.className = 'list-group-item list-group-item-action';
+                            link.href = '/players/' + player.id + '/bid';
+                            link.textContent = player.cpl_id + ' - ' + player.name;
+                            return link;
+                        }));
+                    });
+            }, 150);
+        });
+    });
+
+});
+
+// Team eligibility on the bid form, refreshed after every bid
+window.addEventListener('DOMContentLoaded', event => {
+
+    const select = document.querySelector('[data-eligibility-url]');
+    if (!select) {
+        return;
+    }
+    const input = document.querySelector(select.dataset.amount);
+    const hint = document.querySelector(select.dataset.hint);
+    const basicAmount = Number(select.dataset.basicAmount);
+
+    // The browser refuses the form before it reaches save_bid
+    const check = function () {
+        const option = select.selectedOptions[0];
+        const amount = Number(input.value);
+        let error = '';
+        if (!option || option.disabled) {
+            error = option ? option.dataset.reason : 'No team can bid for this player';
+        } else if (input.value && amount > Number(option.dataset.maxBid)) {
+            error = option.dataset.name + ' can bid up to ' + option.dataset.maxBid;
+        } else if (input.value && amount <= basicAmount) {
+            error = 'The bid has to be more than ' + basicAmount;
+        }
+        input.setCustomValidity(error);
+        hint.textContent = error || (option ? option.dataset.name + ' can bid up to ' + option.dataset.maxBid : '');
+    };
+
+    const refresh = function () {
+        fetch(select.dataset.eligibilityUrl)
+            .then(response => response.json())
+            .then(data => {
+                data.teams.forEach(team => {
+                    const option = select.querySelector('option[value="' + team.id + '"]');
+                    if (!option) {
+                        return;
+                    }
+                    option.disabled = !team.eligible;
+                    option.dataset.maxBid = team.max_bid;
+                    option.dataset.reason = team.reason || '';
+                    option.textContent = team.name + ' \u2014 ' + (team.eligible ? 'up to ' + team.max_bid : team.reason);
+                });
+                if (select.selectedOptions[0] && select.selectedOptions[0].disabled) {
+                    const first = select.querySelector('option:not([disabled])');
+                    select.value = first ? first.value : '';
+                }
+                check();
+            });
+    };
+
+    select.addEventListener('change', check);
+    input.addEventListener('input', check);
+    document.addEventListener('auction:update', refresh);
+    check();
+
+});
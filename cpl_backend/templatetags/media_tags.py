@@ -0,0 +1,29 @@
+from django import template
+from django.utils.html import format_html
+
+from ..images import derivative_url, srcset
+
+register = template.Library()
+
+
+@register.simple_tag
+def media_url(instance, field, size="medium"):
+    """URL of a resized copy, or of the original when there is none."""
+    return derivative_url(instance, field, size)
+
+
+@register.simple_tag
+def responsive_img(instance, field, alt="", sizes="100vw", size="medium", **attrs):
+    """Lazy loading <picture> with WebP and JPEG srcsets."""
+    if instance is None:
+        return ""
+    extra = format_html("".join(f' {name.replace("_", "-")}="{{}}"' for name in attrs), *attrs.values())
+    webp = srcset(instance, field, "webp")
+    if not webp:
+        return format_html('<img src="{}" alt="{}" loading="lazy" decoding="async"{}>',
+                           derivative_url(instance, field), alt, extra)
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" loading="lazy" decoding="async"{}></picture>',
+        webp, sizes, derivative_url(instance, field, size), srcset(instance, field, "jpg"), sizes, alt, extra,
+    )
@@ -1,3 +1,1153 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest import mock, skipIf
 
-# Create your tests here.
+import tablib
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from . import simulator
+from .admin import PlayerResouce
+from .benchmarks import League, check_results, memory_footprint, run_benchmarks
+from .catalog import player_catalog
+from .constants import INTERNAL_PLAYER_BASIC_AMOUNT
+from .database import sqlite_pragmas
+from .eligibility import bid_eligibility
+from .exports import export_chunks
+from .images import Image, derivative_name
+from .importer import import_players
+from .ledger import check_consistency, rebuild, replay, take_snapshots
+from .live import Broadcaster
+from .metrics import registry
+from .models import (AuctionEvent, Team, Player, TeamMember, TeamSnapshot, Bid, BidConflict, Season,
+                     clear_season_cache, default_season, next_bid_amount)
+from .page_cache import auction_version, bump_auction_version, cache_by_version, cache_stats, page_cache
+from .pagination import InvalidCursor, encode_cursor, keyset_page
+from .publisher import Publisher, publish
+from .revert import revert_bids
+from .search import search_players
+from .standings import team_standings
+from .storage import minify_css
+from .writes import PrioritizeWrites
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+
+def create_team(cpl_id, **kwargs):
+    return Team.objects.create(cpl_id=cpl_id, name=f"Team {cpl_id}", description="", logo="", **kwargs)
+
+
+def create_player(cpl_id, is_external=False, **kwargs):
+    return Player.objects.create(cpl_id=cpl_id, name=f"Player {cpl_id}", type="BATSMAN",
+                                 is_external=is_external, is_sold=False, **kwargs)
+
+
+class BidTests(TestCase):
+
+    def test_sold_bid_updates_team(self):
+        team = create_team("T1")
+        player = create_player("P1")
+        Bid.objects.create(team_id=team.id, player_id=player.id, bid_amount=750, is_sold=True)
+
+        team.refresh_from_db()
+        player.refresh_from_db()
+        self.assertTrue(player.is_sold)
+        self.assertEqual(team.internal_players_count, 1)
+        self.assertEqual(team.expended_amount, 750)
+        self.assertEqual(team.balance_amount, team.total_amount - 750)
+
+    def test_bid_on_sold_player_conflicts(self):
+        first, second = create_team("T1"), create_team("T2")
+        player = create_player("P1")
+        Bid.objects.create(team_id=first.id, player_id=player.id, bid_amount=750, is_sold=True)
+
+        with self.assertRaises(BidConflict):
+            Bid.objects.create(team_id=second.id, player_id=player.id, bid_amount=800, is_sold=True)
+        second.refresh_from_db()
+        self.assertEqual(second.expended_amount, 0)
+
+    def test_delete_reverts_team(self):
+        team = create_team("T1")
+        player = create_player("P1", is_external=True)
+        bid = Bid.objects.create(team_id=team.id, player_id=player.id, bid_amount=2500, is_sold=True)
+        bid.delete()
+
+        team.refresh_from_db()
+        player.refresh_from_db()
+        self.assertFalse(player.is_sold)
+        self.assertEqual(team.external_players_count, 0)
+        self.assertEqual(team.expended_amount, 0)
+        self.assertFalse(TeamMember.objects.exists())
+
+
+class LedgerTests(TestCase):
+
+    def test_replay_matches_teams(self):
+        team = create_team("T1")
+        first, second = create_player("P1"), create_player("P2", is_external=True)
+        Bid.objects.create(team_id=team.id, player_id=first.id, bid_amount=750, is_sold=True)
+        take_snapshots()
+        bid = Bid.objects.create(team_id=team.id, player_id=second.id, bid_amount=2500, is_sold=True)
+        bid.delete()
+        self.assertEqual(check_consistency(), [])
+
+    def test_snapshot_leaves_out_events_committed_during_it(self):
+        team = create_team("T1")
+        first, second = create_player("P1"), create_player("P2")
+        Bid.objects.create(team_id=team.id, player_id=first.id, bid_amount=750, is_sold=True)
+
+        def bid_during_replay(**kwargs):
+            states = replay(**kwargs)
+            Bid.objects.create(team_id=team.id, player_id=second.id, bid_amount=800, is_sold=True)
+            return states
+
+        with mock.patch("cpl_backend.ledger.replay", side_effect=bid_during_replay):
+            take_snapshots()
+        snapshot = TeamSnapshot.objects.get(team_id=team.id)
+        self.assertEqual((snapshot.expended_amount, snapshot.members), (750, [first.id]))
+        self.assertEqual(check_consistency(), [])
+
+    def test_rebuild_repairs_drift(self):
+        team = create_team("T1")
+        player = create_player("P1")
+        Bid.objects.create(team_id=team.id, player_id=player.id, bid_amount=750, is_sold=True)
+        Team.objects.update(expended_amount=0, internal_players_count=0)
+        TeamMember.objects.all().delete()
+        self.assertNotEqual(check_consistency(), [])
+
+        rebuild()
+        team.refresh_from_db()
+        self.assertEqual(check_consistency(), [])
+        self.assertEqual(team.expended_amount, 750)
+        self.assertEqual(team.balance_amount, team.total_amount - 750)
+
+
+class RevertTests(TestCase):
+
+    def place_bids(self, teams, count):
+        players = [create_player(f"P{len(teams)}-{i}", is_external=i % 5 == 0) for i in range(count)]
+        for i, player in enumerate(players):
+            Bid.objects.create(team_id=teams[i % len(teams)].id, player_id=player.id,
+                               bid_amount=2100 if player.is_external else 700, is_sold=i % 3 != 0)
+
+    def test_bulk_revert_matches_the_ledger(self):
+        teams = [create_team(f"T{i}") for i in range(3)]
+        self.place_bids(teams, 12)
+        keep = Bid.objects.order_by("id")[:4]
+        kept = set(keep.values_list("id", flat=True))
+
+        revert_bids(Bid.objects.exclude(id__in=kept))
+        self.assertEqual(set(Bid.objects.values_list("id", flat=True)), kept)
+        self.assertEqual(check_consistency(), [])
+        self.assertEqual(Player.objects.filter(is_sold=True).count(), Bid.objects.filter(is_sold=True).count())
+
+    def test_query_count_does_not_grow_with_bids(self):
+        teams = [create_team(f"T{i}", total_amount=500_000) for i in range(4)]
+        self.place_bids(teams, 8)
+        with CaptureQueriesContext(connection) as few, self.captureOnCommitCallbacks() as few_callbacks:
+            revert_bids(Bid.objects.all())
+        # Past the batches of 100 QuerySet.delete() works in, within one INSERT of ledger rows
+        self.place_bids(teams[:3], 120)
+        with CaptureQueriesContext(connection) as many, self.captureOnCommitCallbacks() as many_callbacks:
+            revert_bids(Bid.objects.all())
+        self.assertEqual(len(few), len(many))
+        # One version bump and one "reset" event, not one per bid
+        self.assertEqual((len(few_callbacks), len(many_callbacks)), (2, 2))
+        self.assertFalse(Bid.objects.exists())
+        self.assertEqual(check_consistency(), [])
+
+    def test_filter_on_rows_the_revert_changes(self):
+        teams = [create_team(f"T{i}") for i in range(2)]
+        self.place_bids(teams, 9)
+        sold = Bid.objects.filter(is_sold=True).count()
+
+        plan = revert_bids(Bid.objects.filter(player__is_sold=True, player__teammember__isnull=False))
+        self.assertEqual(sum(change["bids"] for change in plan.values()), sold)
+        self.assertEqual(AuctionEvent.objects.filter(kind=AuctionEvent.REVERTED).count(), sold)
+        self.assertFalse(Bid.objects.filter(is_sold=True).exists())
+        self.assertEqual(check_consistency(), [])
+
+    def test_dry_run_writes_nothing(self):
+        team = create_team("T1")
+        self.place_bids([team], 3)
+        plan = revert_bids(Bid.objects.all(), dry_run=True)
+        self.assertEqual(plan[team.id]["bids"], 3)
+        self.assertEqual(Bid.objects.count(), 3)
+
+
+@skipIf(connection.vendor != "sqlite", "SQLite full-text index")
+class SearchTests(TestCase):
+
+    def search(self, keyword):
+        return [player.name for player in search_players(keyword, Player.objects.filter(season=default_season()))]
+
+    def test_name_matches_rank_first(self):
+        Player.objects.create(cpl_id="VIS1", name="Arun", type="BOWLER", is_external=False, is_sold=False)
+        Player.objects.create(cpl_id="X1", name="Vishnu Kumar", type="BOWLER", is_external=False, is_sold=False)
+        # Every word as a prefix, the name weighs more than the CPL ID
+        self.assertEqual(self.search("vis"), ["Vishnu Kumar", "Arun"])
+        self.assertEqual(self.search("vish kum"), ["Vishnu Kumar"])
+        self.assertEqual(self.search("ishnu"), [])
+        self.assertEqual(self.search("  "), [])
+
+    @override_settings(PLAYER_CATALOG=False, KEYSET_PAGINATION=True)
+    def test_search_page_keeps_the_rank(self):
+        page_cache().clear()
+        Player.objects.create(cpl_id="VIS1", name="Arun", type="BOWLER", is_external=False, is_sold=False)
+        Player.objects.create(cpl_id="X1", name="Vishnu Kumar", type="BOWLER", is_external=False, is_sold=False)
+        for params in ({"search": "vis"}, {"search": "vis", "cursor": ""}):
+            response = self.client.get(reverse("player_search"), params)
+            self.assertEqual([player.name for player in response.context["players"]], ["Vishnu Kumar", "Arun"])
+
+    def test_index_follows_saves_and_deletes(self):
+        player = create_player("P1")
+        self.assertEqual(self.search("player"), ["Player P1"])
+        player.name = "Renamed"
+        player.save()
+        self.assertEqual(self.search("player"), [])
+        self.assertEqual(self.search("renamed"), ["Renamed"])
+        player.delete()
+        self.assertEqual(self.search("renamed"), [])
+
+    def test_suggest_returns_unsold_matches_within_the_limit(self):
+        sold = create_player("P1")
+        for i in range(2, 5):
+            create_player(f"P{i}")
+        Bid.objects.create(team_id=create_team("T1").id, player_id=sold.id, bid_amount=750, is_sold=True)
+
+        results = self.client.get(reverse("player_suggest"), {"q": "play", "unsold": "1", "limit": "2"}).json()
+        self.assertEqual([player["cpl_id"] for player in results["results"]], ["P2", "P3"])
+        self.assertEqual(set(results["results"][0]), {"id", "cpl_id", "name", "type", "is_external", "is_sold"})
+        for limit in ("-5", "0", "x"):
+            response = self.client.get(reverse("player_suggest"), {"q": "play", "limit": limit})
+            self.assertEqual(response.status_code, 200, limit)
+        self.assertEqual(len(self.client.get(reverse("player_suggest"), {"q": "play", "limit": "-5"})
+                             .json()["results"]), 1)
+
+
+class PaginationTests(TestCase):
+
+    def setUp(self):
+        page_cache().clear()
+        player_catalog.drop()
+        self.players = [create_player(f"P{i:02}") for i in range(45)]
+        self.ids = [player.id for player in self.players]
+
+    def test_keyset_pages_walk_forward_and_back(self):
+        first = keyset_page(Player.objects.all(), per_page=20)
+        second = keyset_page(Player.objects.all(), cursor=first.next_cursor, per_page=20)
+        third = keyset_page(Player.objects.all(), cursor=second.next_cursor, per_page=20)
+        self.assertEqual([player.id for page in (first, second, third) for player in page], self.ids)
+        self.assertFalse(first.has_previous())
+        self.assertFalse(third.has_next())
+        back = keyset_page(Player.objects.all(), cursor=second.previous_cursor, per_page=20)
+        self.assertEqual([player.id for player in back], self.ids[:20])
+        self.assertFalse(back.has_previous())
+
+    def test_a_deep_page_is_one_query(self):
+        with self.assertNumQueries(1):
+            page = keyset_page(Player.objects.all(), cursor=encode_cursor([self.ids[39]]), per_page=20)
+        self.assertEqual([player.id for player in page], self.ids[40:])
+
+    def test_malformed_cursors_are_rejected(self):
+        for cursor in ["!!!", encode_cursor(["x"]), encode_cursor([[1]]), encode_cursor([1, 2])]:
+            with self.assertRaises(InvalidCursor, msg=cursor):
+                keyset_page(Player.objects.all(), cursor=cursor)
+
+    def test_list_pages_fall_back_to_the_first_page(self):
+        for catalog in (True, False):
+            with self.subTest(catalog=catalog), override_settings(PLAYER_CATALOG=catalog):
+                page_cache().clear()
+                response = self.client.get(reverse("players"), {"cursor": encode_cursor(["x"])})
+                self.assertEqual([player.id for player in response.context["players"]], self.ids[:20])
+                response = self.client.get(reverse("players"), {"cursor": encode_cursor([self.ids[19]])})
+                self.assertEqual([player.id for player in response.context["players"]], self.ids[20:40])
+
+
+class StandingsTests(TestCase):
+
+    def test_one_query_whatever_the_number_of_teams(self):
+        teams = [create_team(f"T{i}") for i in range(5)]
+        Bid.objects.create(team_id=teams[0].id, player_id=create_player("P1").id, bid_amount=750, is_sold=True)
+        Bid.objects.create(team_id=teams[0].id, player_id=create_player("P2").id, bid_amount=900, is_sold=True)
+
+        with self.assertNumQueries(1):
+            standings = team_standings(teams[0].season)
+        self.assertEqual(len(standings), 5)
+        top = next(row for row in standings if row["id"] == teams[0].id)
+        self.assertEqual(top["internal_players_count"], 2)
+        self.assertEqual(top["top_buy"], {"player": "Player P2", "amount": 900})
+
+
+@skipIf(simulator.np is None, "numpy is not installed")
+class SimulatorTests(TestCase):
+
+    def test_bid_matrix_matches_next_bid_amount(self):
+        team = create_team("T1")
+        players = [create_player("P1"), create_player("P2", is_external=True)]
+        Bid.objects.create(team_id=team.id, player_id=create_player("P3").id, bid_amount=750, is_sold=True)
+
+        limits, feasible = simulator.bid_matrix(simulator.AuctionState())
+        team.refresh_from_db()
+        for column, player in enumerate(players):
+            self.assertEqual(limits[0, column], next_bid_amount(team, player))
+        self.assertTrue(feasible.all())
+
+    def test_simulation_fills_rosters(self):
+        create_team("T1")
+        for i in range(20):
+            create_player(f"P{i}", is_external=i < 4)
+
+        result = simulator.simulate(simulator.AuctionState(), simulations=50, seed=1)
+        self.assertEqual(result.teams[0]["shortfall_risk"], 0)
+        self.assertEqual(result.teams[0]["mean_players_bought"], 10)
+
+
+class QueryBudgetTests(TestCase):
+
+    def test_endpoints_stay_within_query_budget(self):
+        for size in (100, 400):
+            with self.subTest(players=size):
+                Team.objects.all().delete()
+                Player.objects.all().delete()
+                player_catalog.drop()
+                results = run_benchmarks(League(teams=4, players=size, bids=size // 20), repeat=2)
+                self.assertEqual(check_results(results), [])
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        registry.clear()
+        page_cache().clear()
+
+    def test_request_is_recorded_per_view(self):
+        create_team("T1")
+        self.client.get(reverse("standings"))
+
+        metrics = registry.views["standings"]
+        self.assertEqual(metrics.latency.count, 1)
+        self.assertEqual(metrics.queries.sum, 1)
+        self.assertGreater(metrics.render_time.sum, 0)
+        text = self.client.get(reverse("metrics")).content.decode()
+        self.assertIn('cpl_request_queries_sum{view="standings"} 1', text)
+        self.assertIn('cpl_requests_total{view="standings",status="200"} 1', text)
+
+    def test_metrics_are_for_staff_and_allowed_addresses(self):
+        self.assertEqual(self.client.get(reverse("metrics"), REMOTE_ADDR="203.0.113.5").status_code, 403)
+        with override_settings(METRICS_ALLOWED_IPS={"203.0.113.5"}):
+            self.assertEqual(self.client.get(reverse("metrics"), REMOTE_ADDR="203.0.113.5").status_code, 200)
+        self.client.force_login(User.objects.create_user("admin", is_staff=True))
+        self.assertEqual(self.client.get(reverse("metrics"), REMOTE_ADDR="203.0.113.5").status_code, 200)
+        with override_settings(METRICS_ENABLED=False):
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, 404)
+
+
+@skipIf(connection.vendor != "sqlite", "SQLite only")
+class SQLiteTuningTests(TestCase):
+
+    def test_connections_run_in_wal_mode(self):
+        pragmas = sqlite_pragmas(connection)
+        self.assertEqual(pragmas["journal_mode"], "wal")
+        self.assertEqual(pragmas["busy_timeout"], settings.SQLITE_PRAGMAS["busy_timeout"])
+
+
+@skipIf(connection.vendor != "sqlite", "SQLite only")
+class IndexTests(TestCase):
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(index, plan)
+        # "SCAN players" alone is a full table scan, "SCAN players USING INDEX" is not
+        self.assertNotRegex(plan, r"(?m)SCAN \w+$")
+
+    def test_unsold_players_use_the_partial_index(self):
+        self.assertUsesIndex(Player.objects.filter(season=default_season(), is_sold=False).order_by("id")[:20],
+                             "player_unsold_idx")
+
+    def test_top_buy_of_a_team_is_read_from_the_index(self):
+        plan = Bid.objects.filter(team_id=1, is_sold=True).order_by("-bid_amount")[:1].explain()
+        self.assertIn("bid_team_sold_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_roster_is_searched_by_team(self):
+        self.assertUsesIndex(TeamMember.objects.filter(team_id=1, players__is_external=True), "SEARCH team_players USING")
+
+    def test_duplicate_roster_rows_are_rejected(self):
+        team, player = create_team("T1"), create_player("P1")
+        TeamMember.objects.create(season=team.season, team=team, players=player)
+        with self.assertRaises(IntegrityError):
+            TeamMember.objects.create(season=team.season, team=team, players=player)
+
+
+class ApiTests(TestCase):
+
+    def setUp(self):
+        page_cache().clear()
+
+    def test_unchanged_poll_is_not_modified_without_queries(self):
+        create_player("P1")
+        response = self.client.get(reverse("api_players"), {"fields": "id,name"})
+        self.assertEqual(response.json()["results"][0], {"id": Player.objects.get().id, "name": "Player P1"})
+
+        with self.assertNumQueries(0):
+            again = self.client.get(reverse("api_players"), {"fields": "id,name"},
+                                    HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(again.status_code, 304)
+
+    def test_etag_is_per_query(self):
+        create_player("P1")
+        etag = self.client.get(reverse("api_players"), {"fields": "id"})["ETag"]
+        self.assertEqual(self.client.get(reverse("api_players"), {"fields": "id"},
+                                         HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        for params in ({"fields": "id,name"}, {"fields": "id", "limit": 1}, {}):
+            response = self.client.get(reverse("api_players"), params, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200, params)
+            self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(self.client.get(reverse("api_teams"), {"fields": "id"},
+                                         HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_bid_changes_the_etag(self):
+        team, player = create_team("T1"), create_player("P1")
+        etag = self.client.get(reverse("api_bids"))["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Bid.objects.create(team_id=team.id, player_id=player.id, bid_amount=750, is_sold=True)
+
+        response = self.client.get(reverse("api_bids"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["team"], {"id": team.id, "name": "Team T1"})
+
+    def test_invalid_cursor_is_a_bad_request(self):
+        create_team("T1"), create_player("P1")
+        for name in ("api_players", "api_teams", "api_bids"):
+            for cursor in ("!!!", encode_cursor(["x"]), encode_cursor([None])):
+                response = self.client.get(reverse(name), {"cursor": cursor})
+                self.assertEqual(response.status_code, 400, (name, cursor))
+
+    def test_cursor_pages_through_the_players(self):
+        players = [create_player(f"P{i}") for i in range(3)]
+        response = self.client.get(reverse("api_players"), {"fields": "id", "limit": 2}).json()
+        self.assertEqual([row["id"] for row in response["results"]], [players[0].id, players[1].id])
+        response = self.client.get(response["next"])
+        self.assertEqual([row["id"] for row in response.json()["results"]], [players[2].id])
+
+
+class PublisherTests(TestCase):
+
+    def setUp(self):
+        page_cache().clear()
+        player_catalog.drop()
+
+    def test_publish_writes_display_pages(self):
+        team, player = create_team("T1"), create_player("P1")
+        Bid.objects.create(team_id=team.id, player_id=player.id, bid_amount=750, is_sold=True)
+        with tempfile.TemporaryDirectory() as directory:
+            changed = publish(directory)
+            self.assertIn(f"teams/{team.id}.html", changed)
+            with open(os.path.join(directory, f"teams/{team.id}.html")) as f:
+                self.assertIn("Player P1", f.read())
+            with open(os.path.join(directory, "teams/index.json")) as f:
+                self.assertEqual(json.load(f)["teams"][0]["id"], team.id)
+            # Nothing changed, no file is rewritten
+            self.assertEqual(publish(directory), [])
+            self.assertEqual([name for name in os.listdir(directory + "/teams") if name.endswith(".tmp")], [])
+
+    def test_burst_of_bids_publishes_once(self):
+        published = threading.Event()
+        calls = []
+        publisher = Publisher(lambda: (calls.append(1), published.set()), delay=0.05)
+        for _ in range(20):
+            publisher.schedule()
+        self.assertTrue(published.wait(5))
+        time.sleep(0.1)
+        self.assertEqual(len(calls), 1)
+
+
+class PageCacheTests(TestCase):
+
+    def setUp(self):
+        page_cache().clear()
+        self.season = default_season()
+        self.rendered = 0
+
+    def request(self, path="/page/", message=None):
+        request = RequestFactory().get(path)
+        request.season = self.season
+        request._messages = CookieStorage(request)
+        if message:
+            messages.info(request, message)
+        return request
+
+    def page(self, request):
+        self.rendered += 1
+        return HttpResponse(f"render {self.rendered}")
+
+    def test_hit_until_the_version_moves(self):
+        view = cache_by_version(self.page)
+        self.assertEqual(view(self.request())["X-Cache"], "MISS")
+        response = view(self.request())
+        self.assertEqual((response["X-Cache"], response.content), ("HIT", b"render 1"))
+        # Another query string is another page
+        self.assertEqual(view(self.request("/page/?page=2")).content, b"render 2")
+
+        version = auction_version(self.season.id)
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            create_team("T1")
+        # Still the old version until the commit, nothing older can be cached under the new one
+        self.assertEqual(auction_version(self.season.id), version)
+        for callback in callbacks:
+            callback()
+        self.assertGreater(auction_version(self.season.id), version)
+        response = view(self.request())
+        self.assertEqual((response["X-Cache"], response.content), ("MISS", b"render 3"))
+
+    def test_pending_messages_bypass_the_cache(self):
+        view = cache_by_version(self.page)
+        view(self.request())
+        bypassed = cache_stats()["bypassed"]
+        response = view(self.request(message="Bid saved"))
+        self.assertEqual(response.content, b"render 2")
+        self.assertNotIn("X-Cache", response)
+        self.assertEqual(cache_stats()["bypassed"], bypassed + 1)
+        # Nor is what they rendered stored
+        self.assertEqual(view(self.request()).content, b"render 1")
+
+    def test_errors_are_not_cached(self):
+        view = cache_by_version(lambda request: HttpResponse(status=500))
+        view(self.request())
+        self.assertEqual(view(self.request())["X-Cache"], "MISS")
+
+    def test_concurrent_misses_render_once(self):
+        async def page(request):
+            await asyncio.sleep(0.01)
+            return self.page(request)
+        view = cache_by_version(page)
+
+        async def run():
+            return await asyncio.gather(*(view(self.request()) for _ in range(5)))
+
+        responses = asyncio.run(run())
+        self.assertEqual(self.rendered, 1)
+        self.assertEqual({response.content for response in responses}, {b"render 1"})
+        self.assertEqual(sorted(response["X-Cache"] for response in responses), ["HIT"] * 4 + ["MISS"])
+
+
+class AsyncViewTests(TestCase):
+
+    def setUp(self):
+        page_cache().clear()
+        player_catalog.drop()
+
+    async def test_spectator_pages(self):
+        team = await Team.objects.acreate(cpl_id="T1", name="Team T1", description="", logo="")
+        await Player.objects.acreate(cpl_id="P1", name="Player P1", type="BATSMAN", is_external=False,
+                                      is_sold=False)
+        for url in [reverse("players"), reverse("teams"), reverse("team", args=[team.id]), reverse("to_bid"),
+                    reverse("player_search") + "?search=P1"]:
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+        self.assertContains(await self.async_client.get(reverse("players")), "Player P1")
+
+    # The write threads have connections of their own, outside the test transaction
+    @override_settings(WRITE_THREADS=0)
+    async def test_save_bid(self):
+        team = await Team.objects.acreate(cpl_id="T1", name="Team T1", description="", logo="")
+        player = await Player.objects.acreate(cpl_id="P1", name="Player P1", type="BATSMAN", is_external=False,
+                                      is_sold=False)
+        response = await self.async_client.post(reverse("save_bid"), {
+            "player": player.id, "team": team.id, "amount": 750, "is_sold": "1", "next": reverse("to_bid")})
+        self.assertRedirects(response, reverse("to_bid"), fetch_redirect_response=False)
+        self.assertTrue(await Bid.objects.filter(player=player, is_sold=True).aexists())
+
+    def test_writes_skip_the_read_queue(self):
+        entered, release = [], None
+
+        async def application(scope, receive, send):
+            entered.append(scope["method"])
+            if scope["method"] == "GET":
+                await release.wait()
+
+        async def run():
+            nonlocal release
+            release = asyncio.Event()
+            app = PrioritizeWrites(application, limit=1)
+            scope = {"type": "http", "path": "/teams/"}
+            reads = [asyncio.create_task(app({**scope, "method": "GET"}, None, None)) for _ in range(3)]
+            await asyncio.sleep(0)
+            await app({**scope, "method": "POST"}, None, None)
+            # One read is in, the others wait, the bid went straight through
+            self.assertEqual(entered, ["GET", "POST"])
+            release.set()
+            await asyncio.gather(*reads)
+            self.assertEqual(entered.count("GET"), 3)
+
+        asyncio.run(run())
+
+
+class LiveTests(TestCase):
+
+    def test_publish_fans_out_to_the_listeners_of_the_season(self):
+        async def run():
+            broadcaster = Broadcaster()
+            streams = [broadcaster.listen(season_id=season_id, heartbeat=0.05) for season_id in (1, 1, 2)]
+            for stream in streams:
+                self.assertEqual(await anext(stream), b"retry: 3000\n\n")
+            self.assertEqual(broadcaster.listener_count, 3)
+
+            broadcaster.publish("sold", {"player": 7}, season_id=1)
+            for stream in streams[:2]:
+                self.assertEqual(await anext(stream), b'id: 1\nevent: sold\ndata: {"player": 7}\n\n')
+            # Not for the other season, which only hears the heartbeat
+            self.assertEqual(await anext(streams[2]), b": keep-alive\n\n")
+            for stream in streams:
+                await stream.aclose()
+            self.assertEqual(broadcaster.listener_count, 0)
+
+        asyncio.run(run())
+
+    def test_reconnecting_client_replays_from_last_event_id(self):
+        async def run():
+            broadcaster = Broadcaster()
+            for i in range(3):
+                broadcaster.publish("bid", {"i": i}, season_id=1)
+            stream = broadcaster.listen(last_event_id=1, season_id=1)
+            messages = [await anext(stream) for _ in range(3)]
+            await stream.aclose()
+            self.assertEqual([message.split(b"\n")[0] for message in messages[1:]], [b"id: 2", b"id: 3"])
+
+        asyncio.run(run())
+
+    def test_slow_listener_is_dropped_when_its_queue_is_full(self):
+        async def run():
+            broadcaster = Broadcaster(queue_size=2)
+            stream = broadcaster.listen()
+            await anext(stream)
+            for i in range(3):
+                broadcaster.publish("bid", {"i": i})
+            # Let the loop run the offers
+            await asyncio.sleep(0)
+            with self.assertRaises(StopAsyncIteration):
+                await anext(stream)
+            self.assertEqual(broadcaster.listener_count, 0)
+
+        asyncio.run(run())
+
+    def test_wsgi_requests_are_not_streamed(self):
+        self.assertEqual(self.client.get(reverse("live")).status_code, 204)
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        self.teams = [create_team("T1"), create_team("T2")]
+        self.players = [create_player(f"P{i}") for i in range(4)]
+        for i, player in enumerate(self.players):
+            Bid.objects.create(team_id=self.teams[i % 2].id, player_id=player.id, bid_amount=650, is_sold=False)
+            Bid.objects.create(team_id=self.teams[i % 2].id, player_id=player.id, bid_amount=700 + i, is_sold=True)
+
+    def read_csv(self, name):
+        return b"".join(export_chunks(name, "csv", self.teams[0].season)).decode().splitlines()
+
+    def test_rosters_are_grouped_by_team_with_the_price_paid(self):
+        self.assertEqual(self.read_csv("rosters"), [
+            "Team ID,Team,Player ID,Player,Type,External,Price paid",
+            "T1,Team T1,P0,Player P0,BATSMAN,False,700.0",
+            "T1,Team T1,P2,Player P2,BATSMAN,False,702.0",
+            "T2,Team T2,P1,Player P1,BATSMAN,False,701.0",
+            "T2,Team T2,P3,Player P3,BATSMAN,False,703.0",
+        ])
+
+    def test_bid_log_has_every_bid(self):
+        rows = self.read_csv("bids")
+        self.assertEqual(len(rows), 1 + 8)
+        self.assertTrue(rows[1].endswith(",T1,Team T1,P0,Player P0,650.0,False"))
+
+    def test_header_is_sent_before_any_query(self):
+        for format in ("csv", "xlsx"):
+            chunks = export_chunks("bids", format, self.teams[0].season)
+            with self.assertNumQueries(0):
+                self.assertTrue(next(chunks))
+            with self.assertNumQueries(1):
+                list(chunks)
+
+    @skipIf(openpyxl is None, "openpyxl is not installed")
+    def test_xlsx_opens_in_a_spreadsheet(self):
+        workbook = openpyxl.load_workbook(io.BytesIO(b"".join(export_chunks("rosters", "xlsx", self.teams[0].season))))
+        rows = list(workbook["Rosters"].iter_rows(values_only=True))
+        self.assertEqual(rows[1], ("T1", "Team T1", "P0", "Player P0", "BATSMAN", False, 700))
+        self.assertEqual(len(rows), 5)
+
+    def test_command_writes_the_exports(self):
+        with tempfile.TemporaryDirectory() as directory:
+            call_command("export_auction", "--output", directory, stdout=io.StringIO())
+            self.assertEqual(sorted(os.listdir(directory)), ["bids.csv", "rosters.csv"])
+            with open(os.path.join(directory, "rosters.csv")) as f:
+                self.assertEqual(f.read().splitlines(), self.read_csv("rosters"))
+
+
+class ImportTests(TestCase):
+
+    def row(self, cpl_id, **values):
+        return {"cpl_id": cpl_id, "name": f"Player {cpl_id}", "type": "BATSMAN", **values}
+
+    def test_players_are_created_and_updated(self):
+        stats = import_players([self.row("P1"), self.row("P2", is_sold="yes"), self.row("", type="x")])
+        self.assertEqual((stats.created, stats.updated, len(stats.errors)), (2, 0, 1))
+        self.assertEqual(dict(Player.objects.values_list("cpl_id", "is_sold")), {"P1": False, "P2": True})
+
+        stats = import_players([self.row("P1", name="Renamed"), self.row("P2", is_sold="yes")])
+        self.assertEqual((stats.created, stats.updated), (0, 1))
+        self.assertEqual(Player.objects.get(cpl_id="P1").name, "Renamed")
+
+    def test_reimport_keeps_is_sold_of_existing_players(self):
+        team, player = create_team("T1"), create_player("P1")
+        Bid.objects.create(team_id=team.id, player_id=player.id, bid_amount=750, is_sold=True)
+
+        import_players([self.row("P1", name="Renamed", is_external="1")])
+        player.refresh_from_db()
+        self.assertEqual((player.name, player.is_external, player.is_sold), ("Renamed", True, True))
+
+        # A sold flag in the file doesn't free or sell an existing player either
+        import_players([self.row("P1", is_sold="0")])
+        player.refresh_from_db()
+        self.assertTrue(player.is_sold)
+
+
+class EligibilityTests(TestCase):
+
+    def setUp(self):
+        page_cache().clear()
+
+    def test_max_bid_is_the_highest_bid_accepted(self):
+        team, player = create_team("T1"), create_player("P1")
+        row = bid_eligibility(player)[0]
+        self.assertTrue(row["eligible"])
+
+        with self.assertRaises(ValidationError):
+            Bid.objects.create(team_id=team.id, player_id=player.id, bid_amount=row["max_bid"] + 1, is_sold=True)
+        Bid.objects.create(team_id=team.id, player_id=player.id, bid_amount=row["max_bid"], is_sold=True)
+
+    def test_endpoint_costs_two_queries_for_any_number_of_teams(self):
+        create_team("T1", expended_amount=39_000)
+        for i in range(2, 8):
+            create_team(f"T{i}")
+        player = create_player("P1")
+
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("api_player_eligibility", args=[player.id]))
+        teams = response.json()["teams"]
+        self.assertEqual(len(teams), 7)
+        self.assertEqual((teams[0]["eligible"], teams[0]["reason"]),
+                         (False, "Would not leave enough for the remaining players"))
+        self.assertContains(self.client.get(reverse("bids", args=[player.id])), " disabled>", count=1)
+
+
+class StaticFilesTests(TestCase):
+
+    def test_minified_css_keeps_strings(self):
+        css = '/* theme */\na > b ,  c {\n  content: "a  ;b" ;\n}\n'
+        self.assertEqual(minify_css(css), 'a>b,c{content: "a  ;b";}')
+
+    def test_collected_assets_are_hashed_and_precompressed(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(STATIC_ROOT=directory, STORAGES={**settings.STORAGES, "staticfiles": {
+                    "BACKEND": "cpl_backend.storage.CompressedManifestStaticFilesStorage"}}):
+            call_command("collectstatic", interactive=False, verbosity=0)
+            name = staticfiles_storage.stored_name("css/styles.css")
+            self.assertRegex(name, r"^css/styles\.[0-9a-f]{12}\.css$")
+            self.assertContains(self.client.get(reverse("home")), f"/static/{name}")
+
+            response = self.client.get(f"/static/{name}", HTTP_ACCEPT_ENCODING="gzip, br;q=0")
+            self.assertEqual(response["Content-Encoding"], "gzip")
+            self.assertEqual(response["Content-Disposition"], f'inline; filename="{os.path.basename(name)}"')
+            self.assertIn("immutable", response["Cache-Control"])
+            self.assertIn("Accept-Encoding", response["Vary"])
+            content = gzip.decompress(b"".join(response.streaming_content))
+            with open(os.path.join(directory, name), "rb") as f:
+                self.assertEqual(content, f.read())
+            self.assertLess(len(content), os.path.getsize(finders.find("css/styles.css")))
+            # Like ManifestStaticFilesStorage, a file that wasn't collected is an error, not a 404 later
+            with self.assertRaises(ValueError):
+                staticfiles_storage.stored_name("css/missing.css")
+
+
+@skipIf(Image is None, "Pillow is not installed")
+class ImageTests(TestCase):
+
+    def setUp(self):
+        page_cache().clear()
+        player_catalog.drop()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = override_settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def upload(self, name, size=(800, 600)):
+        buffer = io.BytesIO()
+        Image.new("RGBA", size, (200, 30, 30, 128)).save(buffer, "PNG")
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def test_derivatives_are_built_after_the_commit(self):
+        photo = self.upload("players/photo/p1.png")
+        with self.captureOnCommitCallbacks(execute=True):
+            player = create_player("P1", photo=photo)
+            self.assertEqual(Player.objects.get().photo_digest, "")
+
+        player.refresh_from_db()
+        self.assertEqual(len(player.photo_digest), 20)
+        for size, edge in (("thumb", 160), ("medium", 640)):
+            for ext in ("jpg", "webp"):
+                with default_storage.open(derivative_name(player.photo_digest, size, ext)) as f:
+                    self.assertEqual(max(Image.open(f).size), edge)
+        # Patched after the update, not only on the next read
+        self.assertEqual(player_catalog.get(player.season_id).players[0].photo_digest, player.photo_digest)
+
+    def test_backfill_moves_the_pages_and_catalog_on(self):
+        photo = self.upload("players/photo/p1.png")
+        # Stored without the signals, as rows of an older release
+        Player.objects.bulk_create([Player(season=default_season(), cpl_id="P1", name="Player P1",
+                                           type="BATSMAN", is_external=False, is_sold=False, photo=photo)])
+        version = auction_version(default_season().id)
+        self.assertEqual(player_catalog.get(default_season().id).players[0].photo_digest, "")
+
+        call_command("build_derivatives", stdout=io.StringIO())
+        digest = Player.objects.get().photo_digest
+        self.assertEqual(len(digest), 20)
+        self.assertGreater(auction_version(default_season().id), version)
+        self.assertEqual(player_catalog.get(default_season().id).players[0].photo_digest, digest)
+
+    def test_unreadable_files_are_served_as_is(self):
+        card = default_storage.save("players/card/p1.png", ContentFile(b"not an image"))
+        photo = self.upload("players/photo/p1.png", size=(200, 200))
+        with self.assertLogs("cpl_backend.images", "WARNING") as logs, \
+                mock.patch.object(Image, "MAX_IMAGE_PIXELS", 1000), self.captureOnCommitCallbacks(execute=True):
+            player = create_player("P1", card=card, photo=photo)
+        # The photo is over twice the pixel limit, a decompression bomb to Pillow
+        self.assertEqual(len(logs.records), 2)
+
+        player.refresh_from_db()
+        self.assertEqual((player.card_digest, player.photo_digest), ("", ""))
+
+    def test_media_tags(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            player = create_player("P1", photo=self.upload("players/photo/p1.png"))
+        player.refresh_from_db()
+        other = create_player("P2", card="players/card/p2.pdf")
+        template = Template('{% load media_tags %}{% media_url player "photo" "thumb" %}|'
+                            '{% media_url player "card" %}|{% responsive_img player "photo" alt="Me" %}')
+
+        url, card, img = template.render(Context({"player": player})).split("|")
+        self.assertEqual(url, f"/media/{derivative_name(player.photo_digest, 'thumb', 'jpg')}")
+        self.assertEqual(card, "")
+        self.assertIn('<source type="image/webp"', img)
+        self.assertIn(f"/media/{derivative_name(player.photo_digest, 'thumb', 'webp')} 160w", img)
+
+        self.assertEqual(template.render(Context({"player": other})).split("|")[1], "/media/players/card/p2.pdf")
+        self.assertEqual(template.render(Context({"player": None})), "||")
+
+    def test_bid_page_of_an_unknown_player(self):
+        response = self.client.get(reverse("bids", args=[999]))
+        self.assertEqual(response.status_code, 200)
+
+
+class MediaTests(TestCase):
+    content = bytes(range(256)) * 4
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = override_settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.name = default_storage.save("players/card/p1.pdf", ContentFile(self.content))
+        self.url = f"/media/{self.name}"
+
+    def test_whole_file_with_validators(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+        self.assertEqual((response["Content-Type"], response["Accept-Ranges"]), ("application/pdf", "bytes"))
+        self.assertEqual(response["Cache-Control"], "public, max-age=3600")
+
+        for header, value in (("HTTP_IF_NONE_MATCH", response["ETag"]),
+                              ("HTTP_IF_MODIFIED_SINCE", response["Last-Modified"])):
+            again = self.client.get(self.url, **{header: value})
+            self.assertEqual(again.status_code, 304)
+            self.assertEqual(again["ETag"], response["ETag"])
+
+    def test_byte_ranges(self):
+        for header, start, end in (("bytes=10-19", 10, 19), ("bytes=1000-", 1000, 1023), ("bytes=-4", 1020, 1023),
+                                   ("bytes=1020-5000", 1020, 1023)):
+            response = self.client.get(self.url, HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 206, header)
+            self.assertEqual(response["Content-Range"], f"bytes {start}-{end}/1024")
+            self.assertEqual(b"".join(response.streaming_content), self.content[start:end + 1])
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=1024-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */1024")
+        # Several ranges are not supported and an invalid one is ignored, the whole file is sent
+        for header in ("bytes=0-1,5-6", "bytes=20-10"):
+            response = self.client.get(self.url, HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 200, header)
+            self.assertEqual(b"".join(response.streaming_content), self.content)
+
+    def test_if_range(self):
+        etag = self.client.get(self.url)["ETag"]
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        # A copy of another version gets the whole file
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"0-0"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+
+    def test_derivatives_are_immutable(self):
+        default_storage.save("derivatives/ab/abcd-thumb.jpg", ContentFile(b"jpeg"))
+        response = self.client.get("/media/derivatives/ab/abcd-thumb.jpg")
+        self.assertIn("immutable", response["Cache-Control"])
+
+    def test_missing_and_outside_files(self):
+        self.assertEqual(self.client.get("/media/players/card/none.pdf").status_code, 404)
+        self.assertEqual(self.client.get("/media/../settings.py").status_code, 404)
+        self.assertEqual(self.client.post(self.url).status_code, 405)
+
+    def test_sendfile_leaves_the_body_to_the_front_server(self):
+        with override_settings(MEDIA_SENDFILE_HEADER="X-Accel-Redirect"):
+            response = self.client.get(self.url, HTTP_RANGE="bytes=0-9")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.name}")
+        self.assertEqual(response.content, b"")
+        self.assertIn("ETag", response)
+
+        with override_settings(MEDIA_SENDFILE_HEADER="X-Sendfile"):
+            response = self.client.get(self.url)
+        self.assertEqual(response["X-Sendfile"], default_storage.path(self.name))
+
+
+class SeasonTests(TestCase):
+
+    def setUp(self):
+        page_cache().clear()
+        # The seasons of one test are rolled back, so must be their cache
+        self.addCleanup(clear_season_cache)
+        self.first = default_season()
+        self.second = Season.objects.create(slug="cpl-2025", league="CPL", name="2025",
+                                            internal_player_basic_amount=800)
+
+    def test_pages_show_the_chosen_season_only(self):
+        create_team("T1", season=self.first)
+        create_team("T2", season=self.second)
+
+        response = self.client.get(reverse("api_teams"), {"season": "cpl-2025"})
+        self.assertEqual([team["name"] for team in response.json()["results"]], ["Team T2"])
+        # The cookie keeps the screen on that season
+        response = self.client.get(reverse("teams"))
+        self.assertContains(response, "Team T2")
+        self.assertNotContains(response, "Team T1")
+        self.assertEqual(self.client.get(reverse("teams"), {"season": "nope"}).status_code, 404)
+
+    def test_rules_come_from_the_season(self):
+        self.assertEqual(create_player("P1", season=self.second).basic_amount, 800)
+        self.second.internal_player_basic_amount = 900
+        self.second.save()
+        # No stale rules after the edit
+        self.assertEqual(create_player("P2", season=self.second).basic_amount, 900)
+        self.assertEqual(create_player("P3", season=self.first).basic_amount, INTERNAL_PLAYER_BASIC_AMOUNT)
+
+    def test_bid_across_seasons_is_rejected(self):
+        team, player = create_team("T1", season=self.first), create_player("P1", season=self.second)
+        with self.assertRaises(ValidationError):
+            Bid.objects.create(team_id=team.id, player_id=player.id, bid_amount=1000, is_sold=True)
+
+    def test_bid_bumps_only_its_season(self):
+        team, player = create_team("T1", season=self.first), create_player("P1", season=self.first)
+        other = self.client.get(reverse("api_bids"), {"season": "cpl-2025"})["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Bid.objects.create(team_id=team.id, player_id=player.id, bid_amount=750, is_sold=True)
+        response = self.client.get(reverse("api_bids"), {"season": "cpl-2025"}, HTTP_IF_NONE_MATCH=other)
+        self.assertEqual(response.status_code, 304)
+
+
+class CatalogTests(TestCase):
+
+    def setUp(self):
+        page_cache().clear()
+        # Players of other tests are rolled back without a commit to patch from
+        player_catalog.drop()
+        self.season = default_season()
+
+    def test_lists_are_served_without_queries(self):
+        players = [create_player(f"P{i:02}") for i in range(30)]
+        self.client.get(reverse("players"))
+
+        # Pages not cached yet, the catalog read for the first one serves them all
+        with self.assertNumQueries(0):
+            first = self.client.get(reverse("players"), {"cursor": ""})
+            self.assertEqual(self.client.get(reverse("to_bid")).status_code, 200)
+            self.assertContains(self.client.get(reverse("player_search"), {"search": "p2"}), "Player P29")
+        self.assertEqual([player.id for player in first.context["players"]], [player.id for player in players[:20]])
+        second = self.client.get(reverse("players") + first.context["players"].next_url)
+        self.assertEqual([player.id for player in second.context["players"]], [player.id for player in players[20:]])
+
+    def test_commits_refresh_the_catalog(self):
+        team, sold, renamed, deleted = create_team("T1"), create_player("P1"), create_player("P2"), create_player("P3")
+        player_catalog.get(self.season.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Bid.objects.create(team_id=team.id, player_id=sold.id, bid_amount=750, is_sold=True)
+            renamed.name = "Renamed"
+            renamed.save()
+            deleted.delete()
+        # The version moved, read once more
+        with self.assertNumQueries(1):
+            players = player_catalog.get(self.season.id)
+        self.assertEqual([(player.name, player.is_sold) for player in players.players],
+                         [("Player P1", True), ("Renamed", False)])
+        self.assertEqual([player.id for player in players.unsold], [renamed.id])
+
+    def test_version_moved_by_another_worker_is_read_again(self):
+        player = create_player("P1")
+        player_catalog.get(self.season.id)
+        with self.assertNumQueries(0):
+            player_catalog.get(self.season.id)
+
+        # Another process: no signal here, only its bump of the shared version
+        Player.objects.filter(pk=player.pk).update(name="Renamed")
+        bump_auction_version(self.season.id)
+        self.assertEqual(player_catalog.get(self.season.id).players[0].name, "Renamed")
+        self.assertContains(self.client.get(reverse("players")), "Renamed")
+
+    def test_no_page_outlives_the_patch(self):
+        team, player = create_team("T1"), create_player("P1")
+        self.assertContains(self.client.get(reverse("to_bid")), "Player P1")
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            Bid.objects.create(team_id=team.id, player_id=player.id, bid_amount=750, is_sold=True)
+        for callback in callbacks:
+            callback()
+            # A spectator's read between two callbacks of the commit
+            self.client.get(reverse("to_bid"))
+        self.assertNotContains(self.client.get(reverse("to_bid")), "Player P1")
+
+    def test_admin_import_drops_the_catalog(self):
+        player_catalog.get(self.season.id)
+        dataset = tablib.Dataset(["", "P1", "Imported", "BATSMAN", "0", "0"],
+                                 headers=["id", "cpl_id", "name", "type", "is_external", "is_sold"])
+        with self.captureOnCommitCallbacks(execute=True):
+            result = PlayerResouce().import_data(dataset)
+        self.assertFalse(result.has_errors())
+        self.assertEqual([player.name for player in player_catalog.get(self.season.id).players], ["Imported"])
+
+    def test_search_finds_substrings_best_match_first(self):
+        by_code = Player.objects.create(cpl_id="KUMAR1", name="Someone", type="BATSMAN", is_external=False,
+                                        is_sold=False)
+        by_name = Player.objects.create(cpl_id="X1", name="Arun Kumar", type="BOWLER", is_external=False,
+                                        is_sold=False)
+        players = player_catalog.get(self.season.id)
+        self.assertEqual([player.id for player in players.search("kumar")], [by_name.id, by_code.id])
+        self.assertEqual([player.id for player in players.search("run bowl")], [by_name.id])
+        self.assertEqual(players.search(""), [])
+
+    def test_records_are_smaller_than_model_instances(self):
+        for i in range(50):
+            create_player(f"P{i}")
+        memory = memory_footprint(self.season)
+        self.assertEqual(memory["players"], 50)
+        self.assertLess(memory["catalog_bytes"], memory["orm_bytes"])
+
+
+class ConcurrentBidTests(TransactionTestCase):
+    threads = 8
+    rounds = 10
+
+    def run_threads(self, target, args):
+        barrier = threading.Barrier(len(args))
+
+        def run(*arg):
+            try:
+                barrier.wait()
+                target(*arg)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=run, args=arg) for arg in args]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    def test_player_is_never_sold_twice(self):
+        teams = [create_team(f"T{i}") for i in range(self.threads)]
+        players = [create_player(f"P{i}") for i in range(self.rounds)]
+        won, lost = [], []
+
+        def bid(team, player):
+            try:
+                Bid.objects.create(team_id=team.id, player_id=player.id, bid_amount=700, is_sold=True)
+                won.append(player.id)
+            except BidConflict:
+                lost.append(player.id)
+
+        for player in players:
+            self.run_threads(bid, [(team, player) for team in teams])
+
+        self.assertEqual(sorted(won), sorted(p.id for p in players))
+        self.assertEqual(len(lost), (self.threads - 1) * self.rounds)
+        self.assertEqual(TeamMember.objects.count(), self.rounds)
+        self.assertEqual(Bid.objects.filter(is_sold=True).count(), self.rounds)
+        for team in Team.objects.all():
+            bought = Bid.objects.filter(team=team, is_sold=True).count()
+            self.assertEqual(team.internal_players_count, bought)
+            self.assertEqual(team.expended_amount, 700 * bought)
+
+    def test_team_budget_is_never_overspent(self):
+        # 7 more internal and 2 external players must stay affordable: three bids of 1200 fit, a fourth does not
+        team = create_team("T1", total_amount=11_000)
+        players = [create_player(f"P{i}") for i in range(self.threads)]
+
+        accepted, errors = [], []
+
+        def bid(player):
+            try:
+                Bid.objects.create(team_id=team.id, player_id=player.id, bid_amount=1200, is_sold=True)
+                accepted.append(player.id)
+            except ValidationError:
+                # Rejected by the budget rules once the team filled up, BidConflict included
+                pass
+            except Exception as e:
+                # "database is locked" and the like would otherwise pass unnoticed
+                errors.append(e)
+
+        self.run_threads(bid, [(player,) for player in players])
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(accepted), 3)
+        team.refresh_from_db()
+        self.assertGreaterEqual(team.balance_amount, 0)
+        self.assertEqual(team.expended_amount, 1200 * len(accepted))
+        self.assertEqual(team.expended_amount, 1200 * team.internal_players_count)
+        self.assertEqual(TeamMember.objects.filter(team=team).count(), team.internal_players_count)
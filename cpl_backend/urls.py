@@ -1,14 +1,24 @@
 from django.contrib import admin
 from django.urls import path
-from . import views
+from . import api, metrics, views
 
 urlpatterns = [
     path('', views.homepage, name="home"),
     path('players/', views.list_players, name="players"),
     path('teams/', views.list_teams, name="teams"),
+    path('teams/standings/', views.standings, name="standings"),
     path('teams/<int:id>', views.list_team_members, name="team"),
     path('bids/', views.list_players_for_bidding, name="to_bid"),
     path('players/<int:id>/bid', views.add_new_bid, name="bids"),
     path('save-bid/', views.save_bid, name='save_bid'),
     path('search-player/', views.search_player, name='player_search'),
+    path('search-player/suggest/', views.suggest_player, name='player_suggest'),
+    path('live/', views.live_events, name='live'),
+    path('metrics/', metrics.metrics, name='metrics'),
+    path('api/players/', api.players, name='api_players'),
+    path('api/players/unsold/', api.unsold_players, name='api_unsold_players'),
+    path('api/players/<int:id>/eligibility/', api.player_eligibility, name='api_player_eligibility'),
+    path('api/teams/', api.teams, name='api_teams'),
+    path('api/teams/<int:id>/players/', api.team_players, name='api_team_players'),
+    path('api/bids/', api.bids, name='api_bids'),
 ]
@@ -1,68 +1,122 @@
+import logging
 import os
 
-from django.http import HttpResponse, HttpResponseRedirect
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.core.paginator import Paginator
 from django.shortcuts import render
 from django.contrib import messages
 from django.urls import reverse
 from django.db.models import Q
 from django.conf import settings
-from .models import Player, Team, TeamMember, Bid
+from .models import Player, Team, TeamMember, Bid, BidConflict
+from .catalog import player_catalog
+from .eligibility import bid_eligibility
 from . import constants
-from django.db.models import Sum
+from .live import broadcaster
+from .search import search_players, suggest_players
+from .pagination import PAGE_SIZE, InvalidCursor, akeyset_page, list_keyset_page
+from .page_cache import cache_by_version
+from .standings import team_standings
+from .writes import run_write
+
+logger = logging.getLogger(__name__)
 
 
 def homepage(request):
     context = constants.SITE_INFO
     return render(request, "index.html", context=context)
 
-def paginate(request, queryset):
-    paginator = Paginator(queryset, 20) 
-    page = request.GET.get('page')
-    try:
-        items = paginator.page(page)
-    except PageNotAnInteger:
-        # If page is not an integer, deliver first page.
-        items = paginator.page(1)
-    except EmptyPage:
-        # If page is out of range (e.g. 9999), deliver last page of results.
-        items = paginator.page(paginator.num_pages)
+async def paginate(request, queryset, ordering=("id",), keyset=None):
+    # Keyset mode skips the COUNT(*) and OFFSET, deep pages cost the same as the first
+    if keyset is None:
+        keyset = settings.KEYSET_PAGINATION or "cursor" in request.GET
+    if keyset:
+        try:
+            return await akeyset_page(queryset, cursor=request.GET.get("cursor"), ordering=ordering,
+                                      per_page=PAGE_SIZE, params=request.GET)
+        except InvalidCursor:
+            return await akeyset_page(queryset, ordering=ordering, per_page=PAGE_SIZE, params=request.GET)
 
+    if not queryset.ordered:
+        queryset = queryset.order_by(*ordering)
+    paginator = Paginator(queryset, PAGE_SIZE)
+    # Counted here, the page numbers below are then worked out without a query
+    paginator.count = await queryset.acount()
+    # First page if page is not a number, last one if it is out of range
+    items = paginator.get_page(request.GET.get('page'))
+    # Read now, the template can't query from the event loop
+    items.object_list = [item async for item in items.object_list]
     return items
 
 
-def list_players(request):
-    try:
-        players = Player.objects.all()
-    except Exception as e:
-        messages.error(request, f'An error occurred: {str(e)}')
-    
-    
+def paginate_list(request, items, keyset=None):
+    # The pages paginate() gives, of a list already in id order: no query at all
+    if keyset is None:
+        keyset = settings.KEYSET_PAGINATION or "cursor" in request.GET
+    if keyset:
+        try:
+            return list_keyset_page(items, cursor=request.GET.get("cursor"), per_page=PAGE_SIZE, params=request.GET)
+        except InvalidCursor:
+            return list_keyset_page(items, per_page=PAGE_SIZE, params=request.GET)
+    return Paginator(items, PAGE_SIZE).get_page(request.GET.get('page'))
+
+
+async def season_players(request):
+    # Read from the database only when this process has no fresh copy of the season
+    players = player_catalog.get(request.season.id, stale_only=True)
+    return players or await sync_to_async(player_catalog.get)(request.season.id)
+
+
+@cache_by_version
+async def list_players(request):
+    if settings.PLAYER_CATALOG:
+        players = paginate_list(request, (await season_players(request)).players)
+    else:
+        players = await paginate(request=request, queryset=Player.objects.filter(season=request.season))
+
     context = {
-        "players": paginate(request=request, queryset=players),
+        "players": players,
         "title": "List of all players",
         "MEDIA_URL": settings.MEDIA_URL,
         "SITE_INFO": constants.SITE_INFO
         }
     return render(request, "pages/players.html", context)
 
-def list_teams(request):
+@cache_by_version
+async def list_teams(request):
     # (((EXTERNAL_PLAYERS_COUNT - current_external_players) * EXTERNAL_PLAYER_BASIC_AMOUNT
 # INTERNAL_PLAYERS_COUNT - current_internal_players) * INTERNAL_PLAYER_BASIC_AMOUNT) ):
     try:
-        teams = Team.objects.all()
+        teams = Team.objects.filter(season=request.season)
     except Exception as e:
         messages.error(request, f'An error occurred: {str(e)}')
 
     context = {
-        "teams": paginate(request=request, queryset=teams), 
+        "teams": await paginate(request=request, queryset=teams), 
         "title": "List of all teams",
         "MEDIA_URL": settings.MEDIA_URL,
         "SITE_INFO": constants.SITE_INFO
         }
     return render(request, "pages/teams.html", context)
 
-def list_team_members(request, id):
+@cache_by_version
+def standings(request):
+    teams = team_standings(request.season)
+    if request.GET.get("format") == "json":
+        return JsonResponse({"teams": teams})
+
+    context = {
+        "teams": teams,
+        "title": "Standings",
+        "MEDIA_URL": settings.MEDIA_URL,
+        "SITE_INFO": constants.SITE_INFO
+        }
+    return render(request, "pages/standings.html", context)
+
+@cache_by_version
+async def list_team_members(request, id):
     # Team-players are players of the current team
     # Find out the number of external players
     # Find oout the number of internal players
@@ -71,40 +125,41 @@ def list_team_members(request, id):
     # + (Total_internal_player - current_internal_player)* internal_player_amount)
     # Calculate the next highest bid amount for internal players
     try:
-        team_players = TeamMember.objects.filter(team=id)
-        team = Team.objects.filter(id=id).first()
+        team_players = [member async for member in TeamMember.objects.filter(team=id).select_related("players")]
+        team = await Team.objects.filter(season=request.season, id=id).afirst()
     except Exception as e:
         messages.error(request, f'An error occurred: {str(e)}')
+    if team is None:
+        raise Http404("No such team in this season")
+    rules = request.season
 
-    internal_player_count = team_players.filter(players__is_external=False).count() 
-    external_player_count = team_players.filter(players__is_external=True).count()
+    internal_player_count = team.internal_players_count
+    external_player_count = team.external_players_count
     
-    remaining_internal_player = constants.INTERNAL_PLAYERS_COUNT - internal_player_count
-    remaining_external_player = constants.EXTERNAL_PLAYERS_COUNT - external_player_count
+    remaining_internal_player = rules.internal_players_count - internal_player_count
+    remaining_external_player = rules.external_players_count - external_player_count
 
-    total_internal_bids = Bid.objects.filter(team=team, player__is_external=False, is_sold=True).aggregate(Sum("bid_amount"))
-    total_external_bids = Bid.objects.filter(team=team, player__is_external=True, is_sold=True).aggregate(Sum("bid_amount"))
-    
-    internal_bid_sum = total_internal_bids["bid_amount__sum"] if  total_internal_bids["bid_amount__sum"] else 0
-    external_bid_sum = total_external_bids["bid_amount__sum"] if total_external_bids["bid_amount__sum"] else 0
+    internal_bid_sum = team.internal_sold_amount
+    external_bid_sum = team.external_sold_amount
     
-    total_internal_fund = (remaining_internal_player * constants.INTERNAL_PLAYER_BASIC_AMOUNT) + internal_bid_sum
-    total_external_fund = (remaining_external_player * constants.EXTERNAL_PLAYER_BASIC_AMOUNT) + external_bid_sum
+    total_internal_fund = (remaining_internal_player * rules.internal_player_basic_amount) + internal_bid_sum
+    total_external_fund = (remaining_external_player * rules.external_player_basic_amount) + external_bid_sum
     total_bidded = total_internal_fund + total_external_fund
     
-    next_bid = constants.TEAM_BASIC_AMOUNT - total_bidded 
-    next_bid = next_bid + 2000 if remaining_external_player != 0 else next_bid + 600
+    next_bid = rules.team_basic_amount - total_bidded 
+    next_bid = next_bid + rules.external_player_basic_amount if remaining_external_player != 0 \
+        else next_bid + rules.internal_player_basic_amount
 
-    print(internal_bid_sum, external_bid_sum)
-    print(remaining_internal_player, remaining_external_player)
-    print(total_internal_fund,total_external_fund )
-    print(next_bid)
+    logger.debug("Team %s: sold %s internal, %s external; %s internal and %s external players to go; "
+                 "funds %s internal, %s external; next bid %s", team.id, internal_bid_sum, external_bid_sum,
+                 remaining_internal_player, remaining_external_player, total_internal_fund,
+                 total_external_fund, next_bid)
 
     player_counts = {
         "internal_player_count": internal_player_count,
         "external_player_count": external_player_count,
-        "total_internal_players": constants.INTERNAL_PLAYERS_COUNT,
-        "total_external_players": constants.EXTERNAL_PLAYERS_COUNT,
+        "total_internal_players": rules.internal_players_count,
+        "total_external_players": rules.external_players_count,
         "next_bid": next_bid
     }
     
@@ -121,14 +176,16 @@ def list_team_members(request, id):
                      and {remaining_external_player} more external players.')
     return render(request, "pages/team_players.html", context)
 
-def list_players_for_bidding(request):
-    try:
-        players = Player.objects.filter(is_sold=False)
-    except Exception as e:
-        messages.error(request, f'An error occurred: {str(e)}')
+@cache_by_version
+async def list_players_for_bidding(request):
+    if settings.PLAYER_CATALOG:
+        players = paginate_list(request, (await season_players(request)).unsold)
+    else:
+        players = await paginate(request=request,
+                                 queryset=Player.objects.filter(season=request.season, is_sold=False))
 
     context = {
-        "players": paginate(request=request, queryset=players),
+        "players": players,
         "title": "Remaining players",
         "MEDIA_URL": settings.MEDIA_URL,
         "SITE_INFO": constants.SITE_INFO
@@ -137,8 +194,9 @@ def list_players_for_bidding(request):
 
 def add_new_bid(request, id):
     try:
-        player = Player.objects.filter(id=id).first()
-        teams = Team.objects.all()
+        player = Player.objects.filter(season=request.season, id=id).first()
+        # Each team with the most it may bid, teams that can't bid are disabled
+        teams = bid_eligibility(player) if player else []
     except Exception as e:
         messages.error(request, f'An error occurred: {str(e)}')
 
@@ -151,7 +209,7 @@ def add_new_bid(request, id):
         }
     return render(request, "pages/bids.html", context)
 
-def save_bid(request):
+async def save_bid(request):
     if request.method == "POST":
         player = request.POST.get("player")
         team = request.POST.get("team")
@@ -159,13 +217,20 @@ def save_bid(request):
         is_sold = bool(request.POST.get("is_sold"))
         next = request.POST.get("next")
         try:
-            bid_id = Bid.objects.create(
-                team=Team.objects.filter(id=team).first(),
-                player=Player.objects.filter(id=player).first(),
+            # Ahead of the spectators' reads, see writes.run_write
+            bid_id = await run_write(
+                request,
+                Bid.objects.create,
+                team_id=team or None,
+                player_id=player or None,
                 bid_amount=bid_amount,
                 is_sold=is_sold
             )
             messages.success(request, 'Bid successfully recorded!')
+        except BidConflict as e:
+            # Another terminal won the race, the player is off the table
+            messages.warning(request, e.message)
+            return HttpResponseRedirect(reverse('to_bid'))
         except Exception as e:
             messages.error(request, f'An error occurred: {str(e)}')
             return HttpResponseRedirect(next)
@@ -179,17 +244,55 @@ def save_bid(request):
         return HttpResponseRedirect(next)
     
 
-def search_player(request):
-    if request.method == "GET":
-        keyword = request.GET.get("search")
-        players = Player.objects.filter(Q(name__icontains=keyword) | 
-                                        Q(cpl_id__icontains=keyword))
-        
-        context = {
-        "players": paginate(request=request, queryset=players),
+async def search_player(request):
+    keyword = request.GET.get("search", "").strip()
+    if settings.PLAYER_CATALOG:
+        catalog = await season_players(request)
+        # Matches are ranked, so paged by number; an offset costs nothing in a list
+        players = paginate_list(request, catalog.search(keyword), keyset=False) if keyword \
+            else paginate_list(request, catalog.players)
+    else:
+        players = Player.objects.filter(season=request.season)
+        if keyword:
+            # Ranked, a keyset on id would lose the order; paged by number as above
+            players = await paginate(request=request, queryset=search_players(keyword, players), keyset=False)
+        else:
+            players = await paginate(request=request, queryset=players)
+
+    context = {
+        "players": players,
         "title": "List of all players",
         "MEDIA_URL": settings.MEDIA_URL,
         "SITE_INFO": constants.SITE_INFO
         }
     return render(request, "pages/players.html", context)
-            
\ No newline at end of file
+
+
+def suggest_player(request):
+    # Typeahead for the bid screen
+    keyword = request.GET.get("q", "")
+    try:
+        limit = max(1, min(int(request.GET.get("limit", 10)), 50))
+    except ValueError:
+        limit = 10
+    unsold = request.GET.get("unsold") == "1"
+
+    return JsonResponse({"results": suggest_players(keyword, request.season, limit=limit, unsold=unsold)})
+
+
+async def live_events(request):
+    # Server-sent events, only streams when served through cpl/asgi.py. Under WSGI
+    # (runserver included) the endless stream would hold a worker thread per open
+    # page for good; 204 tells EventSource to stop reconnecting.
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    try:
+        last_event_id = int(request.headers.get("Last-Event-ID", ""))
+    except ValueError:
+        last_event_id = None
+
+    response = StreamingHttpResponse(broadcaster.listen(last_event_id=last_event_id, season_id=request.season.id),
+                                     content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
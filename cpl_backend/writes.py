@@ -0,0 +1,78 @@
+import asyncio
+import contextvars
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+
+_lock = threading.Lock()
+_executor = None
+
+
+def executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.WRITE_THREADS, thread_name_prefix="cpl-write")
+        return _executor
+
+
+def _write(func, args, kwargs):
+    # A pool thread keeps its connection between writes, as a worker does between requests
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_write(request, func, *args, **kwargs):
+    """Run func, a database write, for an async view.
+
+    Under ASGI sync code, the async ORM included, runs on a single shared
+    thread, so a bid would wait behind every page the spectators are
+    reading. Writes get WRITE_THREADS threads and connections of their own
+    instead, bounded so they can't open more connections than that. Other
+    requests (WSGI, the test client) run func the usual way.
+    """
+    if not isinstance(request, ASGIRequest) or not settings.WRITE_THREADS:
+        return await sync_to_async(func)(*args, **kwargs)
+    # The metrics of the request follow the write into the pool
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        executor(), context.run, partial(_write, func, args, kwargs))
+
+
+class PrioritizeWrites:
+    """ASGI middleware letting at most limit reads into Django at once.
+
+    Reads past the limit wait here, where they cost the event loop nothing,
+    while writes (anything but GET and HEAD) go straight in. However many
+    spectators poll, a bid only queues behind a few pages. Event streams
+    are left out, they are open for as long as the client stays.
+    """
+
+    def __init__(self, application, limit, unlimited=("/live/",)):
+        self.application = application
+        self.limit = limit
+        self.unlimited = tuple(unlimited)
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def semaphore(self):
+        # One per event loop, a semaphore can't be shared between loops
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(self.limit)
+        return self._semaphores[loop]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD") or not self.limit \
+                or scope["path"].startswith(self.unlimited):
+            return await self.application(scope, receive, send)
+        async with self.semaphore():
+            return await self.application(scope, receive, send)